@@ -0,0 +1,92 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from script import normalize_name
+from snapshot_history import latest_per_week, load_catalog, load_agent_history, week_start
+
+# Metrics tracked across weekly snapshots (dataset scale: percentages 0-100, Score 0-100)
+TREND_METRICS = ['Fixed_Pct', 'CC_Pct', 'SC_Pct', 'UP_Pct', 'Referral_Ach_Pct', 'Conversion_Rate', 'Score']
+
+DEFAULT_TREND_WEEKS = 12
+DEFAULT_ROLLING_WINDOW = 4
+
+# Number of (agent, weeks, window, snapshot set) series kept in memory
+TREND_CACHE_SIZE = 256
+
+
+def _round(value):
+    return None if pd.isna(value) else round(float(value), 2)
+
+
+def _slope(week_numbers, values):
+    """
+    Least-squares change per week over the weeks that have a value.
+    week_numbers are calendar week positions, so weeks without a snapshot count as gaps.
+    """
+    valid = ~np.isnan(values)
+    if valid.sum() < 2:
+        return None
+    x = np.asarray(week_numbers, dtype=float)[valid]
+    return round(float(np.polyfit(x - x[0], values[valid], 1)[0]), 3)
+
+
+@lru_cache(maxsize=TREND_CACHE_SIZE)
+def _cached_series(agent_key, snapshot_ids, window):
+    """
+    Build the series for one agent from a fixed set of snapshots.
+    snapshot_ids is part of the key, so a new upload naturally misses the cache.
+    """
+    snapshots = [entry for entry in load_catalog() if entry['snapshot_id'] in snapshot_ids]
+    snapshots.sort(key=lambda entry: entry['week'])
+    history = load_agent_history(agent_key, columns=TREND_METRICS, snapshots=snapshots)
+    weeks = [entry['week'] for entry in snapshots]
+    starts = pd.DatetimeIndex([week_start(week) for week in weeks])
+    week_numbers = (starts - starts[0]).days // 7 if len(starts) else []
+
+    # One row per snapshot week, NaN where the agent was absent that week
+    frame = pd.DataFrame(index=pd.Index(weeks, name='week'))
+    if not history.empty:
+        history = history.drop_duplicates('week', keep='last').set_index('week')
+        for col in TREND_METRICS:
+            if col in history.columns:
+                frame[col] = pd.to_numeric(history[col], errors='coerce').reindex(weeks)
+
+    metrics = {}
+    for col in TREND_METRICS:
+        if col not in frame.columns:
+            continue
+        series = frame[col]
+        # Mean over the last `window` calendar weeks (a time-based window, so gaps shrink it)
+        rolling = pd.Series(series.to_numpy(), index=starts).rolling(f'{7 * window}D', min_periods=1).mean()
+        values = series.to_numpy(dtype=float, na_value=np.nan)
+        metrics[col] = {
+            'values': [_round(v) for v in values],
+            'rolling_mean': [_round(v) for v in rolling.to_numpy(dtype=float, na_value=np.nan)],
+            'slope': _slope(week_numbers, values),
+            'latest': _round(series.dropna().iloc[-1]) if series.notna().any() else None
+        }
+
+    return {
+        'weeks': weeks,
+        'weeks_present': int(frame.notna().any(axis=1).sum()) if len(frame.columns) else 0,
+        'rolling_window': window,
+        'metrics': metrics
+    }
+
+
+def agent_trend(agent_id, weeks=DEFAULT_TREND_WEEKS, window=DEFAULT_ROLLING_WINDOW):
+    """
+    Metric trend for one agent over the last N weekly snapshots: the weekly
+    values, a rolling mean over the last `window` calendar weeks, and the slope
+    (change per calendar week). Weeks without a snapshot are gaps, not neighbours.
+
+    Only the selected weeks' snapshot files are read, with the Name filter and
+    column pruning pushed down to Parquet; the result is cached until a new
+    snapshot changes the set of weeks.
+    """
+    snapshot_ids = tuple(entry['snapshot_id'] for entry in latest_per_week(weeks))
+    if not snapshot_ids:
+        return {'weeks': [], 'weeks_present': 0, 'rolling_window': window, 'metrics': {}}
+    return _cached_series(normalize_name(agent_id), snapshot_ids, window)
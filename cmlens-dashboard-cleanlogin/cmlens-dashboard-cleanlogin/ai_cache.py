@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+
+# AI analyses keyed by (type, prompt version, model, prompt, canonical agent_data).
+# SQLite in WAL mode, so every worker process on the host shares one cache file.
+AI_CACHE_PATH = os.environ.get('CMLENS_AI_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'ai_cache.sqlite3'))
+AI_CACHE_TTL_SECONDS = float(os.environ.get('CMLENS_AI_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+AI_CACHE_MAX_ENTRIES = int(os.environ.get('CMLENS_AI_CACHE_MAX_ENTRIES', 5000))
+AI_CACHE_ENABLED = os.environ.get('CMLENS_AI_CACHE', '1') != '0'
+
+# Float noise below this many decimals does not change the key
+CANONICAL_FLOAT_DIGITS = 6
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ai_cache (
+    key TEXT PRIMARY KEY,
+    analysis_type TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ai_cache_last_access ON ai_cache (last_access);
+"""
+
+
+def _canonical(value):
+    """JSON-ready copy with sorted keys, rounded floats and integral floats as ints"""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, float):
+        if value != value:
+            return None
+        rounded = round(value, CANONICAL_FLOAT_DIGITS)
+        return int(rounded) if rounded.is_integer() else rounded
+    return value
+
+
+def cache_key(analysis_type, prompt_version, agent_data, prompt='', model=''):
+    """sha256 of the canonical request; identical agents with identical metrics share a key"""
+    payload = json.dumps({
+        'type': analysis_type,
+        'prompt_version': prompt_version,
+        'model': model,
+        'prompt': prompt,
+        'agent_data': _canonical(agent_data)
+    }, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AIResponseCache:
+    """TTL + size-bounded LRU cache of AI analyses in a SQLite file"""
+
+    def __init__(self, path=AI_CACHE_PATH, ttl_seconds=AI_CACHE_TTL_SECONDS, max_entries=AI_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evicted': 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connection(self):
+        """One connection per thread (sqlite3 connections are not shared across threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def get(self, key):
+        """Cached value (dict) or None when missing or expired"""
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute('SELECT value, expires_at FROM ai_cache WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] <= now:
+            self._count('misses')
+            return None
+        conn.execute('UPDATE ai_cache SET last_access = ?, hits = hits + 1 WHERE key = ?', (now, key))
+        self._count('hits')
+        return json.loads(row[0])
+
+    def contains(self, key):
+        """Whether an unexpired value exists (no hit/miss counting, no LRU touch)"""
+        row = self._connection().execute(
+            'SELECT 1 FROM ai_cache WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def put(self, key, value, analysis_type='', prompt_version=''):
+        """Store a value; expired rows go first, then the least recently used beyond max_entries"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO ai_cache '
+                '(key, analysis_type, prompt_version, value, created_at, expires_at, last_access, hits) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, 0)',
+                (key, analysis_type, prompt_version, json.dumps(value), now, now + self.ttl_seconds, now)
+            )
+            evicted = conn.execute('DELETE FROM ai_cache WHERE expires_at <= ?', (now,)).rowcount
+            evicted += conn.execute(
+                'DELETE FROM ai_cache WHERE key IN ('
+                'SELECT key FROM ai_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            ).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._count('writes')
+        if evicted:
+            self._count('evicted', evicted)
+
+    def clear(self, analysis_type=None):
+        conn = self._connection()
+        if analysis_type:
+            return conn.execute('DELETE FROM ai_cache WHERE analysis_type = ?', (analysis_type,)).rowcount
+        return conn.execute('DELETE FROM ai_cache').rowcount
+
+    def stats(self):
+        """This process's hit/miss counters plus the shared entry count"""
+        entries = self._connection().execute('SELECT COUNT(*) FROM ai_cache').fetchone()[0]
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        return {
+            **stats,
+            'hit_rate': round(stats['hits'] / lookups, 3) if lookups else None,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'path': self.path
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_ai_cache():
+    """Process-wide cache, or None when CMLENS_AI_CACHE=0"""
+    global _cache
+    if not AI_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = AIResponseCache()
+        return _cache
@@ -0,0 +1,137 @@
+import os
+import time
+import threading
+from datetime import datetime
+
+# Categories whose AI analyses are generated in the background after every ingest
+AI_PREGENERATE_ENABLED = os.environ.get('CMLENS_AI_PREGENERATE', '1') != '0'
+AI_PREGENERATE_CATEGORIES = ('Critical', 'Watch')
+AI_PREGENERATE_TYPES = ('meeting', 'coaching')
+# Model calls per minute spent on pre-generation, so interactive requests keep their share
+AI_PREGENERATE_CALLS_PER_MINUTE = float(os.environ.get('CMLENS_AI_PREGENERATE_CALLS_PER_MINUTE', 12))
+AI_PREGENERATE_PACK_SIZE = int(os.environ.get('CMLENS_AI_PREGENERATE_PACK_SIZE', 5))
+
+
+class AIPregenerator:
+    """
+    Background worker that fills the AI response cache for priority agents.
+
+    submit() queues the agents of a freshly published dataset whose category is
+    in AI_PREGENERATE_CATEGORIES, lowest score first, in packs. The worker hands
+    each pack to generate(analysis_type, records), which returns the number of
+    model calls it made (0 when everything was cached), and spaces model calls
+    to stay under the calls-per-minute limit. A newer dataset replaces the work
+    still queued for the previous one.
+    """
+
+    def __init__(self, generate, calls_per_minute=AI_PREGENERATE_CALLS_PER_MINUTE,
+                 pack_size=AI_PREGENERATE_PACK_SIZE, categories=AI_PREGENERATE_CATEGORIES,
+                 analysis_types=AI_PREGENERATE_TYPES):
+        self.generate = generate
+        self.interval = 60.0 / calls_per_minute if calls_per_minute > 0 else 0.0
+        self.pack_size = max(1, pack_size)
+        self.categories = categories
+        self.analysis_types = analysis_types
+        self._jobs = []
+        self._generation = 0
+        self._next_call = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {
+            'runs': 0,
+            'queued_packs': 0,
+            'agents': 0,
+            'packs_done': 0,
+            'model_calls': 0,
+            'errors': 0,
+            'last_submitted': None,
+            'last_finished': None,
+            'last_error': None
+        }
+
+    def submit(self, dataset):
+        """Queue pre-generation for a published dataset; returns the number of agents queued"""
+        records = [record for record in dataset.records() if record.get('Category') in self.categories]
+        records.sort(key=lambda record: record['Score'])
+        packs = [records[i:i + self.pack_size] for i in range(0, len(records), self.pack_size)]
+        jobs = [(analysis_type, pack) for pack in packs for analysis_type in self.analysis_types]
+
+        with self._lock:
+            self._generation += 1
+            self._jobs = jobs
+            self.stats.update(runs=self.stats['runs'] + 1, queued_packs=len(jobs), agents=len(records),
+                              packs_done=0, last_submitted=datetime.now().isoformat())
+        self._wake.set()
+        print(f"[AI] Queued background analyses for {len(records)} "
+              f"{'/'.join(self.categories)} agents ({len(jobs)} packs)")
+        return len(records)
+
+    def _next_job(self):
+        with self._lock:
+            if not self._jobs:
+                return None, None
+            return self._generation, self._jobs.pop(0)
+
+    def _run(self):
+        while not self._stop.is_set():
+            generation, job = self._next_job()
+            if job is None:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            # Rate limit: wait until the next model call is allowed
+            delay = self._next_call - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+
+            analysis_type, records = job
+            try:
+                calls = self.generate(analysis_type, records)
+            except Exception as e:
+                calls = 1
+                self.stats['errors'] += 1
+                self.stats['last_error'] = f"{type(e).__name__}: {e}"
+                print(f"[AI] Background {analysis_type} analyses failed: {e}")
+
+            with self._lock:
+                self._next_call = time.monotonic() + self.interval * calls
+                self.stats['model_calls'] += calls
+                if generation == self._generation:
+                    self.stats['packs_done'] += 1
+                    if not self._jobs:
+                        self.stats['last_finished'] = datetime.now().isoformat()
+                        print(f"[AI] Background analyses done for {self.stats['agents']} agents")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='ai-pregeneration', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def status(self):
+        with self._lock:
+            return {
+                'enabled': True,
+                'running': self._thread is not None and self._thread.is_alive(),
+                'categories': list(self.categories),
+                'calls_per_minute': round(60.0 / self.interval, 2) if self.interval else None,
+                'pending_packs': len(self._jobs),
+                **self.stats
+            }
+
+
+def start_ai_pregenerator(generate):
+    """Start the background pre-generation worker unless CMLENS_AI_PREGENERATE=0; returns it (or None)"""
+    if not AI_PREGENERATE_ENABLED:
+        return None
+    return AIPregenerator(generate).start()
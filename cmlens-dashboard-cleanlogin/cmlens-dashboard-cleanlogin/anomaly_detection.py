@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+
+from script import normalize_name, coalesce_duplicate_columns, team_keys
+from snapshot_history import iso_week, latest_per_week, load_snapshot
+
+# Metrics checked for sudden drops; Recovery_Rate is derived from the All Leads counts
+ANOMALY_METRICS = ['Fixed_Pct', 'CC_Pct', 'SC_Pct', 'UP_Pct', 'Recovery_Rate']
+
+# Peer check: robust z-score (0.6745 * (x - median) / MAD) within the agent's subgroup
+PEER_Z_THRESHOLD = -3.5
+MIN_PEERS = 5
+
+# History check: drop against the agent's own trailing weekly average
+HISTORY_WEEKS = 6
+MIN_HISTORY_WEEKS = 2
+HISTORY_Z_THRESHOLD = -2.0
+MIN_DROP_POINTS = 10.0
+
+
+def anomaly_metric_frame(df):
+    """Numeric (agents x ANOMALY_METRICS) frame, deriving Recovery_Rate from lead counts"""
+    frame = pd.DataFrame(index=df.index)
+    for col in ANOMALY_METRICS:
+        if col in df.columns:
+            frame[col] = pd.to_numeric(df[col], errors='coerce')
+        else:
+            frame[col] = np.nan
+
+    if 'Recovered_Leads' in df.columns and 'Total_Leads' in df.columns:
+        total = pd.to_numeric(df['Total_Leads'], errors='coerce')
+        recovered = pd.to_numeric(df['Recovered_Leads'], errors='coerce')
+        frame['Recovery_Rate'] = (recovered / total.where(total > 0) * 100).astype(float)
+    return frame.astype(float)
+
+
+def peer_robust_z(values, groups):
+    """
+    Robust z-score of every metric against the agent's group, for all metrics at once.
+    Groups smaller than MIN_PEERS or with zero spread get NaN (never flagged).
+    """
+    grouped = values.groupby(groups)
+    median = grouped.transform('median')
+    mad = (values - median).abs().groupby(groups).transform('median')
+    peers = grouped.transform('count')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = 0.6745 * (values - median) / mad.where(mad > 0)
+    return z.where(peers >= MIN_PEERS), median
+
+
+def trailing_history(current_week=None, weeks=HISTORY_WEEKS):
+    """
+    Per-agent mean, standard deviation and number of weeks of each metric over
+    the latest snapshot of each of the last `weeks` weeks before current_week.
+    """
+    current_week = current_week or iso_week()
+    snapshots = [entry for entry in latest_per_week() if entry['week'] < current_week][-weeks:]
+    if not snapshots:
+        return None
+
+    columns = ['Name', 'Recovered_Leads', 'Total_Leads'] + ANOMALY_METRICS
+    frames = []
+    for entry in snapshots:
+        snapshot = load_snapshot(entry['snapshot_id'], columns=columns)
+        metrics = anomaly_metric_frame(snapshot)
+        metrics['Name'] = snapshot['Name'].map(normalize_name).astype(object)
+        frames.append(metrics)
+
+    history = pd.concat(frames, ignore_index=True).groupby('Name')[ANOMALY_METRICS]
+    return {'mean': history.mean(), 'std': history.std(ddof=0), 'weeks': history.count()}
+
+
+def _format(value):
+    return None if pd.isna(value) else round(float(value), 2)
+
+
+def detect_anomalies(df, current_week=None, history=None):
+    """
+    Flag sudden metric drops for every agent.
+
+    Two vectorized checks run over the whole (agents x metrics) matrix:
+    - peer: robust z-score within the agent's subgroup at or below PEER_Z_THRESHOLD
+    - history: at least MIN_DROP_POINTS below the agent's own trailing average and
+      at or below HISTORY_Z_THRESHOLD standard deviations (needs MIN_HISTORY_WEEKS)
+
+    Parameters:
+    df (pandas.DataFrame): Merged ETL result
+    current_week (str, optional): Week being processed; only earlier weeks form the history
+    history (dict, optional): Precomputed trailing_history() result
+
+    Returns:
+    list: One list of anomaly dicts (metric, check, value, baseline, score, reason) per row of df
+    """
+    frame = coalesce_duplicate_columns(df).reset_index(drop=True)
+    values = anomaly_metric_frame(frame)
+    current = values.to_numpy()
+
+    groups = team_keys(frame)
+    if 'Group' in frame.columns:
+        groups = frame['Group'].astype(object).where(frame['Group'].notna() & (frame['Group'].astype(str).str.strip() != ''), groups)
+    peer_z, peer_median = peer_robust_z(values, groups)
+    peer_z = peer_z.to_numpy()
+    peer_flags = np.nan_to_num(peer_z, nan=0.0) <= PEER_Z_THRESHOLD
+
+    if history is None:
+        history = trailing_history(current_week)
+
+    history_flags = np.zeros_like(peer_flags)
+    if history is not None:
+        names = frame['Name'].map(normalize_name)
+        base_mean = history['mean'].reindex(names).to_numpy()
+        base_std = history['std'].reindex(names).to_numpy()
+        base_weeks = history['weeks'].reindex(names).fillna(0).to_numpy()
+        drop = current - base_mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            history_z = np.where(base_std > 0, drop / base_std, np.where(drop < 0, -np.inf, 0.0))
+        history_flags = (
+            (base_weeks >= MIN_HISTORY_WEEKS)
+            & (np.nan_to_num(drop, nan=0.0) <= -MIN_DROP_POINTS)
+            & (np.nan_to_num(history_z, nan=0.0) <= HISTORY_Z_THRESHOLD)
+        )
+
+    anomalies = [[] for _ in range(len(frame))]
+    peer_medians = peer_median.to_numpy()
+    group_labels = groups.tolist()
+
+    # Only the flagged cells are visited to build the reasons
+    for row, j in zip(*np.nonzero(peer_flags)):
+        metric = ANOMALY_METRICS[j]
+        anomalies[row].append({
+            'metric': metric,
+            'check': 'peer',
+            'value': _format(current[row, j]),
+            'baseline': _format(peer_medians[row, j]),
+            'score': _format(peer_z[row, j]),
+            'reason': f"{metric} {current[row, j]:.1f} is far below the {group_labels[row]} median "
+                      f"{peer_medians[row, j]:.1f} (robust z {peer_z[row, j]:.1f})"
+        })
+
+    for row, j in zip(*np.nonzero(history_flags)):
+        metric = ANOMALY_METRICS[j]
+        weeks = int(base_weeks[row, j])
+        anomalies[row].append({
+            'metric': metric,
+            'check': 'history',
+            'value': _format(current[row, j]),
+            'baseline': _format(base_mean[row, j]),
+            'score': _format(history_z[row, j]) if np.isfinite(history_z[row, j]) else None,
+            'reason': f"{metric} dropped {-drop[row, j]:.1f} pts vs the agent's trailing "
+                      f"{weeks}-week average of {base_mean[row, j]:.1f}"
+        })
+
+    return anomalies
+
+
+def attach_anomalies(df, current_week=None):
+    """Return a copy of df with 'Anomalies' (list of dicts) and 'Anomaly_Count' columns"""
+    anomalies = detect_anomalies(df, current_week)
+    result = df.copy()
+    result['Anomalies'] = pd.Series(anomalies, index=df.index, dtype=object)
+    result['Anomaly_Count'] = [len(items) for items in anomalies]
+    flagged = sum(1 for items in anomalies if items)
+    print(f"[ANOMALY] {flagged} agents flagged ({sum(len(items) for items in anomalies)} anomalies)")
+    return result
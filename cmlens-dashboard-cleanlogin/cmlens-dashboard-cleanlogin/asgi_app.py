@@ -0,0 +1,106 @@
+"""
+ASGI entry point: the I/O-bound endpoints on an asyncio event loop, everything else
+through the Flask app.
+
+Usage:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 8081
+
+/api/ai-analysis awaits the model over an httpx connection pool instead of holding
+a worker thread or process, so one process can keep hundreds of AI calls waiting.
+Notes are read and written in the thread pool. Every other route is served by
+web_backend's Flask app through a2wsgi, in CMLENS_WSGI_THREADS threads, and the
+uploads' ETL runs in a separate process pool (etl_pool) so it never blocks the loop.
+"""
+import os
+import re
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+import web_backend
+from etl_pool import start_etl_pool, stop_etl_pool
+from openrouter_client import get_openrouter_client
+from prompt_builder import build_prompt
+
+# Threads serving the Flask routes (dataset reads, uploads, snapshots)
+WSGI_THREADS = int(os.environ.get('CMLENS_WSGI_THREADS', 16))
+
+
+async def analyze_agent_async(analysis_type, agent_data, custom_prompt=''):
+    """web_backend.analyze_agent with the model call awaited on the event loop"""
+    base_prompt = web_backend.analysis_prompt(analysis_type, custom_prompt)
+    key, cached = await run_in_threadpool(web_backend.cached_analysis, analysis_type, agent_data, base_prompt)
+    if cached is not None:
+        return cached
+
+    ai_result = await get_openrouter_client().acomplete(build_prompt(base_prompt, agent_data))
+    if ai_result.get('fallback'):
+        return web_backend.fallback_result(analysis_type, agent_data)
+    return await run_in_threadpool(web_backend.store_analysis, key, ai_result.get('analysis', ''), analysis_type)
+
+
+async def ai_analysis(request):
+    """Async /api/ai-analysis (same request and response as the Flask route)"""
+    try:
+        data = await request.json()
+        analysis_type, agent_data, custom_prompt = await run_in_threadpool(web_backend.analysis_request, data)
+        result = await analyze_agent_async(analysis_type, agent_data, custom_prompt)
+        return JSONResponse({"success": True, **result})
+
+    except Exception as e:
+        print(f"AI analysis error: {str(e)}")
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+
+async def notes(request):
+    """Coaching notes (/api/coaching-notes/<agent_id>) and meeting notes (/api/meeting-notes/<agent_id>/<week>)"""
+    notes_type = 'meeting' if request.url.path.startswith('/api/meeting-notes/') else 'coaching'
+    agent_id = request.path_params['agent_id']
+    week = request.path_params.get('week')
+    try:
+        if request.method == 'POST':
+            data = await request.json()
+            result = await run_in_threadpool(web_backend.save_notes, notes_type, agent_id,
+                                             data.get('content', ''), week)
+        else:
+            result = await run_in_threadpool(web_backend.load_notes, notes_type, agent_id, week)
+        return JSONResponse(result)
+
+    except Exception as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+
+def cors_middleware():
+    """The Flask app's CORS origins (wildcard subdomains as a regex) for the native routes"""
+    if os.environ.get('FLASK_ENV') == 'development':
+        return Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+    exact = [origin for origin in web_backend.allowed_origins if '*' not in origin]
+    wildcard = [re.escape(origin).replace(r'\*', r'[^.]+') for origin in web_backend.allowed_origins if '*' in origin]
+    return Middleware(CORSMiddleware, allow_origins=exact, allow_origin_regex='|'.join(wildcard) or None,
+                      allow_credentials=True, allow_methods=['*'], allow_headers=['*'])
+
+
+@asynccontextmanager
+async def lifespan(app):
+    start_etl_pool()
+    yield
+    await get_openrouter_client().aclose()
+    stop_etl_pool()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/ai-analysis', ai_analysis, methods=['POST']),
+        Route('/api/coaching-notes/{agent_id}', notes, methods=['GET', 'POST']),
+        Route('/api/meeting-notes/{agent_id}/{week}', notes, methods=['GET', 'POST']),
+        Mount('/', app=WSGIMiddleware(web_backend.app, workers=WSGI_THREADS))
+    ],
+    middleware=[cors_middleware()],
+    lifespan=lifespan
+)
@@ -0,0 +1,253 @@
+"""
+Rebuild weekly history snapshots from a directory tree of report exports.
+
+Usage:
+    python backfill.py exports/ [--workers 4] [--since 2025-W30] [--until 2025-W40]
+                                [--state backfill_state.json] [--force] [--dry-run]
+
+Every report file under the directory is identified from its header rows
+(cc, up, re, fixed or all_leads) and assigned to an ISO week taken from its
+file name or the nearest parent directory: '2025-W38', '2025_w38', or a date
+such as '20250917' / '2025-09-17'. Each week's file set runs through
+flexible_etl_pipeline in a process pool. Snapshots are written in week order
+by this process, so anomaly detection sees the earlier weeks it compares against.
+
+Progress is recorded in a state file after every week. Re-running the same
+command skips weeks already done with the same files (by content hash) and
+retries the failed ones.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from anomaly_detection import attach_anomalies
+from report_readers import REPORT_FORMATS
+from report_sidecars import file_sha256, wait_for_sidecars
+from script import flexible_etl_pipeline
+from snapshot_history import HISTORY_FOLDER, name_reference, week_end, write_snapshot
+from upload_validation import identify_source
+
+DEFAULT_STATE_FILE = os.path.join(HISTORY_FOLDER, 'backfill_state.json')
+
+# Lines of a failed week's ETL output kept in the state file
+ERROR_LOG_LINES = 20
+
+
+def week_from_path(path, root):
+    """ISO week of a report from its file name, else from the nearest parent directory"""
+    relative = os.path.relpath(path, root)
+    parts = relative.split(os.sep)
+    for part in reversed(parts):
+        reference = name_reference(part)
+        if reference is not None:
+            return reference[0]
+    return None
+
+
+def discover_weeks(root, since=None, until=None):
+    """
+    Walk a directory tree and group report files by week.
+
+    Returns:
+    dict: week -> {source: path}; with two files for the same source and week the newest wins
+    """
+    weeks = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+            if extension not in REPORT_FORMATS or filename.startswith(('~$', '.')):
+                continue
+            path = os.path.join(directory, filename)
+            week = week_from_path(path, root)
+            if week is None:
+                print(f"[BACKFILL] Skipping {path}: no week or date in its path")
+                continue
+            if (since and week < since) or (until and week > until):
+                continue
+            try:
+                source = identify_source(path)
+            except Exception as e:
+                print(f"[BACKFILL] Skipping {path}: could not read it ({e})")
+                continue
+            if source is None:
+                print(f"[BACKFILL] Skipping {path}: not a known report layout")
+                continue
+
+            files = weeks.setdefault(week, {})
+            if source in files:
+                newer = max(files[source], path, key=os.path.getmtime)
+                print(f"[BACKFILL] {week}: two {source.upper()} reports, using {newer}")
+                path = newer
+            files[source] = path
+    return dict(sorted(weeks.items()))
+
+
+def load_state(state_file):
+    if not os.path.exists(state_file):
+        return {'weeks': {}}
+    with open(state_file, 'r') as f:
+        return json.load(f)
+
+
+def save_state(state_file, state):
+    os.makedirs(os.path.dirname(os.path.abspath(state_file)), exist_ok=True)
+    tmp_path = f"{state_file}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_file)
+
+
+def files_fingerprint(files):
+    """source -> content hash, used to tell whether a done week's inputs changed"""
+    return {source: file_sha256(path) for source, path in sorted(files.items())}
+
+
+def process_week(week, files):
+    """
+    Worker: run the ETL for one week's file set, with All Leads recovery
+    measured at the end of that week rather than today.
+    Returns the result frame, or the error and the tail of the ETL output.
+    """
+    started = time.perf_counter()
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            df = flexible_etl_pipeline(archived_inputs=True, as_of=week_end(week),
+                                       **{f"{source}_file": path for source, path in files.items()})
+            # Sidecars queued by the streaming All Leads reader, before this worker can exit
+            wait_for_sidecars()
+        return {'week': week, 'frame': df, 'elapsed': time.perf_counter() - started}
+    except Exception as e:
+        tail = log.getvalue().splitlines()[-ERROR_LOG_LINES:]
+        return {'week': week, 'error': f"{type(e).__name__}: {e}", 'log_tail': tail,
+                'elapsed': time.perf_counter() - started}
+
+
+def commit_week(result, files, state, state_file, detect_anomalies=True):
+    """Write one week's snapshot (in week order) and record it in the state file"""
+    week = result['week']
+    entry = {
+        'files': {source: os.path.abspath(path) for source, path in files.items()},
+        'fingerprint': files_fingerprint(files),
+        'elapsed_seconds': round(result['elapsed'], 2),
+        'finished_at': datetime.now().isoformat()
+    }
+
+    if 'error' in result:
+        entry.update(status='failed', error=result['error'], log_tail=result['log_tail'])
+    else:
+        df = result['frame']
+        try:
+            if detect_anomalies:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    df = attach_anomalies(df, current_week=week)
+            snapshot = write_snapshot(df, week=week, source_files=[f"{source}_file" for source in files])
+            entry.update(status='done', snapshot_id=snapshot['snapshot_id'], rows=len(df))
+        except Exception as e:
+            entry.update(status='failed', error=f"{type(e).__name__}: {e}")
+
+    state['weeks'][week] = entry
+    save_state(state_file, state)
+    return entry
+
+
+def run_backfill(root, workers=None, state_file=DEFAULT_STATE_FILE, since=None, until=None,
+                 force=False, dry_run=False, detect_anomalies=True):
+    """
+    Discover, process and snapshot every week under root.
+
+    Returns:
+    dict: Throughput summary (weeks done/failed/skipped, rows, bytes, seconds)
+    """
+    started = time.perf_counter()
+    weeks = discover_weeks(root, since, until)
+    state = load_state(state_file)
+
+    to_run = {}
+    skipped = 0
+    for week, files in weeks.items():
+        previous = state['weeks'].get(week)
+        if not force and previous and previous.get('status') == 'done' \
+                and previous.get('fingerprint') == files_fingerprint(files):
+            skipped += 1
+            continue
+        to_run[week] = files
+
+    print(f"[BACKFILL] {len(weeks)} weeks found under {root}: {len(to_run)} to process, {skipped} already done")
+    for week, files in to_run.items():
+        print(f"[BACKFILL]   {week}: {', '.join(sorted(files))}")
+    if dry_run or not to_run:
+        return {'weeks_found': len(weeks), 'weeks_done': 0, 'weeks_failed': 0, 'weeks_skipped': skipped}
+
+    total_bytes = sum(os.path.getsize(path) for files in to_run.values() for path in files.values())
+    order = sorted(to_run)
+    pending = {}
+    next_index = 0
+    done = failed = rows = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(process_week, week, to_run[week]) for week in order]
+        for future in as_completed(futures):
+            result = future.result()
+            pending[result['week']] = result
+
+            # Snapshots are committed oldest week first, as soon as every earlier week is finished
+            while next_index < len(order) and order[next_index] in pending:
+                week = order[next_index]
+                entry = commit_week(pending.pop(week), to_run[week], state, state_file, detect_anomalies)
+                next_index += 1
+                elapsed = time.perf_counter() - started
+                if entry['status'] == 'done':
+                    done += 1
+                    rows += entry['rows']
+                    print(f"[BACKFILL] {week} done in {entry['elapsed_seconds']}s ({entry['rows']} agents) "
+                          f"[{next_index}/{len(order)}, {next_index / elapsed * 60:.1f} weeks/min]")
+                else:
+                    failed += 1
+                    print(f"[BACKFILL] {week} FAILED: {entry['error']}")
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        'weeks_found': len(weeks),
+        'weeks_done': done,
+        'weeks_failed': failed,
+        'weeks_skipped': skipped,
+        'agent_rows': rows,
+        'input_mb': round(total_bytes / (1024 * 1024), 2),
+        'seconds': round(elapsed, 2),
+        'weeks_per_minute': round(len(order) / elapsed * 60, 2),
+        'rows_per_second': round(rows / elapsed, 1),
+        'mb_per_second': round(total_bytes / (1024 * 1024) / elapsed, 2)
+    }
+    print(f"[BACKFILL] {done} weeks done, {failed} failed, {skipped} skipped in {summary['seconds']}s: "
+          f"{summary['weeks_per_minute']} weeks/min, {summary['rows_per_second']} agent rows/s, "
+          f"{summary['mb_per_second']} MB/s of reports")
+    if failed:
+        print(f"[BACKFILL] Re-run the same command to retry failed weeks (state: {state_file})")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('root', help='Directory tree of weekly report exports')
+    parser.add_argument('--workers', type=int, default=None, help='ETL processes (default: CPU count)')
+    parser.add_argument('--state', default=DEFAULT_STATE_FILE, help='Resume state file')
+    parser.add_argument('--since', help='First ISO week to process, e.g. 2025-W30')
+    parser.add_argument('--until', help='Last ISO week to process')
+    parser.add_argument('--force', action='store_true', help='Reprocess weeks already done')
+    parser.add_argument('--dry-run', action='store_true', help='Only list the weeks and files found')
+    parser.add_argument('--no-anomalies', action='store_true', help='Skip anomaly detection')
+    args = parser.parse_args()
+
+    summary = run_backfill(args.root, args.workers, args.state, args.since, args.until,
+                           args.force, args.dry_run, not args.no_anomalies)
+    raise SystemExit(1 if summary['weeks_failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
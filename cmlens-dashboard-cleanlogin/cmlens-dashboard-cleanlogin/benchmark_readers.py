@@ -0,0 +1,81 @@
+"""
+Compare report parsing time for the same report as xlsx, CSV and Parquet.
+
+Usage:
+    python benchmark_readers.py all_leads path/to/all_leads.xlsx [--repeat 3]
+
+The workbook is converted to CSV (and, for reports whose header is the first
+row, Parquet) in a temporary directory; each copy is then read with
+report_readers.read_report_rows and run through the ETL for its source.
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+from report_readers import read_report_rows
+from script import flexible_etl_pipeline
+from source_layouts import SOURCE_LAYOUTS
+
+
+def best_of(repeat, func):
+    """Fastest wall time of `repeat` runs, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def convert_report(source, xlsx_path, out_dir):
+    """Write CSV and Parquet copies of a workbook; returns format -> path"""
+    paths = {'xlsx': xlsx_path}
+    raw = pd.read_excel(xlsx_path, header=None)
+    paths['csv'] = os.path.join(out_dir, f"{source}.csv")
+    raw.to_csv(paths['csv'], header=False, index=False)
+
+    # Parquet carries column names, so it only fits layouts whose header is row 0
+    if all(spec['header_row'] == 0 for spec in SOURCE_LAYOUTS[source]):
+        df = pd.read_excel(xlsx_path)
+        for col in df.columns:
+            if df[col].dtype == object:
+                df[col] = df[col].map(lambda v: None if pd.isna(v) else str(v))
+        paths['parquet'] = os.path.join(out_dir, f"{source}.parquet")
+        df.to_parquet(paths['parquet'], index=False)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', choices=sorted(SOURCE_LAYOUTS))
+    parser.add_argument('xlsx_path')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    out_dir = tempfile.mkdtemp(prefix='cmlens_bench_')
+    try:
+        paths = convert_report(args.source, args.xlsx_path, out_dir)
+        rows = len(read_report_rows(paths['csv']))
+        print(f"[BENCH] {args.source} report, {rows} rows, best of {args.repeat}")
+        print(f"{'format':<10}{'size MB':>10}{'read s':>10}{'etl s':>10}{'speedup':>10}")
+
+        baseline = None
+        for report_format, path in paths.items():
+            read_time = best_of(args.repeat, lambda: read_report_rows(path))
+            etl_time = best_of(args.repeat, lambda: flexible_etl_pipeline(**{f"{args.source}_file": path}))
+            baseline = baseline or etl_time
+            size = os.path.getsize(path) / (1024 * 1024)
+            print(f"{report_format:<10}{size:>10.2f}{read_time:>10.3f}{etl_time:>10.3f}{baseline / etl_time:>9.1f}x")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
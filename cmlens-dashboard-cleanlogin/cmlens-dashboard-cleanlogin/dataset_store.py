@@ -0,0 +1,259 @@
+import os
+import json
+import tempfile
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from script import normalize_name, coalesce_duplicate_columns, team_keys, build_rollups
+from scoring import METRIC_COLUMNS, metric_matrix, score_agents
+from rank_index import MetricRankIndex
+from insight_rules import precompute_insights
+from snapshot_history import prepare_frame, restore_frame
+
+# Where the last processed dataset is persisted so it survives restarts:
+#   DATASET_FOLDER/current_dataset.json            metadata, rollups and the frame file name
+#   DATASET_FOLDER/dataset_<timestamp>.parquet     the agent frame
+# Plain data formats only, so reading the folder back never executes anything.
+DATASET_FOLDER = os.environ.get('CMLENS_DATASET_DIR', os.path.join(tempfile.gettempdir(), 'dataset'))
+DATASET_FILE = os.path.join(DATASET_FOLDER, 'current_dataset.json')
+
+
+def to_native(value):
+    """Convert numpy/pandas scalars to JSON-friendly Python values"""
+    if isinstance(value, (list, tuple, dict)):
+        return value
+    try:
+        if pd.isna(value):
+            return None
+    except (ValueError, TypeError):
+        return value
+    if isinstance(value, (np.bool_, bool)):
+        return bool(value)
+    if isinstance(value, (np.integer, int)):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        return float(value)
+    return value
+
+
+class AgentDataset:
+    """
+    Columnar snapshot of the last processed ETL result.
+
+    Each column is held as a numpy array, with a normalized Name -> row index
+    and a team -> row positions index, so single agent and team lookups do
+    not need to scan the frame. Scores and categories for every agent are
+    computed once here from the metric matrix, and so is the rule-based
+    coaching/meeting text used when the AI is unavailable.
+    """
+
+    def __init__(self, df, metadata=None, rollups=None):
+        frame = coalesce_duplicate_columns(df).reset_index(drop=True)
+        if 'Name' not in frame.columns:
+            raise ValueError("Dataset must contain a 'Name' column")
+
+        # Batch scoring: one (agents x metrics) matrix, scored in a single pass
+        self.metric_keys = list(METRIC_COLUMNS.keys())
+        self.metric_matrix = metric_matrix(frame, self.metric_keys)
+        if 'Score' not in frame.columns or 'Category' not in frame.columns:
+            frame = frame.drop(columns=['Score', 'Category'], errors='ignore').join(score_agents(frame))
+
+        self.frame = frame
+        self.metadata = metadata or {}
+        self.columns = {col: frame[col].to_numpy() for col in frame.columns}
+
+        # Name index: normalized agent name -> row position
+        self.name_index = {}
+        for pos, name in enumerate(self.columns['Name']):
+            key = normalize_name(name)
+            if isinstance(key, str) and key and key not in self.name_index:
+                self.name_index[key] = pos
+
+        # Team index: team -> row positions (Team, falling back to Group, then Unassigned)
+        self.team_index = {}
+        for pos, team in enumerate(team_keys(frame)):
+            self.team_index.setdefault(team, []).append(pos)
+
+        # Rollups are materialized by flexible_etl_pipeline; rebuild only if missing
+        self.rollups = rollups or df.attrs.get('rollups') or build_rollups(frame)
+
+        # Sorted scores per team so threshold counts are a binary search
+        scores = self.columns['Score'].astype(float)
+        self.sorted_scores = np.sort(scores)
+        self.team_sorted_scores = {
+            team: np.sort(scores[positions]) for team, positions in self.team_index.items()
+        }
+
+        # Per-metric rank/percentile index for leaderboards
+        self.rank_index = MetricRankIndex(self.columns)
+
+        # Fallback insight text for every agent: threshold rules as masks over the whole matrix
+        self.insights = precompute_insights(self.metric_matrix, scores, self.metric_keys)
+
+        self._team_roster = None
+
+    def __len__(self):
+        return len(self.frame)
+
+    def record(self, pos):
+        """Return one agent row as a plain dict"""
+        return {col: to_native(values[pos]) for col, values in self.columns.items()}
+
+    def records(self, positions=None):
+        """Return agent rows as plain dicts, optionally restricted to row positions"""
+        if positions is None:
+            positions = range(len(self.frame))
+        return [self.record(pos) for pos in positions]
+
+    def position(self, agent_id):
+        """Row position of an agent, or None if unknown"""
+        return self.name_index.get(normalize_name(agent_id))
+
+    def get_agent(self, agent_id):
+        """Look up an agent by id/name (case and whitespace insensitive)"""
+        pos = self.position(agent_id)
+        return None if pos is None else self.record(pos)
+
+    def row_mask(self, team=None, group=None):
+        """Boolean row mask for a team and/or group filter, or None when unfiltered"""
+        if not team and not group:
+            return None
+        mask = np.ones(len(self.frame), dtype=bool)
+        if team:
+            team_mask = np.zeros(len(self.frame), dtype=bool)
+            team_mask[self.team_positions(team)] = True
+            mask &= team_mask
+        if group:
+            groups = self.columns.get('Group')
+            mask &= (groups == group) if groups is not None else False
+        return mask
+
+    def count_below(self, threshold, team=None):
+        """Number of agents (optionally in one team) scoring below threshold"""
+        scores = self.team_sorted_scores.get(team, np.array([])) if team else self.sorted_scores
+        return int(np.searchsorted(scores, threshold, side='left'))
+
+    def teams(self):
+        return sorted(self.team_index.keys())
+
+    def team_positions(self, team):
+        return self.team_index.get(team, [])
+
+    def team_records(self, team):
+        return self.records(self.team_positions(team))
+
+    def team_roster(self):
+        """team -> [{id, name}] for the frontend selectors, built once per dataset"""
+        if self._team_roster is None:
+            names = self.columns['Name']
+            self._team_roster = {
+                team: [{'id': str(names[pos]), 'name': str(names[pos])} for pos in positions]
+                for team, positions in sorted(self.team_index.items())
+            }
+        return self._team_roster
+
+
+_current_dataset = None
+_current_mtime = None
+_lock = threading.Lock()
+
+
+def _write_dataset_file(dataset):
+    """
+    Persist the dataset: the frame as a new Parquet file, then the JSON file that
+    points at it, swapped in atomically so readers never see a half-written dataset.
+    """
+    os.makedirs(DATASET_FOLDER, exist_ok=True)
+    frame_file = f"dataset_{datetime.now().strftime('%Y%m%dT%H%M%S%f')}_{os.getpid()}.parquet"
+    frame_path = os.path.join(DATASET_FOLDER, frame_file)
+    tmp_path = f"{frame_path}.tmp"
+    prepare_frame(dataset.frame).to_parquet(tmp_path, engine='pyarrow', index=False)
+    os.replace(tmp_path, frame_path)
+
+    tmp_path = f"{DATASET_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'frame_file': frame_file, 'metadata': dataset.metadata, 'rollups': dataset.rollups}, f, default=str)
+    os.replace(tmp_path, DATASET_FILE)
+
+    # Frames of earlier datasets are no longer referenced
+    for name in os.listdir(DATASET_FOLDER):
+        if name.startswith('dataset_') and name.endswith('.parquet') and name != frame_file:
+            try:
+                os.remove(os.path.join(DATASET_FOLDER, name))
+            except OSError:
+                pass
+    return os.path.getmtime(DATASET_FILE)
+
+
+def _read_dataset_file():
+    """The persisted dataset and the mtime it was read at (caller holds _lock)"""
+    mtime = os.path.getmtime(DATASET_FILE)
+    with open(DATASET_FILE, 'r') as f:
+        payload = json.load(f)
+    frame_file = os.path.basename(payload['frame_file'])
+    frame = restore_frame(pq.read_table(os.path.join(DATASET_FOLDER, frame_file)))
+    return AgentDataset(frame, payload.get('metadata'), payload.get('rollups')), mtime
+
+
+def publish_dataset(df, metadata=None, persist=True):
+    """Replace the in-process dataset with a freshly processed ETL result"""
+    global _current_dataset, _current_mtime
+
+    metadata = dict(metadata or {})
+    metadata.setdefault('processed_at', datetime.now().isoformat())
+    dataset = AgentDataset(df, metadata)
+
+    with _lock:
+        _current_dataset = dataset
+        # Without a fresh file, remember the on-disk mtime so get_dataset doesn't reload a stale copy
+        _current_mtime = os.path.getmtime(DATASET_FILE) if os.path.exists(DATASET_FILE) else None
+        if persist:
+            try:
+                _current_mtime = _write_dataset_file(dataset)
+            except Exception as e:
+                print(f"[DATASET] Warning: could not persist dataset: {e}")
+
+    print(f"[DATASET] Published dataset with {len(dataset)} agents across {len(dataset.team_index)} teams")
+    return dataset
+
+
+def load_dataset_from_disk():
+    """Load the persisted dataset (if any) into the in-process store"""
+    global _current_dataset, _current_mtime
+
+    if not os.path.exists(DATASET_FILE):
+        print(f"[DATASET] No persisted dataset found at {DATASET_FILE}")
+        return None
+
+    with _lock:
+        _current_dataset, _current_mtime = _read_dataset_file()
+
+    print(f"[DATASET] Loaded persisted dataset with {len(_current_dataset)} agents from {DATASET_FILE}")
+    return _current_dataset
+
+
+def get_dataset():
+    """
+    Return the current dataset, or None if nothing has been processed yet.
+    Reloads from disk when another worker process has published a newer file.
+    """
+    global _current_dataset, _current_mtime
+
+    with _lock:
+        try:
+            mtime = os.path.getmtime(DATASET_FILE)
+        except OSError:
+            mtime = None
+
+        if mtime is not None and mtime != _current_mtime:
+            try:
+                _current_dataset, _current_mtime = _read_dataset_file()
+                print(f"[DATASET] Reloaded dataset with {len(_current_dataset)} agents from {DATASET_FILE}")
+            except Exception as e:
+                print(f"[DATASET] Warning: could not reload dataset: {e}")
+
+        return _current_dataset
@@ -0,0 +1,59 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from script import flexible_etl_pipeline, invalidate_column_mappings
+
+# ETL worker processes used by the ASGI app, so a pipeline run never holds the
+# event loop's GIL. Without a started pool run_etl runs in the calling thread.
+ETL_POOL_WORKERS = int(os.environ.get('CMLENS_ETL_POOL_WORKERS', 2))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Bumped when cached column mappings are invalidated; each worker compares it
+# with the generation it last saw and drops its own cache when they differ
+_mapping_generation = 0
+_worker_generation = 0
+
+
+def _run_job(generation, kwargs):
+    """Runs in a worker process"""
+    global _worker_generation
+    if generation != _worker_generation:
+        invalidate_column_mappings()
+        _worker_generation = generation
+    return flexible_etl_pipeline(**kwargs)
+
+
+def start_etl_pool(workers=ETL_POOL_WORKERS):
+    """Start the worker processes (spawned, so they do not inherit the server's threads)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None and workers > 0:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            print(f"[ETL] Started {workers} ETL worker processes")
+        return _pool
+
+
+def stop_etl_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def run_etl(**kwargs):
+    """flexible_etl_pipeline(**kwargs), in a worker process when the pool is running"""
+    pool = _pool
+    if pool is None:
+        return flexible_etl_pipeline(**kwargs)
+    return pool.submit(_run_job, _mapping_generation, kwargs).result()
+
+
+def invalidate_worker_mappings():
+    """Make every worker drop its cached column mappings before its next job"""
+    global _mapping_generation
+    _mapping_generation += 1
@@ -0,0 +1,218 @@
+import os
+import time
+import threading
+from datetime import datetime
+
+from anomaly_detection import attach_anomalies
+from dataset_store import publish_dataset
+from report_readers import REPORT_FORMATS
+from script import flexible_etl_pipeline
+from snapshot_history import name_reference, write_snapshot
+from upload_validation import identify_source
+
+# Folder the CRM drops weekly reports into; the watcher only runs when this is set
+INBOX_FOLDER = os.environ.get('CMLENS_INBOX_DIR')
+INBOX_POLL_SECONDS = float(os.environ.get('CMLENS_INBOX_POLL_SECONDS', 10))
+# A file is ingested once it has not changed for this long (and across two polls)
+INBOX_SETTLE_SECONDS = float(os.environ.get('CMLENS_INBOX_SETTLE_SECONDS', 30))
+
+
+class InboxWatcher:
+    """
+    Polls an inbox folder and ingests the reports dropped into it.
+
+    Each poll lists the folder, waits for files to settle, classifies new or
+    changed files by their header layout, picks the newest file per source and,
+    when that selection changed, runs the pipeline and publishes the result to
+    the in-process dataset (plus a history snapshot). Extracted reports are kept
+    between runs, so only the sources whose file content changed are re-read.
+    """
+
+    def __init__(self, inbox, poll_seconds=INBOX_POLL_SECONDS, settle_seconds=INBOX_SETTLE_SECONDS,
+                 detect_anomalies=True, on_ingest=None):
+        self.inbox = inbox
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.detect_anomalies = detect_anomalies
+        self.on_ingest = on_ingest
+        self.report_cache = {}
+        self._observed = {}     # path -> (size, mtime_ns) at the previous poll
+        self._classified = {}   # path -> ((size, mtime_ns), source or None)
+        self._ingested = {}     # source -> (path, size, mtime_ns) of the last run
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {
+            'polls': 0,
+            'runs': 0,
+            'last_poll': None,
+            'last_run': None,
+            'last_run_seconds': None,
+            'last_changed_sources': [],
+            'last_error': None,
+            'unrecognized_files': []
+        }
+
+    def _settled_files(self):
+        """Report files whose size and mtime are unchanged since the last poll and old enough"""
+        now = time.time()
+        current = {}
+        settled = {}
+        for entry in os.scandir(self.inbox):
+            name = entry.name
+            extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+            if not entry.is_file() or extension not in REPORT_FORMATS or name.startswith(('~$', '.')):
+                continue
+            stat = entry.stat()
+            signature = (stat.st_size, stat.st_mtime_ns)
+            current[entry.path] = signature
+            if self._observed.get(entry.path) == signature and now - stat.st_mtime >= self.settle_seconds:
+                settled[entry.path] = signature
+        self._observed = current
+        return settled
+
+    def _classify(self, settled):
+        """source -> newest settled file, classifying only new or changed files"""
+        newest = {}
+        for path, signature in settled.items():
+            known = self._classified.get(path)
+            if known is None or known[0] != signature:
+                try:
+                    source = identify_source(path)
+                except Exception as e:
+                    print(f"[INBOX] Could not read {path}: {e}")
+                    source = None
+                if source is None:
+                    print(f"[INBOX] {os.path.basename(path)} does not match any report layout; ignoring it")
+                self._classified[path] = (signature, source)
+            source = self._classified[path][1]
+            if source and (source not in newest or signature[1] > settled[newest[source]][1]):
+                newest[source] = path
+
+        self._classified = {path: value for path, value in self._classified.items() if path in settled}
+        self.stats['unrecognized_files'] = sorted(
+            os.path.basename(path) for path, (_, source) in self._classified.items() if source is None
+        )
+        return newest
+
+    def poll_once(self):
+        """
+        One poll: ingest when the newest settled file of any source changed.
+
+        Returns:
+        list: Sources that changed (empty when nothing was ingested)
+        """
+        with self._lock:
+            self.stats['polls'] += 1
+            self.stats['last_poll'] = datetime.now().isoformat()
+            if not os.path.isdir(self.inbox):
+                return []
+
+            settled = self._settled_files()
+            files = self._classify(settled)
+            selection = {source: (path,) + settled[path] for source, path in files.items()}
+            changed = sorted(source for source in selection if self._ingested.get(source) != selection[source])
+            if not changed:
+                return []
+
+            self._ingest(files, changed)
+            # Failed runs are not retried until one of the files changes again
+            self._ingested = selection
+            return changed
+
+    def _ingest(self, files, changed):
+        started = time.perf_counter()
+        print(f"[INBOX] Ingesting {len(files)} reports (changed: {', '.join(changed)})")
+        try:
+            # A late report for an earlier week is measured at, and filed under, that week
+            week, as_of = report_reference(files['all_leads']) if 'all_leads' in files else (None, None)
+            result_df = flexible_etl_pipeline(
+                report_cache=self.report_cache,
+                archived_inputs=True,
+                as_of=as_of,
+                **{f"{source}_file": path for source, path in files.items()}
+            )
+            if self.detect_anomalies:
+                try:
+                    result_df = attach_anomalies(result_df, current_week=week)
+                except Exception as e:
+                    print(f"[ANOMALY] Warning: anomaly detection skipped: {e}")
+
+            source_files = [f"{source}_file" for source in sorted(files)]
+            dataset = publish_dataset(result_df, metadata={
+                'processed_files': source_files,
+                'ingested_from': 'inbox',
+                'inbox_files': {source: os.path.basename(path) for source, path in files.items()}
+            })
+            try:
+                write_snapshot(result_df, week=week, source_files=source_files)
+            except Exception as e:
+                print(f"[HISTORY] Warning: could not write snapshot: {e}")
+
+            self.stats.update(last_error=None)
+            print(f"[INBOX] Published dataset with {len(dataset)} agents")
+            if self.on_ingest is not None:
+                self.on_ingest(dataset)
+        except Exception as e:
+            self.stats.update(last_error=f"{type(e).__name__}: {e}")
+            print(f"[INBOX] ERROR: Ingestion failed: {e}")
+        finally:
+            self.stats['runs'] += 1
+            self.stats['last_run'] = datetime.now().isoformat()
+            self.stats['last_run_seconds'] = round(time.perf_counter() - started, 2)
+            self.stats['last_changed_sources'] = changed
+
+    def _run(self):
+        print(f"[INBOX] Watching {self.inbox} every {self.poll_seconds}s (settle {self.settle_seconds}s)")
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                self.stats['last_error'] = f"{type(e).__name__}: {e}"
+                print(f"[INBOX] ERROR: Poll failed: {e}")
+            self._stop.wait(self.poll_seconds)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='inbox-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def status(self):
+        return {
+            'enabled': True,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'inbox': self.inbox,
+            'poll_seconds': self.poll_seconds,
+            'settle_seconds': self.settle_seconds,
+            'current_files': {source: os.path.basename(entry[0]) for source, entry in self._ingested.items()},
+            **self.stats
+        }
+
+
+def report_reference(path):
+    """
+    (ISO week or None, reference date) of a dropped report: the week or date in its
+    file name, else its modification time (when the CRM exported it) and no week.
+    """
+    reference = name_reference(os.path.basename(path))
+    if reference is not None:
+        return reference
+    return None, datetime.fromtimestamp(os.path.getmtime(path))
+
+
+def start_inbox_watcher(detect_anomalies=True, on_ingest=None):
+    """
+    Start the background watcher when CMLENS_INBOX_DIR is set; returns it (or None).
+    on_ingest(dataset) is called after each published dataset and its snapshot.
+    """
+    if not INBOX_FOLDER:
+        return None
+    os.makedirs(INBOX_FOLDER, exist_ok=True)
+    return InboxWatcher(INBOX_FOLDER, detect_anomalies=detect_anomalies, on_ingest=on_ingest).start()
@@ -0,0 +1,108 @@
+import numpy as np
+
+from scoring import DEFAULT_THRESHOLDS, DEFAULT_WEIGHTS, METRIC_COLUMNS, below_threshold_mask, score_matrix
+
+# Coaching line per metric below its DEFAULT_THRESHOLDS target ({value} on the 0-100 scale, as VALUE_FORMAT)
+COACHING_RULES = {
+    'fixedPct': "• Student retention (Fixed%: {value}%) is below target ({target}%). "
+                "Focus on improving class engagement and addressing student concerns early.",
+    'ccPct': "• Class coverage (CC%: {value}%) needs improvement. "
+             "Encourage students to attend at least 12 classes for better outcomes.",
+    'scPct': "• Success calls (SC%: {value}%) are underperforming. "
+             "Review call scripts and timing for M1-M4 super class consumption.",
+    'upPct': "• Upselling (UP%: {value}%) is below expectations. "
+             "Focus on identifying upgrade opportunities and improving sales techniques."
+}
+# Short label per metric below its target, listed with each agent on the Meetings page
+WEAKNESS_RULES = {
+    'fixedPct': "Student retention below {target}%",
+    'ccPct': "Class coverage needs improvement",
+    'scPct': "Success calls below target",
+    'upPct': "Upselling rate needs improvement"
+}
+VALUE_FORMAT = '%.1f'
+COACHING_ON_TARGET = "• Performance is meeting targets. Consider advanced coaching for further optimization."
+
+# Meeting discussion points by score band: upper bounds of the first two bands
+MEETING_BAND_CUTS = [60, 80]
+MEETING_BANDS = [
+    "• Priority agent requiring immediate attention and action plan\n"
+    "• Discuss specific challenges and barriers to performance\n"
+    "• Set clear improvement targets with timeline",
+    "• Agent showing potential but needs focused coaching\n"
+    "• Identify 1-2 key areas for improvement",
+    "• Strong performer - discuss growth opportunities\n"
+    "• Consider mentoring responsibilities for team"
+]
+
+
+def coaching_insights(matrix, thresholds=None, metrics=None):
+    """
+    Coaching text for every row of an (agents x metrics) matrix on the 0-100 scale.
+    Each rule is one boolean mask over all agents; only flagged cells are formatted.
+    Missing metrics are never flagged (see below_threshold_mask).
+    """
+    thresholds = thresholds or DEFAULT_THRESHOLDS
+    metrics = list(metrics or METRIC_COLUMNS.keys())
+    below = below_threshold_mask(matrix, thresholds, metrics)
+
+    text = np.full(len(matrix), '', dtype=object)
+    for j, metric in enumerate(metrics):
+        if metric not in COACHING_RULES:
+            continue
+        rows = np.flatnonzero(below[:, j])
+        if not len(rows):
+            continue
+        template = COACHING_RULES[metric].replace('{target}', f"{thresholds[metric]:g}")
+        prefix, suffix = template.split('{value}')
+        values = np.array([VALUE_FORMAT % value for value in matrix[rows, j].tolist()], dtype=object)
+        lines = prefix + values + suffix
+        text[rows] = np.where(text[rows] == '', lines, text[rows] + '\n' + lines)
+
+    text[text == ''] = COACHING_ON_TARGET
+    return text
+
+
+def weakness_labels(row, thresholds=None, metrics=None):
+    """WEAKNESS_RULES labels for one metric row (0-100 scale); missing metrics are never flagged"""
+    thresholds = thresholds or DEFAULT_THRESHOLDS
+    metrics = list(metrics or METRIC_COLUMNS.keys())
+    below = below_threshold_mask(np.asarray(row, dtype=float).reshape(1, -1), thresholds, metrics)[0]
+    return [WEAKNESS_RULES[metric].format(target=f"{thresholds[metric]:g}")
+            for metric, flagged in zip(metrics, below.tolist()) if flagged and metric in WEAKNESS_RULES]
+
+
+def meeting_insights(scores):
+    """Meeting discussion points for every score (one band lookup per agent)"""
+    bands = np.digitize(np.nan_to_num(np.asarray(scores, dtype=float)), MEETING_BAND_CUTS)
+    return np.array(MEETING_BANDS, dtype=object)[bands]
+
+
+def precompute_insights(matrix, scores, metrics=None):
+    """Rule-based analysis text per agent, by analysis type, for a whole dataset"""
+    # Payloads carry metrics as fractions (record_metrics): going through the same
+    # float round trip makes 54.95 read "55.0" here too, as it does for a payload
+    payload_scale = matrix / 100 * 100
+    return {
+        'coaching': coaching_insights(payload_scale, metrics=metrics),
+        'meeting': meeting_insights(scores)
+    }
+
+
+def payload_metric_row(metrics, weight_keys=None):
+    """1 x metrics matrix (0-100 scale) from a payload's 'metrics', which holds fractions (record_metrics)"""
+    weight_keys = list(weight_keys or METRIC_COLUMNS.keys())
+    row = np.full((1, len(weight_keys)), np.nan)
+    for j, key in enumerate(weight_keys):
+        value = (metrics or {}).get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            row[0, j] = float(value) * 100
+    return row
+
+
+def payload_score(agent_data):
+    """The payload's score, else the weighted score of its metrics"""
+    score = agent_data.get('score')
+    if isinstance(score, (int, float)) and not isinstance(score, bool):
+        return float(score)
+    return float(score_matrix(payload_metric_row(agent_data.get('metrics')), DEFAULT_WEIGHTS)[0])
@@ -0,0 +1,160 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+# Coaching and meeting notes in one SQLite file (WAL, shared by every worker process).
+# Keep it outside the temp directory; the Dockerfile points CMLENS_NOTES_DB_PATH at the /data volume.
+NOTES_DB_PATH = os.environ.get(
+    'CMLENS_NOTES_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'notes.sqlite3')
+)
+
+# Agent ids per IN (...) query, below SQLite's host parameter limit
+BULK_QUERY_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    notes_type TEXT NOT NULL,
+    agent_id TEXT NOT NULL,
+    week TEXT NOT NULL DEFAULT '',
+    content TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (notes_type, agent_id, week)
+);
+CREATE INDEX IF NOT EXISTS notes_type_week ON notes (notes_type, week);
+"""
+
+_UPSERT = (
+    'INSERT INTO notes (notes_type, agent_id, week, content, updated_at) VALUES (?, ?, ?, ?, ?) '
+    'ON CONFLICT (notes_type, agent_id, week) DO UPDATE SET '
+    'content = excluded.content, updated_at = excluded.updated_at'
+)
+
+
+def _row_to_note(row):
+    notes_type, agent_id, week, content, updated_at = row
+    return {
+        "agent_id": agent_id,
+        "type": notes_type,
+        "content": content,
+        "week": week or None,
+        "updated_at": updated_at
+    }
+
+
+class NotesStore:
+    """Notes keyed by (type, agent, week); week is '' for notes that are not per week"""
+
+    def __init__(self, path=NOTES_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self):
+        """One connection per thread (sqlite3 connections are not shared across threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def save(self, notes_type, agent_id, content, week=None):
+        """Insert or replace one note (a single atomic upsert)"""
+        updated_at = datetime.now().isoformat()
+        self._connection().execute(_UPSERT, (notes_type, agent_id, str(week or ''), content, updated_at))
+        return {"agent_id": agent_id, "type": notes_type, "content": content, "week": week, "updated_at": updated_at}
+
+    def save_many(self, notes_type, notes, week=None):
+        """Upsert {agent_id: content} in one transaction; returns the number written"""
+        updated_at = datetime.now().isoformat()
+        rows = [(notes_type, agent_id, str(week or ''), content, updated_at) for agent_id, content in notes.items()]
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(_UPSERT, rows)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(rows)
+
+    def load(self, notes_type, agent_id, week=None):
+        """One note, or None"""
+        row = self._connection().execute(
+            'SELECT notes_type, agent_id, week, content, updated_at FROM notes '
+            'WHERE notes_type = ? AND agent_id = ? AND week = ?',
+            (notes_type, agent_id, str(week or ''))
+        ).fetchone()
+        return _row_to_note(row) if row else None
+
+    def load_many(self, notes_type, agent_ids, week=None):
+        """agent_id -> note for the agents that have one (one query per BULK_QUERY_CHUNK agents)"""
+        agent_ids = list(dict.fromkeys(agent_ids))
+        notes = {}
+        conn = self._connection()
+        for start in range(0, len(agent_ids), BULK_QUERY_CHUNK):
+            chunk = agent_ids[start:start + BULK_QUERY_CHUNK]
+            rows = conn.execute(
+                'SELECT notes_type, agent_id, week, content, updated_at FROM notes '
+                f'WHERE notes_type = ? AND week = ? AND agent_id IN ({",".join("?" * len(chunk))})',
+                (notes_type, str(week or ''), *chunk)
+            ).fetchall()
+            notes.update((row[1], _row_to_note(row)) for row in rows)
+        return notes
+
+    def import_json_folder(self, folder):
+        """
+        Import notes saved as one JSON file per note (the previous format).
+        A file only replaces a stored note that is older than it, so running
+        this again is harmless. Returns the number of notes imported.
+        """
+        if not os.path.isdir(folder):
+            return 0
+        rows = []
+        for name in sorted(os.listdir(folder)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(folder, name), 'r') as f:
+                    note = json.load(f)
+                rows.append((note['type'], note['agent_id'], str(note.get('week') or ''),
+                             note.get('content', ''), note.get('updated_at') or datetime.now().isoformat()))
+            except Exception as e:
+                print(f"[NOTES] Skipping {name}: {e}")
+        if not rows:
+            return 0
+
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            before = conn.total_changes
+            conn.executemany(_UPSERT + ' WHERE excluded.updated_at > notes.updated_at', rows)
+            imported = conn.total_changes - before
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        print(f"[NOTES] Imported {imported} of {len(rows)} JSON notes from {folder}")
+        return imported
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_notes_store(legacy_folder=None):
+    """Process-wide store; the first call imports JSON notes from legacy_folder"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = NotesStore()
+            if legacy_folder:
+                try:
+                    _store.import_json_folder(legacy_folder)
+                except Exception as e:
+                    print(f"[NOTES] Warning: could not import JSON notes: {e}")
+        return _store
@@ -0,0 +1,327 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# OpenRouter AI configuration (CMLENS_OPENROUTER_BASE_URL points at a stand-in server in development)
+OPENROUTER_API_KEY = os.environ.get('OPENROUTER_API_KEY')
+OPENROUTER_BASE_URL = os.environ.get('CMLENS_OPENROUTER_BASE_URL', "https://openrouter.ai/api/v1")
+OPENROUTER_MODEL = os.environ.get('CMLENS_OPENROUTER_MODEL', "anthropic/claude-3-haiku")
+
+# Whole-request latency budget: past it the caller gets the rule-based fallback
+AI_LATENCY_BUDGET_SECONDS = float(os.environ.get('CMLENS_AI_LATENCY_BUDGET_SECONDS', 8))
+AI_CONNECT_TIMEOUT_SECONDS = 3.0
+
+# Keep-alive connections shared by all request threads
+AI_POOL_SIZE = int(os.environ.get('CMLENS_AI_POOL_SIZE', 10))
+# Worker threads that run synchronous calls, so the caller can stop waiting at the budget
+AI_SYNC_WORKERS = int(os.environ.get('CMLENS_AI_SYNC_WORKERS', 32))
+# Connections for the async client (ASGI app), where one process holds many waiting calls
+AI_ASYNC_POOL_SIZE = int(os.environ.get('CMLENS_AI_ASYNC_POOL_SIZE', 200))
+
+# Circuit breaker: after this many consecutive failures calls go straight to the
+# fallback for AI_BREAKER_RESET_SECONDS, then one trial call decides whether to close it
+AI_BREAKER_FAILURES = int(os.environ.get('CMLENS_AI_BREAKER_FAILURES', 5))
+AI_BREAKER_RESET_SECONDS = float(os.environ.get('CMLENS_AI_BREAKER_RESET_SECONDS', 60))
+
+# Number of recent call latencies kept for the metrics percentiles
+LATENCY_SAMPLES = 500
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open trial after a cool-down"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=AI_BREAKER_FAILURES, reset_seconds=AI_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._times_opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._state = self.HALF_OPEN
+            self._trial_running = False
+        return self._state
+
+    def allow(self):
+        """Whether a call may go out now (only one trial call while half-open)"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._times_opened += 1
+                    print(f"[AI] Circuit breaker opened after {self._failures} consecutive failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+    def snapshot(self):
+        with self._lock:
+            state = self._current_state()
+            retry_in = None
+            if state == self.OPEN:
+                retry_in = round(max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at)), 1)
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'times_opened': self._times_opened,
+                'retry_in_seconds': retry_in
+            }
+
+
+class AIBudgetExceeded(Exception):
+    pass
+
+
+class OpenRouterClient:
+    """
+    Chat completions over one pooled keep-alive session.
+
+    Every call is bounded by a latency budget and guarded by a circuit breaker;
+    any failure returns {"fallback": True, ...} so callers can use the
+    rule-based analysis instead. acomplete() is the asyncio twin of complete()
+    over an httpx connection pool; both share the breaker and the metrics.
+    """
+
+    def __init__(self, api_key=OPENROUTER_API_KEY, base_url=OPENROUTER_BASE_URL, model=OPENROUTER_MODEL,
+                 budget_seconds=AI_LATENCY_BUDGET_SECONDS, pool_size=AI_POOL_SIZE, breaker=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.budget_seconds = budget_seconds
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://your-app.replit.dev",
+            "X-Title": "CMLens Dashboard"
+        })
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._counts = {'calls': 0, 'succeeded': 0, 'failed': 0, 'timed_out': 0, 'short_circuited': 0}
+        self._lock = threading.Lock()
+        self._async_client = None
+        self._workers = ThreadPoolExecutor(max_workers=AI_SYNC_WORKERS, thread_name_prefix='openrouter')
+
+    def _count(self, key, latency=None):
+        with self._lock:
+            self._counts[key] += 1
+            if latency is not None:
+                self._latencies.append(latency)
+
+    def _post(self, payload, budget):
+        """
+        POST within the budget: the caller waits at most `budget` seconds for the
+        whole call, like acomplete() does with wait_for. The abandoned worker stops
+        at the same deadline, or one read timeout later if it is blocked on a read.
+        """
+        deadline = time.monotonic() + budget
+        future = self._workers.submit(self._fetch, payload, budget, deadline)
+        try:
+            return future.result(timeout=budget)
+        except FutureTimeout:
+            future.cancel()
+            raise AIBudgetExceeded(f"response not complete within {budget}s")
+
+    def _fetch(self, payload, budget, deadline):
+        """Worker side of _post: the body is read in chunks and abandoned at the deadline"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise AIBudgetExceeded(f"no worker free within {budget}s")
+        response = self.session.post(
+            f"{self.base_url}/chat/completions",
+            json=payload,
+            timeout=(min(AI_CONNECT_TIMEOUT_SECONDS, remaining), remaining),
+            stream=True
+        )
+        try:
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=16384):
+                body.extend(chunk)
+                if time.monotonic() > deadline:
+                    raise AIBudgetExceeded(f"response not complete within {budget}s")
+            return response.status_code, bytes(body)
+        finally:
+            response.close()
+
+    def _precheck(self):
+        """Early fallback result when no call may go out, else None"""
+        if not self.api_key:
+            return {"error": "OpenRouter API key not configured", "fallback": True}
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            return {"error": "AI temporarily unavailable (circuit open)", "fallback": True}
+        return None
+
+    def _payload(self, prompt, agent_data, max_tokens, temperature):
+        formatted_prompt = prompt
+        if agent_data:
+            formatted_prompt += f"\n\nAgent Performance Data:\n{json.dumps(agent_data, indent=2)}"
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": formatted_prompt}],
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+
+    def _succeeded(self, status, body, started):
+        if status != 200:
+            raise ValueError(f"API Error: {status}")
+        analysis = json.loads(body)['choices'][0]['message']['content']
+        self.breaker.record_success()
+        self._count('succeeded', time.monotonic() - started)
+        return {"success": True, "analysis": analysis, "fallback": False}
+
+    def _timed_out(self, budget, started, error):
+        self.breaker.record_failure()
+        self._count('timed_out', time.monotonic() - started)
+        print(f"[AI] OpenRouter call exceeded the {budget}s budget: {error}")
+        return {"error": f"AI response exceeded {budget}s", "fallback": True}
+
+    def _failed(self, started, error):
+        self.breaker.record_failure()
+        self._count('failed', time.monotonic() - started)
+        print(f"[AI] OpenRouter call failed: {error}")
+        return {"error": str(error), "fallback": True}
+
+    def complete(self, prompt, agent_data=None, max_tokens=500, temperature=0.7, budget_seconds=None):
+        """
+        Run one completion.
+
+        Returns:
+        dict: {"success": True, "analysis": text, "fallback": False} or
+              {"error": message, "fallback": True}
+        """
+        early = self._precheck()
+        if early is not None:
+            return early
+
+        payload = self._payload(prompt, agent_data, max_tokens, temperature)
+        budget = budget_seconds or self.budget_seconds
+        started = time.monotonic()
+        self._count('calls')
+        try:
+            status, body = self._post(payload, budget)
+            return self._succeeded(status, body, started)
+        except (requests.Timeout, AIBudgetExceeded) as e:
+            return self._timed_out(budget, started, e)
+        except Exception as e:
+            return self._failed(started, e)
+
+    def _get_async_client(self):
+        """httpx client, created on first use inside the running event loop"""
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=dict(self.session.headers),
+                limits=httpx.Limits(max_connections=AI_ASYNC_POOL_SIZE,
+                                    max_keepalive_connections=AI_ASYNC_POOL_SIZE),
+                timeout=httpx.Timeout(self.budget_seconds, connect=AI_CONNECT_TIMEOUT_SECONDS)
+            )
+        return self._async_client
+
+    async def acomplete(self, prompt, agent_data=None, max_tokens=500, temperature=0.7, budget_seconds=None):
+        """complete() without a thread: the whole request is awaited under the latency budget"""
+        early = self._precheck()
+        if early is not None:
+            return early
+
+        payload = self._payload(prompt, agent_data, max_tokens, temperature)
+        budget = budget_seconds or self.budget_seconds
+        started = time.monotonic()
+        self._count('calls')
+        try:
+            response = await asyncio.wait_for(
+                self._get_async_client().post('/chat/completions', json=payload,
+                                              timeout=httpx.Timeout(budget, connect=min(AI_CONNECT_TIMEOUT_SECONDS, budget))),
+                budget
+            )
+            return self._succeeded(response.status_code, response.content, started)
+        except (asyncio.TimeoutError, httpx.TimeoutException) as e:
+            return self._timed_out(budget, started, type(e).__name__)
+        except Exception as e:
+            return self._failed(started, e)
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def metrics(self):
+        """Call counts, latency percentiles (ms) over recent calls and the breaker state"""
+        with self._lock:
+            counts = dict(self._counts)
+            latencies = sorted(self._latencies)
+
+        def percentile(q):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1)
+
+        return {
+            'configured': bool(self.api_key),
+            'base_url': self.base_url,
+            'model': self.model,
+            'budget_seconds': self.budget_seconds,
+            'counts': counts,
+            'latency_ms': {
+                'samples': len(latencies),
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'max': round(latencies[-1] * 1000, 1) if latencies else None
+            },
+            'breaker': self.breaker.snapshot()
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_openrouter_client():
+    """Process-wide client, so every request thread shares the connection pool"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenRouterClient()
+        return _client
@@ -0,0 +1,100 @@
+"""
+Local stand-in for the OpenRouter chat completions API, for development and testing.
+
+Usage:
+    python openrouter_standin.py [--port 8099] [--delay 0.2] [--ms-per-1k-tokens 150]
+    CMLENS_OPENROUTER_BASE_URL=http://127.0.0.1:8099/api/v1 OPENROUTER_API_KEY=dev python web_backend.py
+
+Behaviour can be changed while it runs, e.g. to exercise the latency budget
+and the circuit breaker:
+    curl -X POST localhost:8099/control -H 'Content-Type: application/json' \\
+         -d '{"delay": 12, "status": 200}'
+"""
+import argparse
+import json
+import threading
+import time
+
+from flask import Flask, Response, jsonify, request
+
+app = Flask(__name__)
+
+# Current behaviour: seconds to wait before answering, extra milliseconds per 1k prompt
+# tokens (roughly how prompt processing time grows with size), the status code to answer
+# with, and seconds between sending the headers and sending the body
+behaviour = {'delay': 0.0, 'ms_per_1k_tokens': 0.0, 'status': 200, 'body_delay': 0.0}
+stats = {'requests': 0}
+_lock = threading.Lock()
+
+# Heading the client puts before the agent data it appends to a prompt
+PACKED_DATA_MARKER = 'Agent Performance Data:\n'
+
+
+@app.route('/api/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    with _lock:
+        stats['requests'] += 1
+        delay, per_1k, status = behaviour['delay'], behaviour['ms_per_1k_tokens'], behaviour['status']
+        body_delay = behaviour['body_delay']
+    data = request.get_json(silent=True) or {}
+    prompt = (data.get('messages') or [{}])[-1].get('content', '')
+    delay += per_1k * (len(prompt) / 4) / 1000 / 1000
+    if delay:
+        time.sleep(delay)
+    if status != 200:
+        return jsonify({"error": {"message": "stand-in failure", "code": status}}), status
+
+    first_line = prompt.strip().splitlines()[0] if prompt.strip() else ''
+    content = f"[stand-in] {len(prompt)} prompt characters. First line: {first_line[:120]}"
+    if 'keyed by agent id' in prompt and PACKED_DATA_MARKER in prompt:
+        # Packed batch prompt: answer with one analysis per agent id, as the real model is asked to
+        agents = json.loads(prompt.split(PACKED_DATA_MARKER, 1)[1])
+        content = json.dumps({agent_id: f"[stand-in] analysis for {agent_id}" for agent_id in agents})
+    answer = jsonify({
+        "id": f"standin-{stats['requests']}",
+        "model": data.get('model'),
+        "choices": [{
+            "index": 0,
+            "message": {
+                "role": "assistant",
+                "content": content
+            },
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 20}
+    })
+    if not body_delay:
+        return answer
+
+    def slow_body():
+        yield b''
+        time.sleep(body_delay)
+        yield answer.get_data()
+
+    return Response(slow_body(), mimetype='application/json')
+
+
+@app.route('/control', methods=['GET', 'POST'])
+def control():
+    if request.method == 'POST':
+        with _lock:
+            for key in behaviour:
+                if key in (request.get_json(silent=True) or {}):
+                    behaviour[key] = type(behaviour[key])(request.get_json()[key])
+    return jsonify({**behaviour, **stats})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds before each answer')
+    parser.add_argument('--ms-per-1k-tokens', type=float, default=0.0,
+                        help='Extra milliseconds per 1000 prompt tokens (4 characters each)')
+    args = parser.parse_args()
+    behaviour['delay'] = args.delay
+    behaviour['ms_per_1k_tokens'] = args.ms_per_1k_tokens
+    app.run(host='127.0.0.1', port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+import os
+import json
+import math
+
+import numpy as np
+
+from dataset_store import get_dataset
+
+# Upper bound on the agent data appended to an AI prompt, in estimated tokens (per agent)
+AI_PROMPT_TOKEN_BUDGET = int(os.environ.get('CMLENS_AI_PROMPT_TOKEN_BUDGET', 300))
+# Token estimate for JSON-heavy English text; close enough for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+
+# Heading before the agent data (the packed batch answer is parsed against it)
+AGENT_DATA_HEADING = "Agent Performance Data:\n"
+SCHEMA_NOTE = "(metrics in %; deltas: points vs previous week; team_percentile: % of team at or below; lists as counts)"
+
+# Summary metric -> (dataset column, record_metrics key)
+SUMMARY_METRICS = {
+    'fixed': ('Fixed_Pct', 'fixedPct'),
+    'cc': ('CC_Pct', 'ccPct'),
+    'sc': ('SC_Pct', 'scPct'),
+    'up': ('UP_Pct', 'upPct'),
+    'referral_ach': ('Referral_Ach_Pct', 'referralAchPct'),
+    'conversion': ('Conversion_Rate', 'conversionRate')
+}
+# Targets used by the rule-based coaching insights
+METRIC_TARGETS = {'fixed': 70, 'cc': 60, 'sc': 30, 'up': 15}
+
+# Counted list or count fields: summary key -> payload keys it may come from
+SUMMARY_COUNTS = {
+    'students': ('students',),
+    'referral_leads': ('referralLeads',),
+    'referral_showups': ('referralShowups',),
+    'referral_paid': ('referralPaid',),
+    'unrecovered_students': ('unrecoveredStudents', 'unrecoveredLeads')
+}
+
+# Anomaly reasons kept before the budget trims them
+MAX_ANOMALY_REASONS = 3
+
+# Optional parts dropped, in this order, until the summary fits the budget
+TRIM_ORDER = ('anomaly_reasons', 'deltas', 'targets_missed', 'counts', 'metrics_secondary')
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _number(value, digits=1):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value:
+        return None
+    return round(float(value), digits)
+
+
+def _metric_values(agent_data):
+    """Metrics in percent: nested 'metrics' are fractions (record_metrics), flat keys are dataset scale"""
+    nested = agent_data.get('metrics') if isinstance(agent_data.get('metrics'), dict) else {}
+    trend = (agent_data.get('trend') or {}).get('metrics') or {}
+    values = {}
+    for name, (column, key) in SUMMARY_METRICS.items():
+        value = None
+        if _number(nested.get(key)) is not None:
+            value = nested[key] * 100
+        elif _number(agent_data.get(key)) is not None:
+            value = agent_data[key]
+        elif column in trend:
+            value = trend[column].get('latest')
+        values[name] = _number(value)
+    return values
+
+
+def _deltas(agent_data):
+    """Change since the previous week with a value, from the payload's weekly trend"""
+    trend = (agent_data.get('trend') or {}).get('metrics') or {}
+    deltas = {}
+    for name, (column, _) in SUMMARY_METRICS.items():
+        weekly = [value for value in (trend.get(column) or {}).get('values') or [] if value is not None]
+        if len(weekly) >= 2:
+            deltas[name] = _number(weekly[-1] - weekly[-2])
+    return deltas
+
+
+def _counts(agent_data):
+    nested = agent_data.get('metrics') if isinstance(agent_data.get('metrics'), dict) else {}
+    counts = {}
+    for name, keys in SUMMARY_COUNTS.items():
+        for key in keys:
+            value = nested.get(key, agent_data.get(key))
+            if isinstance(value, (list, tuple)):
+                counts[name] = len(value)
+                break
+            if _number(value) is not None:
+                counts[name] = int(value)
+                break
+    anomalies = agent_data.get('anomalies')
+    counts['anomalies'] = len(anomalies) if isinstance(anomalies, list) else 0
+    weeks_present = (agent_data.get('trend') or {}).get('weeks_present')
+    if weeks_present:
+        counts['weeks_of_history'] = weeks_present
+    return counts
+
+
+def team_percentile(team, score, dataset=None):
+    """Share of the team's agents scoring at or below score (0-100), from the current dataset"""
+    dataset = dataset if dataset is not None else get_dataset()
+    if dataset is None or not team or _number(score) is None:
+        return None
+    scores = dataset.team_sorted_scores.get(team)
+    if scores is None or not len(scores):
+        return None
+    # Payload scores are rounded to one decimal; compare on the same footing
+    at_or_below = np.searchsorted(np.round(scores, 1), float(score), side='right')
+    return int(round(100 * at_or_below / len(scores)))
+
+
+def summarize_agent(agent_data, dataset=None):
+    """
+    Compact, fixed-schema summary of an agent payload for the model: key metrics,
+    week-over-week deltas, team percentile, and counts in place of lists.
+    Accepts the Targets, Meetings and upload payload shapes.
+    """
+    if not isinstance(agent_data, dict):
+        return {'data': agent_data}
+
+    team = agent_data.get('team') or agent_data.get('group') or ''
+    metrics = _metric_values(agent_data)
+    anomalies = agent_data.get('anomalies') if isinstance(agent_data.get('anomalies'), list) else []
+    summary = {
+        'agent': agent_data.get('id') or agent_data.get('name'),
+        'team': team or None,
+        'category': agent_data.get('category'),
+        'score': _number(agent_data.get('score')),
+        'team_percentile': team_percentile(team, agent_data.get('score'), dataset),
+        'metrics': {name: value for name, value in metrics.items() if value is not None},
+        'targets_missed': [f"{name}<{target}" for name, target in METRIC_TARGETS.items()
+                           if metrics.get(name) is not None and metrics[name] < target],
+        'deltas': _deltas(agent_data),
+        'counts': _counts(agent_data)
+    }
+    if anomalies:
+        summary['anomaly_reasons'] = [str(anomaly.get('reason', anomaly)) if isinstance(anomaly, dict) else str(anomaly)
+                                      for anomaly in anomalies[:MAX_ANOMALY_REASONS]]
+    return summary
+
+
+def _compact(value):
+    return json.dumps(value, separators=(',', ':'), default=str)
+
+
+def _trim(summary, budget):
+    """Drop optional parts (TRIM_ORDER) until the summary fits the token budget"""
+    for part in TRIM_ORDER:
+        if estimate_tokens(_compact(summary)) <= budget:
+            break
+        if part == 'metrics_secondary':
+            summary['metrics'] = {name: value for name, value in summary['metrics'].items() if name in METRIC_TARGETS}
+        else:
+            summary.pop(part, None)
+    return summary
+
+
+def agent_data_block(agent_data, budget=None, dataset=None):
+    """The agent data section of a prompt: the compact summary under the token budget"""
+    budget = budget or AI_PROMPT_TOKEN_BUDGET
+    return _compact(_trim(summarize_agent(agent_data, dataset), budget))
+
+
+def build_prompt(base_prompt, agent_data=None, budget=None):
+    """Full prompt for one agent (the base prompt alone when there is no data)"""
+    if not agent_data:
+        return base_prompt
+    return f"{base_prompt}\n\n{SCHEMA_NOTE}\n{AGENT_DATA_HEADING}{agent_data_block(agent_data, budget)}"
+
+
+def build_packed_prompt(base_prompt, agents, budget=None):
+    """Prompt for several agents at once; agents maps agent id -> payload, each summarized under the budget"""
+    budget = budget or AI_PROMPT_TOKEN_BUDGET
+    dataset = get_dataset()
+    summaries = {agent_id: _trim(summarize_agent(agent_data, dataset), budget)
+                 for agent_id, agent_data in agents.items()}
+    return f"{base_prompt}\n\n{SCHEMA_NOTE}\n{AGENT_DATA_HEADING}{_compact(summaries)}"
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+# Frontend metric key -> dataset column that gets a rank/percentile index
+RANKED_METRICS = {
+    'fixedPct': 'Fixed_Pct',
+    'ccPct': 'CC_Pct',
+    'scPct': 'SC_Pct',
+    'upPct': 'UP_Pct',
+    'conversionRate': 'Conversion_Rate',
+    'referralAchPct': 'Referral_Ach_Pct',
+    'score': 'Score'
+}
+
+
+def resolve_metric(metric):
+    """Accept either a frontend key (upPct) or a dataset column (UP_Pct)"""
+    if metric in RANKED_METRICS:
+        return RANKED_METRICS[metric]
+    if metric in RANKED_METRICS.values():
+        return metric
+    raise ValueError(f"Unknown metric '{metric}'. Expected one of: {sorted(RANKED_METRICS)}")
+
+
+class MetricRankIndex:
+    """
+    Per-metric rank and percentile index, built once per dataset.
+
+    For each metric it stores the row positions ordered best-first (NaN values
+    excluded, so agents without data never appear on a leaderboard), the rank
+    of every agent, and its percentile among agents that have a value.
+    """
+
+    def __init__(self, columns):
+        self.order = {}
+        self.ranks = {}
+        self.percentiles = {}
+        self.counts = {}
+
+        for col in RANKED_METRICS.values():
+            if col not in columns:
+                continue
+            values = pd.to_numeric(pd.Series(columns[col]), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            valid = ~np.isnan(values)
+            valid_positions = np.flatnonzero(valid)
+
+            # Best first; stable so ties keep dataset order
+            order = valid_positions[np.argsort(-values[valid_positions], kind='stable')]
+            ranks = np.zeros(len(values), dtype=int)
+            ranks[order] = np.arange(1, len(order) + 1)
+
+            # Mid-rank percentile: share of agents below, counting ties as half
+            sorted_values = np.sort(values[valid])
+            below = np.searchsorted(sorted_values, values, side='left')
+            at_or_below = np.searchsorted(sorted_values, values, side='right')
+            n = len(sorted_values)
+            percentiles = np.where(valid, (below + at_or_below) / 2 / max(n, 1) * 100, np.nan)
+
+            self.order[col] = order
+            self.ranks[col] = ranks
+            self.percentiles[col] = percentiles
+            self.counts[col] = n
+
+    def metrics(self):
+        return list(self.order.keys())
+
+    def top_k(self, metric, k=10, mask=None, ascending=False):
+        """
+        Row positions of the top k agents for a metric, optionally restricted
+        to a boolean row mask. Uses the prebuilt order; nothing is re-sorted.
+        """
+        return self.top_k_ranked(metric, k, mask, ascending)[0]
+
+    def top_k_ranked(self, metric, k=10, mask=None, ascending=False):
+        """
+        top_k, plus each returned agent's rank among the agents in the mask
+        (1 = best, as in ranks) and the number of ranked agents in the mask.
+        """
+        col = resolve_metric(metric)
+        order = self.order.get(col, np.array([], dtype=int))
+        if mask is not None:
+            order = order[mask[order]]
+        n = len(order)
+        if ascending:
+            positions = order[::-1][:k]
+            ranks = n - np.arange(len(positions))
+        else:
+            positions = order[:k]
+            ranks = np.arange(1, len(positions) + 1)
+        return positions, ranks, n
+
+    def agent_percentiles(self, pos):
+        """Rank and percentile of one agent for every indexed metric"""
+        result = {}
+        for col in self.order:
+            pct = self.percentiles[col][pos]
+            result[col] = {
+                'rank': int(self.ranks[col][pos]) or None,
+                'percentile': None if np.isnan(pct) else round(float(pct), 1),
+                'total': int(self.counts[col])
+            }
+        return result
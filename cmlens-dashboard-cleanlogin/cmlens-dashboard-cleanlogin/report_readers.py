@@ -0,0 +1,150 @@
+import os
+
+import pandas as pd
+
+from report_sidecars import SIDECARS_ENABLED, find_sidecar, read_sidecar, write_sidecar
+
+# Report file formats accepted by the ETL, by extension
+REPORT_FORMATS = {
+    'xlsx': 'excel',
+    'xls': 'excel',
+    'csv': 'csv',
+    'parquet': 'parquet'
+}
+
+# Leading bytes used when the extension is missing or unknown (e.g. upload streams)
+MAGIC_BYTES = [
+    (b'PK\x03\x04', 'excel'),                       # xlsx (zip container)
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'excel'),  # xls (OLE2 container)
+    (b'PAR1', 'parquet')
+]
+
+# CSV reader: 'pyarrow' parses with multiple threads; the C engine is used for previews (nrows)
+CSV_ENGINE = os.environ.get('CMLENS_CSV_ENGINE', 'pyarrow')
+
+
+def _name_of(file):
+    if isinstance(file, (str, os.PathLike)):
+        return str(file)
+    return getattr(file, 'filename', None) or getattr(file, 'name', None)
+
+
+def _peek(file, size=8):
+    """First bytes of a path or seekable stream, leaving the stream position unchanged"""
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            return f.read(size)
+    position = file.tell()
+    try:
+        return file.read(size)
+    finally:
+        file.seek(position)
+
+
+def detect_report_format(file, filename=None):
+    """
+    'excel', 'csv' or 'parquet' for a report path or stream.
+    The extension wins; otherwise the leading bytes decide, and plain text is CSV.
+    """
+    name = filename or _name_of(file)
+    if name and '.' in os.path.basename(str(name)):
+        extension = str(name).rsplit('.', 1)[1].lower()
+        if extension in REPORT_FORMATS:
+            return REPORT_FORMATS[extension]
+
+    head = _peek(file)
+    for magic, report_format in MAGIC_BYTES:
+        if head.startswith(magic):
+            return report_format
+    return 'csv'
+
+
+def _infer_text_columns(df):
+    """
+    CSV cells all arrive as text because the header rows are read as data.
+    Turn a column numeric when every non-empty cell parses, as read_csv would have.
+    """
+    for col in df.columns:
+        if df[col].dtype != object and not pd.api.types.is_string_dtype(df[col]):
+            continue
+        converted = pd.to_numeric(df[col], errors='coerce')
+        if converted.notna().sum() == df[col].notna().sum():
+            df[col] = converted
+    return df
+
+
+def _read_excel_rows(file, nrows=None, columns=None, archived=False):
+    """
+    Excel workbook as raw rows. Workbooks on disk that have a Parquet sidecar
+    (report_sidecars) are read from it; archived ones get one on their first full read.
+    """
+    if SIDECARS_ENABLED and isinstance(file, (str, os.PathLike)):
+        try:
+            sidecar = find_sidecar(file)
+            if sidecar is None and nrows is None and archived:
+                sidecar = write_sidecar(file)
+            if sidecar is not None:
+                return read_sidecar(sidecar, nrows=nrows, columns=columns)
+        except Exception as e:
+            print(f"[SIDECAR] WARNING: Falling back to reading {file} directly: {e}")
+    return pd.read_excel(file, header=None, nrows=nrows, usecols=columns)
+
+
+def read_report_rows(file, nrows=None, filename=None, columns=None, archived=False):
+    """
+    Read a report sheet as raw rows (header=None), whatever its file format.
+
+    Header rows stay in the data so source_layouts can locate them; for Parquet
+    the column names become row 0.
+
+    Parameters:
+    file (str or file-like): Report path or upload stream
+    nrows (int, optional): Only read the first rows (layout detection, upload previews)
+    filename (str, optional): Original file name, when file is a stream
+    columns (list, optional): Only read these column positions; labels stay the positions
+    archived (bool): The file is kept and read again (backfill, inbox), so a workbook
+        gets a Parquet sidecar on its first full read; uploads never do
+
+    Returns:
+    pandas.DataFrame: Rows of the first sheet with integer column labels
+    """
+    report_format = detect_report_format(file, filename)
+    if columns is not None:
+        columns = sorted(columns)
+
+    if report_format == 'excel':
+        return _read_excel_rows(file, nrows, columns, archived)
+
+    if report_format == 'csv':
+        # pyarrow does not support nrows, so previews use the C engine
+        engine = 'c' if nrows is not None else CSV_ENGINE
+        raw = pd.read_csv(file, header=None, nrows=nrows, engine=engine, dtype=object, usecols=columns)
+        if columns is not None:
+            # The pyarrow engine renumbers selected columns from 0
+            raw.columns = columns
+        if len(raw) and raw.columns[0] == 0 and isinstance(raw.iat[0, 0], str):
+            # Excel's "CSV UTF-8" export starts with a byte order mark
+            raw.iat[0, 0] = raw.iat[0, 0].lstrip('\ufeff')
+        raw.attrs['text_cells'] = True
+        return raw
+
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(file)
+    names = parquet_file.schema_arrow.names
+    positions = list(range(len(names))) if columns is None else [pos for pos in columns if pos < len(names)]
+    selected = [names[pos] for pos in positions]
+    if nrows is not None:
+        # Row 0 is the header, so only nrows - 1 data rows are needed
+        batch = next(parquet_file.iter_batches(batch_size=max(nrows - 1, 1), columns=selected), None)
+        table = batch if batch is not None else parquet_file.schema_arrow.empty_table().select(selected)
+        frame = table.to_pandas().head(max(nrows - 1, 0))
+    else:
+        frame = parquet_file.read(columns=selected).to_pandas()
+    header = pd.DataFrame([selected], columns=positions)
+    return pd.concat([header, frame.set_axis(positions, axis=1)], ignore_index=True)
+
+
+def infer_report_cells(df, raw):
+    """Data rows of a text (CSV) report get numeric types back; other formats are untouched"""
+    return _infer_text_columns(df) if raw.attrs.get('text_cells') else df
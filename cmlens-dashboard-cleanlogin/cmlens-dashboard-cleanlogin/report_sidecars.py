@@ -0,0 +1,384 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Typed Parquet copies of raw Excel sheets, keyed by the sha256 of the workbook:
+#   SIDECAR_FOLDER/<sha256>.v<format version>.parquet
+# Sidecars hold student-level rows, so they are only written for archived inputs
+# (backfill, inbox) whose workbooks are read again, never for one-off uploads.
+# Any read of a workbook that has one skips openpyxl entirely.
+SIDECAR_FOLDER = os.environ.get('CMLENS_SIDECAR_DIR', os.path.join(tempfile.gettempdir(), 'sidecars'))
+SIDECARS_ENABLED = os.environ.get('CMLENS_SIDECARS', '1') != '0'
+
+# Retention: sidecars unused for this long are deleted, then the least recently
+# used ones until the folder fits the size limit (checked after every write)
+SIDECAR_MAX_AGE_DAYS = float(os.environ.get('CMLENS_SIDECAR_MAX_AGE_DAYS', 30))
+SIDECAR_MAX_MB = float(os.environ.get('CMLENS_SIDECAR_MAX_MB', 1024))
+
+# Workbooks at least this large are converted row by row (openpyxl read-only) in chunks
+SIDECAR_STREAM_MIN_BYTES = int(os.environ.get('CMLENS_SIDECAR_STREAM_MIN_BYTES', 5 * 1024 * 1024))
+SIDECAR_CHUNK_ROWS = 50000
+
+SIDECAR_FORMAT_VERSION = 2
+
+# Kind of a column that already has a single numpy dtype
+_DTYPE_KINDS = {'i': 'int', 'u': 'int', 'f': 'float', 'M': 'datetime', 'm': 'timedelta', 'b': 'bool'}
+
+# A raw sheet column mixes header text with data cells, so each column is stored
+# as one typed Parquet column per kind of cell it holds: '<position>|<kind>'
+SIDECAR_KINDS = {
+    'str': pa.string(),
+    'int': pa.int64(),
+    'float': pa.float64(),
+    'datetime': pa.timestamp('us'),
+    'time': pa.time64('us'),
+    'timedelta': pa.duration('us'),
+    'bool': pa.bool_()
+}
+
+# Strings pandas reads as missing by default; the sidecar writer and the streaming
+# All Leads reader (script.py) treat them the same way
+MISSING_CELL_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+}
+
+_hash_cache = {}
+_hash_lock = threading.Lock()
+
+# Background sidecar writes (one at a time), by sidecar path
+_writer = None
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def file_sha256(path):
+    """Content hash of a file, remembered per (path, size, mtime) so re-reads do not re-hash"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _hash_lock:
+        if key in _hash_cache:
+            return _hash_cache[key]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+
+    with _hash_lock:
+        _hash_cache[key] = digest.hexdigest()
+    return _hash_cache[key]
+
+
+def sidecar_path(path):
+    return os.path.join(SIDECAR_FOLDER, f"{file_sha256(path)}.v{SIDECAR_FORMAT_VERSION}.parquet")
+
+
+def find_sidecar(path):
+    """Sidecar of a workbook if one has been written, else None (marks it as used)"""
+    if not SIDECARS_ENABLED:
+        return None
+    candidate = sidecar_path(path)
+    try:
+        os.utime(candidate)
+    except OSError:
+        return None
+    return candidate
+
+
+def prune_sidecars(max_age_days=None, max_mb=None, keep=None):
+    """
+    Delete sidecars (and abandoned temp files) not used for max_age_days, then the
+    least recently used ones until the folder holds at most max_mb. The sidecar at
+    keep is never deleted. Returns the number deleted.
+    """
+    max_age_days = SIDECAR_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    max_bytes = (SIDECAR_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    if not os.path.isdir(SIDECAR_FOLDER):
+        return 0
+
+    files = []
+    for name in os.listdir(SIDECAR_FOLDER):
+        if not (name.endswith('.parquet') or name.endswith('.tmp')):
+            continue
+        try:
+            stat = os.stat(os.path.join(SIDECAR_FOLDER, name))
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, name))
+    files.sort()
+
+    cutoff = datetime.now().timestamp() - max_age_days * 24 * 3600
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, name in files:
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        if keep and name == os.path.basename(keep):
+            continue
+        try:
+            os.remove(os.path.join(SIDECAR_FOLDER, name))
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        print(f"[SIDECAR] Evicted {removed} sidecars ({total / (1024 * 1024):.1f} MB kept)")
+    return removed
+
+
+def _cell_kind(value):
+    if isinstance(value, bool) or isinstance(value, np.bool_):
+        return 'bool'
+    if isinstance(value, (int, np.integer)):
+        return 'int'
+    if isinstance(value, (float, np.floating)):
+        return 'float'
+    if isinstance(value, (datetime, np.datetime64)):
+        return 'datetime'
+    if isinstance(value, time):
+        return 'time'
+    if isinstance(value, (timedelta, np.timedelta64)):
+        return 'timedelta'
+    return 'str'
+
+
+def _encode_column(pos, values, kinds=None):
+    """
+    Split one raw column (object array, missing cells as None/NaN) into typed arrays.
+    kinds fixes the output kinds (chunked writes need a stable schema); otherwise
+    only the kinds present are written.
+    """
+    present = pd.notna(values)
+    cell_kinds = np.array([_cell_kind(v) if ok else '' for v, ok in zip(values, present)], dtype=object)
+    arrays = {}
+    for kind in (kinds or [k for k in SIDECAR_KINDS if (cell_kinds == k).any()]):
+        mask = cell_kinds == kind
+        if kind == 'str':
+            cells = [str(v) if m else None for v, m in zip(values, mask)]
+        else:
+            cells = [v if m else None for v, m in zip(values, mask)]
+        arrays[f"{pos}|{kind}"] = pa.array(cells, type=SIDECAR_KINDS[kind])
+    return arrays
+
+
+def _encode_frame(raw):
+    """Raw header=None frame -> Arrow table of typed per-kind columns"""
+    arrays = {}
+    for pos in range(raw.shape[1]):
+        column = raw.iloc[:, pos]
+        if column.dtype.kind in _DTYPE_KINDS:
+            # Already a single type (all numbers, all dates, ...)
+            arrays[f"{pos}|{_DTYPE_KINDS[column.dtype.kind]}"] = pa.array(column, from_pandas=True)
+        else:
+            arrays.update(_encode_column(pos, column.to_numpy(dtype=object)))
+    return pa.table(arrays) if arrays else pa.table({})
+
+
+def _metadata(source_path):
+    return {b'cmlens_sidecar': json.dumps({
+        'version': SIDECAR_FORMAT_VERSION,
+        'source_file': os.path.basename(source_path),
+        'created_at': datetime.now().isoformat()
+    }).encode()}
+
+
+def _excel_cell(value):
+    """A read-only openpyxl cell the way pandas' Excel reader returns it"""
+    if value is None or (isinstance(value, str) and value in MISSING_CELL_STRINGS):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, (bool, int, float, datetime, time, timedelta)):
+        return value
+    return value if isinstance(value, str) else str(value)
+
+
+def _stream_workbook(source_path, tmp_path):
+    """Convert a large workbook chunk by chunk, never holding the whole sheet in memory"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        width = sheet.max_column or 0
+        writer = None
+        total = 0
+        chunk = []
+
+        def flush(chunk, writer, width):
+            matrix = np.empty((len(chunk), width), dtype=object)
+            for i, row in enumerate(chunk):
+                cells = [_excel_cell(v) for v in row[:width]]
+                matrix[i, :len(cells)] = cells
+            arrays = {}
+            for pos in range(width):
+                arrays.update(_encode_column(pos, matrix[:, pos], kinds=list(SIDECAR_KINDS)))
+            table = pa.table(arrays)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema.with_metadata(_metadata(source_path)))
+            writer.write_table(table)
+            return writer
+
+        blank_rows = 0
+        for row in rows:
+            if not width:
+                width = len(row)
+            # Like read_excel, blank rows after the last row with data are not part of the sheet
+            if all(value is None or value == '' for value in row):
+                blank_rows += 1
+                continue
+            chunk.extend([()] * blank_rows)
+            blank_rows = 0
+            chunk.append(row)
+            if len(chunk) >= SIDECAR_CHUNK_ROWS:
+                writer = flush(chunk, writer, width)
+                total += len(chunk)
+                chunk = []
+        if chunk or writer is None:
+            writer = flush(chunk, writer, width)
+            total += len(chunk)
+        writer.close()
+    finally:
+        workbook.close()
+
+    return total, width
+
+
+def write_sidecar(source_path, raw=None):
+    """
+    Write the typed Parquet sidecar of a workbook's first sheet.
+
+    Parameters:
+    source_path (str): The .xlsx/.xls file
+    raw (pandas.DataFrame, optional): The sheet already read with header=None
+
+    Returns:
+    str: Path of the sidecar
+    """
+    path = sidecar_path(source_path)
+    os.makedirs(SIDECAR_FOLDER, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    if raw is None and str(source_path).lower().endswith('.xlsx') \
+            and os.path.getsize(source_path) >= SIDECAR_STREAM_MIN_BYTES:
+        rows, width = _stream_workbook(source_path, tmp_path)
+    else:
+        if raw is None:
+            raw = pd.read_excel(source_path, header=None)
+        table = _encode_frame(raw)
+        table = table.replace_schema_metadata(_metadata(source_path))
+        pq.write_table(table, tmp_path)
+        rows, width = raw.shape
+
+    os.replace(tmp_path, path)
+    print(f"[SIDECAR] Wrote {path} for {os.path.basename(source_path)} ({rows} rows x {width} columns)")
+    prune_sidecars(keep=path)
+    return path
+
+
+def write_sidecar_later(source_path):
+    """
+    Queue write_sidecar for a workbook on a background thread, so a caller that
+    already has its data (e.g. the streaming All Leads ETL) does not wait for it.
+    Returns the future, or None when sidecars are off or one already exists.
+    """
+    global _writer
+    if not SIDECARS_ENABLED or find_sidecar(source_path) is not None:
+        return None
+    path = sidecar_path(source_path)
+    with _pending_lock:
+        if path not in _pending:
+            if _writer is None:
+                _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sidecar')
+            _pending[path] = _writer.submit(_write_pending, source_path, path)
+        return _pending[path]
+
+
+def _write_pending(source_path, path):
+    try:
+        return write_sidecar(source_path)
+    except Exception as e:
+        print(f"[SIDECAR] WARNING: Could not write sidecar for {source_path}: {e}")
+    finally:
+        with _pending_lock:
+            _pending.pop(path, None)
+
+
+def wait_for_sidecars():
+    """Block until queued sidecar writes are done (worker processes call this before exiting)"""
+    with _pending_lock:
+        futures = list(_pending.values())
+    for future in futures:
+        future.result()
+
+
+def _decode_column(parts, length):
+    """Typed arrays of one raw column -> a pandas column like read_excel produces"""
+    filled = [(kind, array) for kind, array in parts if array.null_count < len(array)]
+    if not filled:
+        return np.full(length, np.nan)
+    if len(filled) == 1 and filled[0][0] != 'str':
+        return filled[0][1].to_pandas()
+
+    # Mixed column: Python values (str, int, float, datetime) in one object array
+    values = np.full(length, np.nan, dtype=object)
+    for kind, array in filled:
+        mask = array.is_valid().to_numpy(zero_copy_only=False)
+        cells = np.empty(int(mask.sum()), dtype=object)
+        cells[:] = array.drop_null().to_pylist()
+        values[mask] = cells
+    return values
+
+
+def read_sidecar(path, nrows=None, columns=None):
+    """
+    Raw header=None frame from a sidecar, memory-mapped.
+
+    Parameters:
+    path (str): Sidecar file
+    nrows (int, optional): Only the first rows
+    columns (list, optional): Raw column positions to read (others are never loaded)
+
+    Returns:
+    pandas.DataFrame: Columns labelled by their position in the sheet
+    """
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    names = parquet_file.schema_arrow.names
+    positions = sorted({int(name.split('|', 1)[0]) for name in names})
+    if columns is not None:
+        columns = set(columns)
+        positions = [pos for pos in positions if pos in columns]
+    wanted = [name for name in names if int(name.split('|', 1)[0]) in positions]
+
+    if nrows is not None:
+        batch = next(parquet_file.iter_batches(batch_size=max(nrows, 1), columns=wanted), None)
+        table = pa.Table.from_batches([batch]) if batch is not None else parquet_file.schema_arrow.empty_table().select(wanted)
+        table = table.slice(0, nrows)
+    else:
+        table = parquet_file.read(columns=wanted)
+
+    by_position = {pos: [] for pos in positions}
+    for name, array in zip(table.column_names, table.columns):
+        pos, kind = name.split('|', 1)
+        by_position[int(pos)].append((kind, array.combine_chunks()))
+
+    frame = pd.DataFrame({pos: _decode_column(parts, table.num_rows) for pos, parts in by_position.items()},
+                         index=pd.RangeIndex(table.num_rows))
+    frame = frame.infer_objects()
+
+    # Rows already end at the sheet's last row with data; like read_excel, drop trailing empty columns
+    if columns is None:
+        while len(frame.columns) and frame.iloc[:, -1].isna().all():
+            frame = frame.iloc[:, :-1]
+    return frame
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+# Default weights based on business importance
+DEFAULT_WEIGHTS = {'fixedPct': 0.3, 'ccPct': 0.25, 'scPct': 0.25, 'upPct': 0.2}
+
+# Weight key -> standardized dataset column (values already on a 0-100 scale)
+METRIC_COLUMNS = {
+    'fixedPct': 'Fixed_Pct',
+    'ccPct': 'CC_Pct',
+    'scPct': 'SC_Pct',
+    'upPct': 'UP_Pct'
+}
+
+# Target for each metric; values below are flagged (see insight_rules.COACHING_RULES)
+DEFAULT_THRESHOLDS = {'fixedPct': 70, 'ccPct': 60, 'scPct': 30, 'upPct': 15}
+
+# Lower bound of each category above Critical, in ascending order
+DEFAULT_CATEGORY_CUTS = {'Watch': 50, 'Stable': 65, 'Strong': 75, 'Elite': 85}
+BASE_CATEGORY = 'Critical'
+
+
+def metric_matrix(df, metrics=None):
+    """
+    Build an (agents x metrics) float matrix from the standardized columns.
+    Missing columns and non-numeric values become NaN.
+    """
+    metrics = list(metrics or METRIC_COLUMNS.keys())
+    matrix = np.full((len(df), len(metrics)), np.nan, dtype=float)
+    for j, metric in enumerate(metrics):
+        col = METRIC_COLUMNS.get(metric, metric)
+        if col in df.columns:
+            matrix[:, j] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    return matrix
+
+
+def score_matrix(matrix, weights, metrics=None):
+    """
+    Weighted score for every row of a metric matrix.
+
+    Missing metrics are dropped and the remaining weights renormalized, so an
+    agent with only CC and UP data is scored on those two alone. Rows with no
+    metrics at all score 0.
+    """
+    metrics = list(metrics or METRIC_COLUMNS.keys())
+    w = np.array([float(weights.get(metric, 0)) for metric in metrics])
+    present = ~np.isnan(matrix)
+    weighted_sum = np.where(present, matrix, 0.0) @ w
+    total_weight = present @ w
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = np.where(total_weight > 0, weighted_sum / total_weight, 0.0)
+    return scores
+
+
+def categorize_scores(scores, cuts=None):
+    """Map scores to category labels using ascending cut points"""
+    cuts = cuts or DEFAULT_CATEGORY_CUTS
+    ordered = sorted(cuts.items(), key=lambda item: item[1])
+    bins = np.array([bound for _, bound in ordered], dtype=float)
+    labels = np.array([BASE_CATEGORY] + [label for label, _ in ordered], dtype=object)
+    return labels[np.digitize(np.asarray(scores, dtype=float), bins)]
+
+
+def score_agents(df, weights=None, cuts=None):
+    """
+    Score and categorize every agent in a merged ETL frame at once.
+
+    Returns a DataFrame aligned to df.index with 'Score' and 'Category' columns.
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    metrics = list(METRIC_COLUMNS.keys())
+    scores = score_matrix(metric_matrix(df, metrics), weights, metrics)
+    return pd.DataFrame({
+        'Score': scores,
+        'Category': categorize_scores(scores, cuts)
+    }, index=df.index)
+
+
+def rank_scores(scores):
+    """1-based rank of each score (highest score = rank 1, ties keep dataset order)"""
+    scores = np.asarray(scores, dtype=float)
+    order = np.argsort(-scores, kind='stable')
+    ranks = np.empty(len(scores), dtype=int)
+    ranks[order] = np.arange(1, len(scores) + 1)
+    return ranks
+
+
+def below_threshold_mask(matrix, thresholds, metrics=None):
+    """
+    Boolean (agents x metrics) mask of metrics under their threshold.
+    Missing values are never flagged; metrics without a threshold are never flagged.
+    """
+    metrics = list(metrics or METRIC_COLUMNS.keys())
+    limits = np.array([float(thresholds[m]) if m in thresholds else np.nan for m in metrics])
+    with np.errstate(invalid='ignore'):
+        return matrix < limits
@@ -2,6 +2,15 @@ import pandas as pd
 import re
 import numpy as np
 import json
+import os
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+from scoring import DEFAULT_THRESHOLDS, METRIC_COLUMNS, score_agents
+from source_layouts import detect_layout, scan_rows
+from report_readers import read_report_rows, infer_report_cells
+from report_sidecars import MISSING_CELL_STRINGS, file_sha256, find_sidecar, write_sidecar_later
 
 def clean_numeric_value(value):
     """
@@ -191,216 +200,524 @@ def smart_fill_column(df, target_col, source_cols):
             mask = df[target_col].isna() & df[source].notna()
             df.loc[mask, target_col] = df.loc[mask, source]
 
-def flexible_etl_pipeline(cc_file=None, up_file=None, re_file=None, fixed_file=None, all_leads_file=None, json_output=None):
+def coalesce_duplicate_columns(df):
     """
-    Flexible ETL pipeline that can process any combination of the five data sources.
+    Collapse duplicated column names into one column, keeping the first non-null value.
+    standardize_columns_for_frontend maps both Subgroup and the Fixed 'Group' onto 'Group'.
+    """
+    if not df.columns.duplicated().any():
+        return df
+
+    result = {}
+    for col in dict.fromkeys(df.columns):
+        block = df.loc[:, df.columns == col]
+        if block.shape[1] == 1:
+            result[col] = block.iloc[:, 0]
+        else:
+            result[col] = block.bfill(axis=1).iloc[:, 0]
+    return pd.DataFrame(result, index=df.index)
+
+def team_keys(df):
+    """
+    Team label for each agent: Team, falling back to Group, then 'Unassigned'.
+    Shared by the dataset team index and the Team rollups so both agree.
+    """
+    frame = coalesce_duplicate_columns(df)
+    keys = pd.Series('Unassigned', index=frame.index, dtype=object)
+    for col in ['Group', 'Team']:
+        if col in frame.columns:
+            values = frame[col].astype(str).str.strip()
+            valid = frame[col].notna() & (values != '')
+            keys = keys.where(~valid, values)
+    return keys
+
+# Metric columns summarized per Team/Group at ingest
+ROLLUP_MEAN_COLUMNS = ['Fixed_Pct', 'CC_Pct', 'SC_Pct', 'UP_Pct', 'Referral_Ach_Pct', 'Conversion_Rate', 'Score']
+ROLLUP_SUM_COLUMNS = ['Students', 'Referral_Leads', 'Referral_Showups', 'Referral_Paid',
+                      'Total_Leads', 'Recovered_Leads', 'Unrecovered_Leads']
+
+def build_rollups(df, levels=('Team', 'Group')):
+    """
+    Materialize per-Team and per-Group (Subgroup) KPI rollups in one groupby per level.
     
-    Parameters:
-    cc_file (str, optional): Path to CC Excel file (Class Consumption data)
-    up_file (str, optional): Path to UP Excel file (Upgrade Rate data)
-    re_file (str, optional): Path to RE Excel file (CM teams data)
-    fixed_file (str, optional): Path to Fixed Rate Excel file
-    all_leads_file (str, optional): Path to All Leads Report Excel file
-    json_output (str, optional): Path to save JSON output file with Name as key
+    Each group gets agent count, mean/median of the percentage metrics and score,
+    sums of students/referral leads/showups/paid and recovery totals, and counts of
+    agents below each metric threshold.
     
     Returns:
-    pandas.DataFrame: Merged DataFrame with consistent structure regardless of input files
-    
-    Note: At least one file must be provided
+    dict: {level: {group_name: {...}}} with JSON-friendly values
     """
+    frame = coalesce_duplicate_columns(df)
+    mean_cols = [col for col in ROLLUP_MEAN_COLUMNS if col in frame.columns]
+    sum_cols = [col for col in ROLLUP_SUM_COLUMNS if col in frame.columns]
     
-    # Validate input - at least one file must be provided
-    if not any([cc_file, up_file, re_file, fixed_file, all_leads_file]):
-        raise ValueError("At least one file must be provided")
+    work = pd.DataFrame(index=frame.index)
+    for col in mean_cols + sum_cols:
+        work[col] = pd.to_numeric(frame[col], errors='coerce')
     
-    # Define the ETL functions inline for portability
-    def cc_etl_internal(file_path):
-        """CC ETL function - processes Class Consumption data"""
-        df = pd.read_excel(file_path)
-        
-        # Transform - Remove first 3 rows and set 4th row as headers
-        new_df = df.iloc[3:].copy()
-        new_df.columns = df.iloc[3]
-        new_df = new_df.iloc[1:].reset_index(drop=True)
-        new_df.columns.name = None
-        
-        # Forward fill Team column
-        team_col_name = new_df.columns[0]
-        new_df[team_col_name] = new_df[team_col_name].ffill()
-        
-        # Process Subgroup column
-        subgroup_col_name = new_df.columns[1]
-        new_df = new_df.rename(columns={subgroup_col_name: 'Subgroup'})
-        new_df['Subgroup'] = new_df['Subgroup'].ffill()
-        
-        # Remove '#' column if exists
-        if '#' in new_df.columns:
-            new_df = new_df.drop('#', axis=1)
-        
-        # Remove Total rows - comprehensive cleanup
-        # First, remove any row where 'Name' column contains 'total' (case insensitive)
-        if 'Name' in new_df.columns:
-            mask = new_df['Name'].astype(str).str.lower().str.contains('total', na=False)
-            new_df = new_df[~mask].reset_index(drop=True)
-            print(f"Removed {mask.sum()} rows containing 'total' in Name column")
-        
-        # Remove rows where Name equals header values like 'Name'
-        if 'Name' in new_df.columns:
-            invalid_names = ['Name', 'NAME', 'name', 'Agent Name', 'CM Name', 'Last CM Name']
-            mask = new_df['Name'].isin(invalid_names)
-            removed_count = mask.sum()
-            if removed_count > 0:
-                new_df = new_df[~mask].reset_index(drop=True)
-                print(f"Removed {removed_count} rows with invalid name headers")
-        
-        # Remove rows where any of the first 3 columns contain 'total'
-        for col in new_df.columns[:3]:
-            if col in new_df.columns:
-                mask = new_df[col].astype(str).str.lower().str.contains('total', na=False)
-                removed_count = mask.sum()
-                if removed_count > 0:
-                    new_df = new_df[~mask].reset_index(drop=True)
-                    print(f"Removed {removed_count} rows containing 'total' in {col} column")
-        
-        # Remove rows where Name is exactly 'Total' (case insensitive)
-        if 'Name' in new_df.columns:
-            mask = new_df['Name'].astype(str).str.lower().str.strip() == 'total'
-            removed_count = mask.sum()
-            if removed_count > 0:
-                new_df = new_df[~mask].reset_index(drop=True)
-                print(f"Removed {removed_count} rows where Name is exactly 'Total'")
-        
-        # Remove rows where Name is NaN or empty after processing
-        if 'Name' in new_df.columns:
-            initial_count = len(new_df)
-            new_df = new_df.dropna(subset=['Name']).reset_index(drop=True)
-            new_df = new_df[new_df['Name'].astype(str).str.strip() != ''].reset_index(drop=True)
-            removed_count = initial_count - len(new_df)
-            if removed_count > 0:
-                print(f"Removed {removed_count} rows with empty/NaN names")
-        
-        # Additional cleanup: Remove rows where team column contains only numbers (likely row numbers from Total sections)
-        if team_col_name in new_df.columns:
-            # Remove rows where team column is just a number (like row indices from Total sections)
-            mask = new_df[team_col_name].astype(str).str.match(r'^\d+$', na=False)
-            removed_count = mask.sum()
-            if removed_count > 0:
-                new_df = new_df[~mask].reset_index(drop=True)
-                print(f"Removed {removed_count} rows with numeric team values")
-            
-            # Remove rows where team column is NaN or empty
-            initial_count = len(new_df)
-            new_df = new_df.dropna(subset=[team_col_name]).reset_index(drop=True)
-            new_df = new_df[new_df[team_col_name].astype(str).str.strip() != ''].reset_index(drop=True)
-            removed_count = initial_count - len(new_df)
-            if removed_count > 0:
-                print(f"Removed {removed_count} rows with empty/NaN team values")
-        
-        # Select required columns
-        required_columns = [team_col_name, 'Subgroup', 'Name', 'M1-M4 Super_class_consumption', '>=12']
-        available_columns = [col for col in required_columns if col in new_df.columns]
-        new_df = new_df[available_columns]
+    # Below-threshold flags as 0/1 columns so they aggregate with a plain sum
+    below_cols = {}
+    for metric, threshold in DEFAULT_THRESHOLDS.items():
+        col = METRIC_COLUMNS[metric]
+        if col in work.columns:
+            below_cols[f'{col}_Below'] = col
+            work[f'{col}_Below'] = (work[col] < threshold).astype(int)
+    
+    rollups = {}
+    for level in levels:
+        if level == 'Team':
+            keys = team_keys(frame)
+        elif level in frame.columns:
+            values = frame[level].astype(str).str.strip()
+            keys = values.where(frame[level].notna() & (values != ''), 'Unassigned')
+        else:
+            continue
+        grouped = work.groupby(keys, sort=True)
         
-        # Rename columns
-        new_df.rename(columns={'M1-M4 Super_class_consumption':'SC%', '>=12':'CC%'}, inplace=True)
+        agg = pd.concat([
+            grouped.size().rename('agents'),
+            grouped[mean_cols].mean().add_suffix('_mean'),
+            grouped[mean_cols].median().add_suffix('_median'),
+            grouped[sum_cols].sum(min_count=1).add_suffix('_sum'),
+            grouped[list(below_cols)].sum()
+        ], axis=1)
         
-        # Clean percentage columns that may contain symbols like >, <
-        for col in ['CC%', 'SC%']:
-            if col in new_df.columns:
-                new_df[col] = new_df[col].apply(clean_numeric_value)
+        if 'Total_Leads_sum' in agg.columns and 'Recovered_Leads_sum' in agg.columns:
+            agg['Recovery_Rate'] = (agg['Recovered_Leads_sum'] / agg['Total_Leads_sum'].where(agg['Total_Leads_sum'] > 0) * 100)
         
-        return new_df
+        # Round-trip through JSON to get native types with NaN -> None
+        rollups[level] = json.loads(agg.to_json(orient='index'))
     
-    # Process available files
-    processed_dfs = {}
+    return rollups
+
+# Resolved column mappings per report layout, keyed by a fingerprint of the header row.
+# Values are column positions, so they stay valid for any file with the same headers.
+_column_mapping_cache = {}
+_column_mapping_lock = threading.Lock()
+
+def header_fingerprint(source, columns):
+    """Stable hash of a report's header row (source name + column labels in order)"""
+    digest = hashlib.sha1(source.encode('utf-8'))
+    for col in columns:
+        digest.update(b'\x1f' + str(col).encode('utf-8'))
+    return f"{source}:{digest.hexdigest()}"
+
+def cached_column_mapping(source, columns, resolve):
+    """
+    Return the column mapping for this header layout, running resolve() (the
+    detection heuristics) only the first time the layout is seen.
+    """
+    key = header_fingerprint(source, columns)
+    with _column_mapping_lock:
+        mapping = _column_mapping_cache.get(key)
+    if mapping is not None:
+        print(f"[ETL] Reusing cached {source.upper()} column mapping ({key[-8:]})")
+        return mapping
     
-    def up_etl_internal(file_path):
-        """UP ETL function - processes Upgrade Rate data"""
-        df = pd.read_excel(file_path)
-        
-        # Remove first 2 rows
-        new_df = df.iloc[2:].copy()
-        new_df = new_df.reset_index(drop=True)
-        
-        # Drop CM workplace columns
-        workplace_cols = [col for col in new_df.columns if 'workplace' in col.lower() or 'CM workplace' in str(col)]
-        if workplace_cols:
-            new_df = new_df.drop(workplace_cols, axis=1)
-        
-        # Rename columns
-        rename_map = {}
-        for col in new_df.columns:
-            if 'Last CM Name' in str(col):
-                rename_map[col] = 'Name'
-            elif 'Last CM Team' in str(col):
-                rename_map[col] = 'Subgroup'
-        new_df = new_df.rename(columns=rename_map)
-        
-        # Find upgrade rate column
-        upgrade_rate_col = None
-        for col in new_df.columns:
-            if 'M-2累积升舱率' in str(col) or 'M-2 Cumulative Upgrade Rate' in str(col):
-                upgrade_rate_col = col
+    mapping = resolve()
+    with _column_mapping_lock:
+        _column_mapping_cache[key] = mapping
+    return mapping
+
+def invalidate_column_mappings(source=None):
+    """Forget cached column mappings (all, or only one source); returns how many were dropped"""
+    with _column_mapping_lock:
+        keys = [key for key in _column_mapping_cache if source is None or key.startswith(f"{source}:")]
+        for key in keys:
+            del _column_mapping_cache[key]
+    print(f"[ETL] Invalidated {len(keys)} cached column mapping(s)")
+    return len(keys)
+
+def column_position(columns, col):
+    """Position of a detected column label (None stays None)"""
+    return None if col is None else list(columns).index(col)
+
+def column_at(columns, pos):
+    """Column label at a cached position (None stays None)"""
+    return None if pos is None else columns[pos]
+
+def layout_header_labels(values):
+    """Header labels the way pandas names them: blanks become 'Unnamed: n', duplicates get .1, .2"""
+    labels = []
+    seen = {}
+    for pos, value in enumerate(values):
+        label = f"Unnamed: {pos}" if pd.isna(value) else value
+        if label in seen:
+            seen[label] += 1
+            label = f"{label}.{seen[label]}"
+        else:
+            seen[label] = 0
+        labels.append(label)
+    return labels
+
+def layout_filter_mask(series, rule):
+    """Rows to keep for one layout filter rule"""
+    op = rule['op']
+    value = rule.get('value')
+    if op == 'not_contains':
+        return ~series.astype(str).str.lower().str.contains(str(value).lower(), na=False, regex=False)
+    if op == 'not_in':
+        return ~series.isin(value)
+    if op == 'not_null':
+        return series.notna()
+    if op == 'not_blank':
+        return series.notna() & (series.astype(str).str.strip() != '')
+    if op == 'not_matches':
+        return ~series.astype(str).str.match(value, case=False, na=False)
+    if op == 'startswith':
+        return series.astype(str).str.startswith(value, na=False)
+    raise ValueError(f"Unknown layout filter op '{op}'")
+
+def apply_layout(raw, spec, source=None):
+    """
+    Generic report ETL driven by a source_layouts spec.
+    
+    Parameters:
+    raw (pandas.DataFrame): Sheet read with header=None (report_readers.read_report_rows)
+    spec (dict): Layout spec from source_layouts.detect_layout
+    source (str, optional): Report source, used to namespace the column mapping cache
+    
+    Returns:
+    pandas.DataFrame: Laid-out frame (before any source-specific transform)
+    """
+    version = spec['version']
+    header_row = spec['header_row']
+    start_col = spec.get('drop_leading_columns', 0)
+    first_data_row = header_row + 1 + spec.get('skip_rows_after_header', 0)
+    
+    df = raw.iloc[first_data_row:, start_col:].reset_index(drop=True).infer_objects()
+    df = infer_report_cells(df, raw)
+    labels = layout_header_labels(raw.iloc[header_row, start_col:])
+    for pos, name in spec.get('rename_positions', {}).items():
+        if pos < len(labels):
+            labels[pos] = name
+    
+    # Pattern-based drops/renames are resolved once per header layout
+    def resolve_columns():
+        drop = [pos for pos, label in enumerate(labels)
+                if any(re.search(pattern, str(label), flags=re.IGNORECASE) for pattern in spec.get('drop_columns', []))]
+        renames = []
+        for pattern, name in spec.get('rename_patterns', []):
+            pos = next((pos for pos, label in enumerate(labels)
+                        if pos not in drop and re.search(pattern, str(label), flags=re.IGNORECASE)), None)
+            if pos is not None:
+                renames.append([pos, name])
+        return {'drop': drop, 'rename': renames}
+    
+    mapping = cached_column_mapping(source or version, [version] + labels, resolve_columns)
+    for pos, name in mapping['rename']:
+        labels[pos] = name
+    df.columns = labels
+    if mapping['drop']:
+        df = df.iloc[:, [pos for pos in range(len(labels)) if pos not in mapping['drop']]]
+    
+    def resolve(col_ref):
+        if isinstance(col_ref, int):
+            return df.columns[col_ref] if col_ref < len(df.columns) else None
+        return col_ref if col_ref in df.columns else None
+    
+    for col_ref in spec.get('ffill', []):
+        col = resolve(col_ref)
+        if col is not None:
+            df[col] = df[col].ffill()
+    
+    for rule in spec.get('filters', []):
+        for col_ref in rule['columns']:
+            col = resolve(col_ref)
+            if col is None:
+                continue
+            keep = layout_filter_mask(df[col], rule)
+            removed = int((~keep).sum())
+            if removed > 0:
+                df = df[keep].reset_index(drop=True)
+                print(f"[LAYOUT] {version}: removed {removed} rows failing {rule['op']} on '{col}'")
+    
+    if 'keep' in spec:
+        keep_cols = []
+        for col_ref in spec['keep']:
+            col = resolve(col_ref)
+            if col is not None and col not in keep_cols:
+                keep_cols.append(col)
+        df = df[keep_cols]
+    
+    df = df.rename(columns=spec.get('rename', {}))
+    
+    # Clean numeric values that may contain symbols like >, <
+    for col in spec.get('numeric', []):
+        if col in df.columns:
+            df[col] = df[col].apply(clean_numeric_value)
+    
+    return df.copy()
+
+def resolve_all_leads_columns(columns):
+    """Detect the LP employee, LP last note time and Student ID columns of an All Leads header"""
+    # Find the LP employee assigned column
+    target_column = None
+    possible_names = [
+        'The last (current) name of the LP employee assigned',
+        'LP employee assigned',
+        'LP employee',
+        'Employee assigned',
+        'Assigned LP',
+        'LP name',
+        'Agent name',
+        'Agent'
+    ]
+    
+    print(f"[ALL_LEADS] Looking for LP employee column...")
+    
+    # Look for exact match first
+    for col in columns:
+        if str(col).strip() in possible_names:
+            target_column = col
+            print(f"[ALL_LEADS] Found exact match: '{target_column}'")
+            break
+    
+    # If no exact match, look for partial matches
+    if target_column is None:
+        for col in columns:
+            col_str = str(col).lower().strip()
+            if ('lp' in col_str and ('employee' in col_str or 'assigned' in col_str)) or \
+               ('agent' in col_str and 'name' in col_str):
+                target_column = col
+                print(f"[ALL_LEADS] Found partial match: '{target_column}'")
                 break
-        
-        # Select required columns
-        required_columns = ['Name', 'Subgroup']
-        if upgrade_rate_col:
-            required_columns.append(upgrade_rate_col)
-        
-        available_columns = [col for col in required_columns if col in new_df.columns]
-        new_df = new_df[available_columns]
-        
-        # Rename upgrade rate column
-        if upgrade_rate_col and upgrade_rate_col in new_df.columns:
-            new_df = new_df.rename(columns={upgrade_rate_col: 'UP%'})
-            # Clean UP% column that may contain symbols like >, <
-            new_df['UP%'] = new_df['UP%'].apply(clean_numeric_value)
-        
-        # Filter out rows where Name equals 'Sub Total' or '-'
-        if 'Name' in new_df.columns:
-            # Filter out invalid entries including headers, sub totals, and placeholders
-            invalid_names = ['Sub Total', '-', 'NAME', 'Name', 'Last CM Name', 'CM Name', 'Agent Name']
-            new_df = new_df[~new_df['Name'].isin(invalid_names)]
-            new_df = new_df[new_df['Name'].notna()]  # Also remove NaN values
-            # Filter out rows where Name starts with header-like patterns
-            new_df = new_df[~new_df['Name'].astype(str).str.lower().str.match(r'^(total|sum|average|mean|header|column)', na=False)]
-            new_df = new_df.reset_index(drop=True)
-        
-        return new_df
     
-    def re_etl_internal(file_path):
-        """RE ETL function - processes CM teams data"""
-        df = pd.read_excel(file_path)
+    # Find the LP last note time column
+    note_time_column = None
+    possible_note_columns = [
+        'LP last note time',
+        'LP last note',
+        'Last note time',
+        'Note time',
+        'LP note time'
+    ]
+    
+    # Look for exact match first
+    for col in columns:
+        if str(col).strip() in possible_note_columns:
+            note_time_column = col
+            break
+    
+    # If no exact match, look for partial matches
+    if note_time_column is None:
+        for col in columns:
+            col_str = str(col).lower().strip()
+            if 'lp' in col_str and 'note' in col_str and 'time' in col_str:
+                note_time_column = col
+                break
+    
+    # Find Student ID column
+    student_id_column = None
+    possible_student_id_names = [
+        'Student ID',
+        'StudentID',
+        'Student_ID',
+        'ID',
+        'Lead ID',
+        'LeadID',
+        'Lead_ID',
+        'Student Id',
+        'Student'
+    ]
+    
+    # Look for exact match first
+    for col in columns:
+        if str(col).strip() in possible_student_id_names:
+            student_id_column = col
+            break
+    
+    # If no exact match, look for partial matches
+    if student_id_column is None:
+        for col in columns:
+            col_str = str(col).lower().strip()
+            if ('student' in col_str and 'id' in col_str) or \
+               ('lead' in col_str and 'id' in col_str) or \
+               col_str == 'id':
+                student_id_column = col
+                break
+    
+    return {
+        'name': column_position(columns, target_column),
+        'note_time': column_position(columns, note_time_column),
+        'student_id': column_position(columns, student_id_column)
+    }
+
+def all_leads_raw_columns(head, spec):
+    """Raw column positions the All Leads ETL reads (LP employee, note time, Student ID)"""
+    labels = layout_header_labels(head.iloc[spec['header_row']])
+    mapping = cached_column_mapping('all_leads', labels, lambda: resolve_all_leads_columns(labels))
+    if mapping['name'] is None:
+        return None
+    return sorted(pos for pos in mapping.values() if pos is not None)
+
+# A lead counts as recovered when the LP last note is this recent
+RECOVERY_WINDOW_DAYS = 14
+
+def recovery_cutoff(as_of=None):
+    """Oldest LP note date that still counts as recovered at as_of (default: now)"""
+    return (as_of or datetime.now()) - timedelta(days=RECOVERY_WINDOW_DAYS)
+
+def parse_lp_note_time(time_str):
+    """Parse LP note time format: 2025-09-09 0:21:46"""
+    if pd.isna(time_str) or str(time_str).strip() == '':
+        return None
+    try:
+        time_str = str(time_str).strip()
+        # Handle the specific format: YYYY-MM-DD H:MM:SS
+        if ' ' in time_str:
+            date_part = time_str.split(' ')[0]  # Extract date part only
+            return datetime.strptime(date_part, '%Y-%m-%d')
+        else:
+            # Try parsing as date only
+            return datetime.strptime(time_str, '%Y-%m-%d')
+    except Exception as e:
+        print(f"[ALL_LEADS] Error parsing date '{time_str}': {e}")
+        return None
+
+# Large All Leads workbooks are read row by row instead of into a DataFrame.
+# CMLENS_ALL_LEADS_STREAMING: 'auto' (by file size), '1' (always) or '0' (never)
+ALL_LEADS_STREAMING = os.environ.get('CMLENS_ALL_LEADS_STREAMING', 'auto').lower()
+ALL_LEADS_STREAMING_MIN_BYTES = int(os.environ.get('CMLENS_ALL_LEADS_STREAMING_MIN_BYTES', 5 * 1024 * 1024))
+
+def empty_all_leads_frame():
+    return pd.DataFrame({
+        'Name': [], 
+        'Total_Leads': [], 
+        'Recovered_Leads': [], 
+        'Unrecovered_Leads': [], 
+        'Unrecovered_Students': []
+    })
+
+def use_all_leads_streaming(file_path):
+    """Whether an All Leads file should be read with the streaming reader (.xlsx only)"""
+    if not str(file_path).lower().endswith('.xlsx') or ALL_LEADS_STREAMING in ('0', 'false', 'never'):
+        return False
+    if ALL_LEADS_STREAMING in ('1', 'true', 'always'):
+        return True
+    if find_sidecar(file_path) is not None:
+        # Reading the sidecar with column projection beats streaming the workbook
+        return False
+    return os.path.getsize(file_path) >= ALL_LEADS_STREAMING_MIN_BYTES
+
+def _missing_cell(value):
+    if value is None:
+        return True
+    if isinstance(value, float):
+        return value != value
+    return isinstance(value, str) and value in MISSING_CELL_STRINGS
+
+def stream_all_leads(file_path, header_row=0, as_of=None):
+    """
+    Streaming All Leads ETL for very large workbooks.
+    
+    Reads the first sheet row by row in openpyxl read-only mode, keeps only the
+    LP employee, LP last note time and Student ID cells, and aggregates per-agent
+    lead counts and unrecovered student details as it goes. Memory grows with the
+    number of agents and unrecovered leads, not with the size of the file.
+    Produces the same frame as the DataFrame-based All Leads ETL.
+    """
+    from openpyxl import load_workbook
+    
+    print(f"[ALL_LEADS] Streaming {file_path} in read-only mode")
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        for _ in range(header_row):
+            next(rows, None)
+        header = next(rows, None)
+        if header is None:
+            print("[ALL_LEADS] WARNING: Empty workbook")
+            return empty_all_leads_frame()
         
-        # Drop first column
-        df_no_first_col = df.iloc[:, 1:].copy()
+        columns = layout_header_labels(header)
+        mapping = cached_column_mapping('all_leads', columns, lambda: resolve_all_leads_columns(columns))
+        name_pos, note_pos, student_pos = mapping['name'], mapping['note_time'], mapping['student_id']
+        if name_pos is None:
+            print(f"[ALL_LEADS] WARNING: Could not find LP employee column. Available columns: {columns}")
+            return empty_all_leads_frame()
         
-        # Process headers
-        new_df = df_no_first_col.iloc[2:].copy()
-        new_df.columns = df_no_first_col.iloc[1]
-        new_df = new_df.reset_index(drop=True)
-        new_df.columns.name = None
+        cutoff_date = recovery_cutoff(as_of)
+        counts = {}  # agent -> [total, recovered]
+        unrecovered_details = {}
+        rows_read = 0
         
-        # Forward fill Team column
+        for row in rows:
+            rows_read += 1
+            agent = row[name_pos] if name_pos < len(row) else None
+            if _missing_cell(agent):
+                continue
+            name = normalize_name(str(agent).strip().upper())
+            
+            note_value = None
+            if note_pos is not None and note_pos < len(row) and not _missing_cell(row[note_pos]):
+                note_value = row[note_pos]
+            parsed = parse_lp_note_time(note_value) if note_value is not None else None
+            recovered = parsed is not None and parsed >= cutoff_date
+            
+            agent_counts = counts.setdefault(name, [0, 0])
+            agent_counts[0] += 1
+            if recovered:
+                agent_counts[1] += 1
+            elif student_pos is not None:
+                student = row[student_pos] if student_pos < len(row) else None
+                unrecovered_details.setdefault(name, []).append({
+                    'studentId': 'N/A' if _missing_cell(student) else str(student),
+                    'noteTime': 'N/A' if note_value is None else str(note_value)
+                })
+    finally:
+        workbook.close()
+    
+    names = sorted(counts)
+    totals = [counts[name][0] for name in names]
+    recovered_counts = [counts[name][1] for name in names]
+    agent_stats = pd.DataFrame({
+        'Name': names,
+        'Total_Leads': totals,
+        'Recovered_Leads': recovered_counts,
+        'Unrecovered_Leads': [total - rec for total, rec in zip(totals, recovered_counts)]
+    })
+    agent_stats['Unrecovered_Students'] = [unrecovered_details.get(name, []) for name in names]
+    
+    print(f"[ALL_LEADS] Streamed {rows_read} rows into {len(agent_stats)} agents "
+          f"({sum(totals)} total leads, {sum(recovered_counts)} recovered)")
+    return agent_stats
+
+def flexible_etl_pipeline(cc_file=None, up_file=None, re_file=None, fixed_file=None, all_leads_file=None, json_output=None,
+                          report_cache=None, archived_inputs=False, as_of=None):
+    """
+    Flexible ETL pipeline that can process any combination of the five data sources.
+    
+    Parameters:
+    cc_file (str, optional): Path to CC report (Class Consumption data)
+    up_file (str, optional): Path to UP report (Upgrade Rate data)
+    re_file (str, optional): Path to RE report (CM teams data)
+    fixed_file (str, optional): Path to Fixed Rate report
+    all_leads_file (str, optional): Path to All Leads report
+    json_output (str, optional): Path to save JSON output file with Name as key
+    report_cache (dict, optional): source -> (content hash, extracted frame) kept between
+        calls; a report whose file content is unchanged is not extracted again
+    archived_inputs (bool): The files are kept and read again (backfill, inbox), so workbooks
+        get Parquet sidecars (report_sidecars); uploads leave nothing behind
+    as_of (datetime, optional): When the reports were current; All Leads recovery is
+        measured against it (LP notes within RECOVERY_WINDOW_DAYS). Defaults to now
+    
+    Returns:
+    pandas.DataFrame: Merged DataFrame with consistent structure regardless of input files
+    
+    Note: At least one file must be provided. Reports can be .xlsx/.xls workbooks,
+    CSV or Parquet exports (see report_readers).
+    """
+    
+    # Validate input - at least one file must be provided
+    if not any([cc_file, up_file, re_file, fixed_file, all_leads_file]):
+        raise ValueError("At least one file must be provided")
+    
+    # Define the ETL functions inline for portability
+    def re_etl_internal(new_df):
+        """RE ETL function - processes CM teams data
+        (first column dropped, headers and Team forward fill applied by the re layout)"""
         team_col_name = new_df.columns[0]
-        new_df[team_col_name] = new_df[team_col_name].ffill()
-        
-        # Process CM Name column
-        cm_name_col = None
-        for col in new_df.columns:
-            if 'CM Name' in str(col) or 'CM name' in str(col):
-                cm_name_col = col
-                break
-        if cm_name_col is None:
-            for col in new_df.columns:
-                if re.search(r'cm\s*name', str(col), flags=re.IGNORECASE):
-                    cm_name_col = col
-                    break
-        
-        if cm_name_col:
-            new_df = new_df.dropna(subset=[cm_name_col]).reset_index(drop=True)
-            new_df = new_df.rename(columns={cm_name_col: 'Name'})
         
         # Helper functions for column selection
         def find_candidates(columns, keywords):
@@ -444,33 +761,68 @@ def flexible_etl_pipeline(cc_file=None, up_file=None, re_file=None, fixed_file=N
                     best_col = c
             return best_col
         
-        # Find metric columns
-        leads_cands = find_candidates(new_df.columns, ['leads'])
-        showup_cands = find_candidates(new_df.columns, ['show up', 'showup', 'show-up', 'show_up'])
-        paid_cands = find_candidates(new_df.columns, ['paid'])
-        # Add achievement percentage column search with more variations
-        print(f"Searching for achievement percentage columns in: {list(new_df.columns)}")
-        ach_pct_cands = find_candidates(new_df.columns, [
-            'leads ach%', 'ach%', 'achievement%', 'achievement', 'leads_ach%',
-            'leads achievement%', 'lead ach%', 'lead achievement%',
-            'referral ach%', 'referral achievement%', 'acheivement%',
-            'ach %', 'leads ach %', 'lead ach %'
-        ])
-        print(f"Achievement percentage candidates found: {ach_pct_cands}")
+        # Detect the CM name and metric columns once per header layout
+        columns = new_df.columns
+        def resolve_columns():
+            # CM Name column
+            cm_name_col = None
+            for col in columns:
+                if 'CM Name' in str(col) or 'CM name' in str(col):
+                    cm_name_col = col
+                    break
+            if cm_name_col is None:
+                for col in columns:
+                    if re.search(r'cm\s*name', str(col), flags=re.IGNORECASE):
+                        cm_name_col = col
+                        break
+            
+            work_df = new_df.dropna(subset=[cm_name_col]) if cm_name_col is not None else new_df
+            metric_columns = [col for col in columns if cm_name_col is None or col != cm_name_col]
+            
+            # Find metric columns
+            leads_cands = find_candidates(metric_columns, ['leads'])
+            showup_cands = find_candidates(metric_columns, ['show up', 'showup', 'show-up', 'show_up'])
+            paid_cands = find_candidates(metric_columns, ['paid'])
+            # Add achievement percentage column search with more variations
+            print(f"Searching for achievement percentage columns in: {list(metric_columns)}")
+            ach_pct_cands = find_candidates(metric_columns, [
+                'leads ach%', 'ach%', 'achievement%', 'achievement', 'leads_ach%',
+                'leads achievement%', 'lead ach%', 'lead achievement%',
+                'referral ach%', 'referral achievement%', 'acheivement%',
+                'ach %', 'leads ach %', 'lead ach %'
+            ])
+            print(f"Achievement percentage candidates found: {ach_pct_cands}")
+            
+            # Use different selection logic for percentage columns
+            ach_pct_col = None
+            if ach_pct_cands:
+                # For percentage columns, prefer exact matches or ones with "%" in name
+                pct_matches = [col for col in ach_pct_cands if '%' in col.lower()]
+                ach_pct_col = pct_matches[0] if pct_matches else ach_pct_cands[0]
+                print(f"Found achievement percentage column: '{ach_pct_col}' from candidates: {ach_pct_cands}")
+            else:
+                print(f"No achievement percentage column found. Available columns: {list(metric_columns)}")
+                print(f"Looking for patterns: leads ach%, ach%, achievement%, etc.")
+            
+            return {
+                'name': column_position(columns, cm_name_col),
+                'leads': column_position(columns, pick_count_col(work_df, leads_cands)),
+                'show_up': column_position(columns, pick_count_col(work_df, showup_cands)),
+                'paid': column_position(columns, pick_count_col(work_df, paid_cands)),
+                'ach_pct': column_position(columns, ach_pct_col)
+            }
         
-        leads_col = pick_count_col(new_df, leads_cands)
-        showup_col = pick_count_col(new_df, showup_cands)
-        paid_col = pick_count_col(new_df, paid_cands)
-        # Use different selection logic for percentage columns
-        ach_pct_col = None
-        if ach_pct_cands:
-            # For percentage columns, prefer exact matches or ones with "%" in name
-            pct_matches = [col for col in ach_pct_cands if '%' in col.lower()]
-            ach_pct_col = pct_matches[0] if pct_matches else ach_pct_cands[0]
-            print(f"Found achievement percentage column: '{ach_pct_col}' from candidates: {ach_pct_cands}")
-        else:
-            print(f"No achievement percentage column found. Available columns: {list(new_df.columns)}")
-            print(f"Looking for patterns: leads ach%, ach%, achievement%, etc.")
+        mapping = cached_column_mapping('re', columns, resolve_columns)
+        cm_name_col = column_at(columns, mapping['name'])
+        leads_col = column_at(columns, mapping['leads'])
+        showup_col = column_at(columns, mapping['show_up'])
+        paid_col = column_at(columns, mapping['paid'])
+        ach_pct_col = column_at(columns, mapping['ach_pct'])
+        
+        # Process CM Name column
+        if cm_name_col:
+            new_df = new_df.dropna(subset=[cm_name_col]).reset_index(drop=True)
+            new_df = new_df.rename(columns={cm_name_col: 'Name'})
         
         # Select and rename columns
         required = {'Subgroup': team_col_name, 'Name': 'Name'}
@@ -526,191 +878,100 @@ def flexible_etl_pipeline(cc_file=None, up_file=None, re_file=None, fixed_file=N
         
         return new_df
     
-    def fixed_etl_internal(file_path):
-        """Fixed ETL function - processes Fixed Rate data
+    def fixed_lp_etl_internal(df):
+        """Fixed ETL function - processes Fixed Rate data (fixed-lp layout)
         Groups by LP (agent name) and calculates fixed rate from 'Fixed or Not' column"""
-        df = pd.read_excel(file_path)
+        print(f"Fixed file shape: {df.shape}")
+        print(f"Fixed file columns: {list(df.columns)}")
+        print("Processing Fixed file with LP grouping logic...")
+        
+        # Group by LP (agent name) and calculate fixed statistics
+        grouped = df.groupby('LP').agg({
+            'Fixed or Not': ['sum', 'count'],  # sum = total fixed, count = total students
+            'LP Group': 'first'  # get group info
+        }).reset_index()
+        
+        # Flatten column names
+        grouped.columns = ['Name', 'Fixed_Count', 'Total_Students', 'Group']
+        
+        # Calculate Fixed Rate as percentage
+        grouped['Fixed_Pct'] = (grouped['Fixed_Count'] / grouped['Total_Students'] * 100).round(2)
+        
+        # Rename Students column to match expected format
+        grouped = grouped.rename(columns={'Total_Students': 'Students'})
+        
+        # Select final columns
+        result_df = grouped[['Name', 'Group', 'Students', 'Fixed_Pct']].copy()
+        
+        print(f"Fixed rate calculation completed: {len(result_df)} agents processed")
+        print(f"Sample data:\n{result_df.head()}")
         
+        return result_df
+    
+    def fixed_legacy_etl_internal(df):
+        """Fixed ETL function - fallback for older Fixed Rate formats (fixed-legacy layout)"""
         print(f"Fixed file shape: {df.shape}")
         print(f"Fixed file columns: {list(df.columns)}")
+        print("Using fallback processing for Fixed file...")
         
-        # Check if this is the new format with LP and 'Fixed or Not' columns
-        if 'LP' in df.columns and 'Fixed or Not' in df.columns:
-            print("Processing Fixed file with LP grouping logic...")
-            
-            # Group by LP (agent name) and calculate fixed statistics
-            grouped = df.groupby('LP').agg({
-                'Fixed or Not': ['sum', 'count'],  # sum = total fixed, count = total students
-                'LP Group': 'first'  # get group info
-            }).reset_index()
-            
-            # Flatten column names
-            grouped.columns = ['Name', 'Fixed_Count', 'Total_Students', 'Group']
-            
-            # Calculate Fixed Rate as percentage
-            grouped['Fixed_Pct'] = (grouped['Fixed_Count'] / grouped['Total_Students'] * 100).round(2)
-            
-            # Rename Students column to match expected format
-            grouped = grouped.rename(columns={'Total_Students': 'Students'})
+        if 'Name' in df.columns or 'Agent' in df.columns:
+            name_col = 'Name' if 'Name' in df.columns else 'Agent'
+            required_cols = [name_col]
             
-            # Select final columns
-            result_df = grouped[['Name', 'Group', 'Students', 'Fixed_Pct']].copy()
+            # Look for fixed percentage column
+            fixed_cols = [col for col in df.columns if 'fixed' in col.lower() or 'rate' in col.lower()]
+            if fixed_cols:
+                required_cols.append(fixed_cols[0])
+                df = df.rename(columns={fixed_cols[0]: 'Fixed_Pct'})
+                # Clean Fixed_Pct column that may contain symbols like >, <
+                df['Fixed_Pct'] = df['Fixed_Pct'].apply(clean_numeric_value)
             
-            print(f"Fixed rate calculation completed: {len(result_df)} agents processed")
-            print(f"Sample data:\n{result_df.head()}")
+            # Look for student count column
+            student_cols = [col for col in df.columns if 'student' in col.lower() or 'count' in col.lower()]
+            if student_cols:
+                required_cols.append(student_cols[0])
+                df = df.rename(columns={student_cols[0]: 'Students'})
             
-            return result_df
-            
-        else:
-            # Fallback to old logic for different file formats
-            print("Using fallback processing for Fixed file...")
-            
-            if 'Name' in df.columns or 'Agent' in df.columns:
-                name_col = 'Name' if 'Name' in df.columns else 'Agent'
-                required_cols = [name_col]
-                
-                # Look for fixed percentage column
-                fixed_cols = [col for col in df.columns if 'fixed' in col.lower() or 'rate' in col.lower()]
-                if fixed_cols:
-                    required_cols.append(fixed_cols[0])
-                    df = df.rename(columns={fixed_cols[0]: 'Fixed_Pct'})
-                    # Clean Fixed_Pct column that may contain symbols like >, <
-                    df['Fixed_Pct'] = df['Fixed_Pct'].apply(clean_numeric_value)
-                
-                # Look for student count column
-                student_cols = [col for col in df.columns if 'student' in col.lower() or 'count' in col.lower()]
-                if student_cols:
-                    required_cols.append(student_cols[0])
-                    df = df.rename(columns={student_cols[0]: 'Students'})
-                
-                # Standardize name column
-                if name_col != 'Name':
-                    df = df.rename(columns={name_col: 'Name'})
-                    required_cols[0] = 'Name'
-                
-                # Select available columns
-                available_cols = [col for col in required_cols if col in df.columns]
-                df = df[available_cols]
+            # Standardize name column
+            if name_col != 'Name':
+                df = df.rename(columns={name_col: 'Name'})
+                required_cols[0] = 'Name'
             
-            return df
+            # Select available columns
+            available_cols = [col for col in required_cols if col in df.columns]
+            df = df[available_cols]
+        
+        return df
     
-    def all_leads_etl_internal(file_path):
+    def all_leads_etl_internal(df):
         """All Leads ETL function - processes All Leads Report data
         Extracts agent names from 'The last (current) name of the LP employee assigned' column
         and counts total leads per agent, plus calculates recovered/unrecovered based on LP last note time"""
         
         try:
-            print(f"[ALL_LEADS] Starting processing of file: {file_path}")
-            df = pd.read_excel(file_path)
-            
             print(f"[ALL_LEADS] File loaded successfully - shape: {df.shape}")
             print(f"[ALL_LEADS] Columns found: {list(df.columns)}")
             
-            # Find the LP employee assigned column
-            target_column = None
-            possible_names = [
-                'The last (current) name of the LP employee assigned',
-                'LP employee assigned',
-                'LP employee',
-                'Employee assigned',
-                'Assigned LP',
-                'LP name',
-                'Agent name',
-                'Agent'
-            ]
-            
-            print(f"[ALL_LEADS] Looking for LP employee column...")
-            
-            # Look for exact match first
-            for col in df.columns:
-                if str(col).strip() in possible_names:
-                    target_column = col
-                    print(f"[ALL_LEADS] Found exact match: '{target_column}'")
-                    break
-            
-            # If no exact match, look for partial matches
-            if target_column is None:
-                for col in df.columns:
-                    col_str = str(col).lower().strip()
-                    if ('lp' in col_str and ('employee' in col_str or 'assigned' in col_str)) or \
-                       ('agent' in col_str and 'name' in col_str):
-                        target_column = col
-                        print(f"[ALL_LEADS] Found partial match: '{target_column}'")
-                        break
+            # Detect the LP employee, note time and student ID columns once per header layout
+            columns = df.columns
+            mapping = cached_column_mapping('all_leads', columns, lambda: resolve_all_leads_columns(columns))
+            target_column = column_at(columns, mapping['name'])
+            note_time_column = column_at(columns, mapping['note_time'])
+            student_id_column = column_at(columns, mapping['student_id'])
             
             if target_column is None:
                 print(f"[ALL_LEADS] WARNING: Could not find LP employee column. Available columns: {list(df.columns)}")
                 # Return empty dataframe with expected structure
-                return pd.DataFrame({
-                    'Name': [], 
-                    'Total_Leads': [], 
-                    'Recovered_Leads': [], 
-                    'Unrecovered_Leads': [],
-                    'Unrecovered_Students': []
-                })
+                return empty_all_leads_frame()
             
             print(f"[ALL_LEADS] Found LP employee column: '{target_column}'")
             
-            # Find the LP last note time column
-            note_time_column = None
-            possible_note_columns = [
-                'LP last note time',
-                'LP last note',
-                'Last note time',
-                'Note time',
-                'LP note time'
-            ]
-            
-            # Look for exact match first
-            for col in df.columns:
-                if str(col).strip() in possible_note_columns:
-                    note_time_column = col
-                    break
-            
-            # If no exact match, look for partial matches
-            if note_time_column is None:
-                for col in df.columns:
-                    col_str = str(col).lower().strip()
-                    if 'lp' in col_str and 'note' in col_str and 'time' in col_str:
-                        note_time_column = col
-                        break
-            
             if note_time_column is None:
                 print(f"[ALL_LEADS] WARNING: Could not find LP last note time column. Available columns: {list(df.columns)}")
                 print("[ALL_LEADS] Will only calculate Total_Leads, Recovered and Unrecovered will be 0")
             else:
                 print(f"[ALL_LEADS] Found LP last note time column: '{note_time_column}'")
             
-            # Find Student ID column
-            student_id_column = None
-            possible_student_id_names = [
-                'Student ID',
-                'StudentID',
-                'Student_ID',
-                'ID',
-                'Lead ID',
-                'LeadID',
-                'Lead_ID',
-                'Student Id',
-                'Student'
-            ]
-            
-            # Look for exact match first
-            for col in df.columns:
-                if str(col).strip() in possible_student_id_names:
-                    student_id_column = col
-                    break
-            
-            # If no exact match, look for partial matches
-            if student_id_column is None:
-                for col in df.columns:
-                    col_str = str(col).lower().strip()
-                    if ('student' in col_str and 'id' in col_str) or \
-                       ('lead' in col_str and 'id' in col_str) or \
-                       col_str == 'id':
-                        student_id_column = col
-                        break
-            
             if student_id_column is None:
                 print(f"[ALL_LEADS] WARNING: Could not find Student ID column. Available columns: {list(df.columns)}")
                 print("[ALL_LEADS] Student ID details will not be available for unrecovered leads")
@@ -732,35 +993,14 @@ def flexible_etl_pipeline(cc_file=None, up_file=None, re_file=None, fixed_file=N
             # Calculate recovery status if note time column exists
             if note_time_column is not None:
                 print(f"[ALL_LEADS] Calculating recovery status...")
-                # Import datetime modules
-                from datetime import datetime, timedelta
-                
-                # Parse the LP last note time with specific format handling
-                def parse_lp_note_time(time_str):
-                    """Parse LP note time format: 2025-09-09 0:21:46"""
-                    if pd.isna(time_str) or str(time_str).strip() == '':
-                        return None
-                    try:
-                        time_str = str(time_str).strip()
-                        # Handle the specific format: YYYY-MM-DD H:MM:SS
-                        if ' ' in time_str:
-                            date_part = time_str.split(' ')[0]  # Extract date part only
-                            return datetime.strptime(date_part, '%Y-%m-%d')
-                        else:
-                            # Try parsing as date only
-                            return datetime.strptime(time_str, '%Y-%m-%d')
-                    except Exception as e:
-                        print(f"[ALL_LEADS] Error parsing date '{time_str}': {e}")
-                        return None
-                
                 df_clean['Note_Time_Parsed'] = df_clean[note_time_column].apply(parse_lp_note_time)
                 
-                # Get today's date
-                today = datetime.now()
-                cutoff_date = today - timedelta(days=14)
+                # Recovery is measured at the reports' reference date (today unless as_of is given)
+                today = as_of or datetime.now()
+                cutoff_date = recovery_cutoff(today)
                 
-                print(f"[ALL_LEADS] Today's date: {today.strftime('%Y-%m-%d')}")
-                print(f"[ALL_LEADS] Cutoff date (14 days ago): {cutoff_date.strftime('%Y-%m-%d')}")
+                print(f"[ALL_LEADS] Reference date: {today.strftime('%Y-%m-%d')}")
+                print(f"[ALL_LEADS] Cutoff date ({RECOVERY_WINDOW_DAYS} days ago): {cutoff_date.strftime('%Y-%m-%d')}")
                 
                 # Determine recovery status - within last 14 days
                 df_clean['Is_Recovered'] = (df_clean['Note_Time_Parsed'] >= cutoff_date) & (df_clean['Note_Time_Parsed'].notna())
@@ -834,44 +1074,74 @@ def flexible_etl_pipeline(cc_file=None, up_file=None, re_file=None, fixed_file=N
             print(f"[ALL_LEADS] ERROR: Full traceback:")
             traceback.print_exc()
             # Return empty dataframe with expected structure
-            return pd.DataFrame({
-                'Name': [], 
-                'Total_Leads': [], 
-                'Recovered_Leads': [], 
-                'Unrecovered_Leads': [], 
-                'Unrecovered_Students': []
-            })    # Process available files and normalize names
-    processed_dfs = {}
+            return empty_all_leads_frame()
     
-    if cc_file:
-        df = cc_etl_internal(cc_file)
-        if 'Name' in df.columns:
-            df['Name'] = df['Name'].apply(normalize_name)
-        processed_dfs['cc'] = df
+    # Source-specific steps that run after the declarative layout (see source_layouts.py)
+    layout_transforms = {
+        're_metrics': re_etl_internal,
+        'fixed_lp': fixed_lp_etl_internal,
+        'fixed_legacy': fixed_legacy_etl_internal,
+        'all_leads': all_leads_etl_internal
+    }
     
-    if up_file:
-        df = up_etl_internal(up_file)
-        if 'Name' in df.columns:
-            df['Name'] = df['Name'].apply(normalize_name)
-        processed_dfs['up'] = df
+    # Transforms that only use a few raw columns; the rest are never read (column projection)
+    layout_columns = {
+        'all_leads': all_leads_raw_columns
+    }
     
-    if re_file:
-        df = re_etl_internal(re_file)
-        if 'Name' in df.columns:
-            df['Name'] = df['Name'].apply(normalize_name)
-        processed_dfs['re'] = df
+    def extract_report(source, file_path):
+        """Pick the layout from the first rows, read the report once and run the generic ETL"""
+        head = read_report_rows(file_path, nrows=scan_rows(source))
+        spec = detect_layout(source, raw=head)
+        columns = None
+        if spec.get('transform') in layout_columns and len(head) > spec['header_row']:
+            columns = layout_columns[spec['transform']](head, spec)
+        raw = read_report_rows(file_path, columns=columns, archived=archived_inputs)
+        df = apply_layout(raw, spec, source)
+        transform = spec.get('transform')
+        if transform:
+            df = layout_transforms[transform](df)
+        return df
     
-    if fixed_file:
-        df = fixed_etl_internal(fixed_file)
-        if 'Name' in df.columns:
-            df['Name'] = df['Name'].apply(normalize_name)
-        processed_dfs['fixed'] = df
+    # Process available files and normalize names
+    processed_dfs = {}
+    report_files = {'cc': cc_file, 'up': up_file, 're': re_file, 'fixed': fixed_file, 'all_leads': all_leads_file}
     
-    if all_leads_file:
-        df = all_leads_etl_internal(all_leads_file)
+    for source, file_path in report_files.items():
+        if not file_path:
+            continue
+        fingerprint = None
+        if report_cache is not None:
+            fingerprint = file_sha256(file_path)
+            if source == 'all_leads':
+                # Recovery counts depend on the cutoff date as well as on the file
+                fingerprint = f"{fingerprint}@{recovery_cutoff(as_of).date().isoformat()}"
+            cached = report_cache.get(source)
+            if cached is not None and cached[0] == fingerprint:
+                print(f"[ETL] {source.upper()} report unchanged, reusing its extracted data")
+                processed_dfs[source] = cached[1].copy()
+                continue
+        if source == 'all_leads':
+            print(f"[ALL_LEADS] Starting processing of file: {file_path}")
+            try:
+                if use_all_leads_streaming(file_path):
+                    df = stream_all_leads(file_path, detect_layout(source, file_path)['header_row'], as_of)
+                    if archived_inputs:
+                        # Next runs read the sidecar; converting it now would double this run's time
+                        write_sidecar_later(file_path)
+                else:
+                    df = extract_report(source, file_path)
+            except Exception as e:
+                # All Leads is optional enrichment; an unreadable file yields no leads data
+                print(f"[ALL_LEADS] ERROR: Could not read All Leads file: {str(e)}")
+                df = empty_all_leads_frame()
+        else:
+            df = extract_report(source, file_path)
         if 'Name' in df.columns:
             df['Name'] = df['Name'].apply(normalize_name)
-        processed_dfs['all_leads'] = df
+        processed_dfs[source] = df
+        if report_cache is not None:
+            report_cache[source] = (fingerprint, df.copy())
 
     # Create comprehensive base DataFrame with ALL unique names from ALL files
     # This ensures no one gets lost in the merging process
@@ -1018,6 +1288,11 @@ def flexible_etl_pipeline(cc_file=None, up_file=None, re_file=None, fixed_file=N
         if not sample_conversions.empty:
             print(f"Sample conversion rates: {sample_conversions.tolist()}")
     
+    # Batch score every agent and materialize Team/Group rollups once per ingest
+    merged_df = merged_df.join(score_agents(merged_df))
+    merged_df.attrs['rollups'] = build_rollups(merged_df)
+    print(f"Rollups built for {len(merged_df.attrs['rollups'].get('Team', {}))} teams and {len(merged_df.attrs['rollups'].get('Group', {}))} groups")
+    
     # Final summary
     print(f"\n" + "="*50)
     print(f"MERGE SUMMARY")
@@ -0,0 +1,136 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from script import normalize_name, team_keys, ROLLUP_MEAN_COLUMNS, ROLLUP_SUM_COLUMNS
+from snapshot_history import find_snapshot, load_catalog, load_snapshot
+
+# Metrics compared between two snapshots
+DIFF_METRICS = ROLLUP_MEAN_COLUMNS + ROLLUP_SUM_COLUMNS
+
+# Number of snapshot pairs kept in memory (snapshots are immutable, so entries never go stale)
+DIFF_CACHE_SIZE = 32
+
+
+def previous_snapshot(entry):
+    """Latest snapshot from an earlier week than entry, or None"""
+    earlier = [s for s in load_catalog() if s['week'] < entry['week']]
+    return earlier[-1] if earlier else None
+
+
+def _float(value):
+    return None if pd.isna(value) else round(float(value), 4)
+
+
+def _load_side(snapshot_id):
+    """One snapshot as Name-keyed numeric metrics plus its team label"""
+    frame = load_snapshot(snapshot_id, columns=['Name', 'Team', 'Group'] + DIFF_METRICS)
+    frame = frame.assign(Name=frame['Name'].map(normalize_name))
+    frame = frame[frame['Name'].notna() & (frame['Name'] != '')].drop_duplicates('Name')
+
+    side = pd.DataFrame({'Name': frame['Name'], 'Team': team_keys(frame)})
+    for col in DIFF_METRICS:
+        side[col] = pd.to_numeric(frame[col], errors='coerce') if col in frame.columns else np.nan
+    return side.reset_index(drop=True)
+
+
+def _team_deltas(merged, metrics):
+    """Per-team means on each side, their change, and agent movement counts"""
+    mean_cols = [col for col in metrics if col in ROLLUP_MEAN_COLUMNS]
+    prev_means = merged.groupby('Team_prev')[[f'{col}_prev' for col in mean_cols]].mean()
+    curr_means = merged.groupby('Team_curr')[[f'{col}_curr' for col in mean_cols]].mean()
+    prev_means.columns = mean_cols
+    curr_means.columns = mean_cols
+
+    teams = prev_means.index.union(curr_means.index)
+    prev_means = prev_means.reindex(teams)
+    curr_means = curr_means.reindex(teams)
+    deltas = curr_means - prev_means
+
+    counts = pd.DataFrame({
+        'agents_prev': merged['Team_prev'].value_counts(),
+        'agents_curr': merged['Team_curr'].value_counts(),
+        'new_agents': merged.loc[merged['status'] == 'new', 'Team_curr'].value_counts(),
+        'departed_agents': merged.loc[merged['status'] == 'departed', 'Team_prev'].value_counts()
+    }).reindex(teams).fillna(0).astype(int)
+
+    result = {}
+    for team in teams:
+        result[team] = {
+            **{col: int(counts.at[team, col]) for col in counts.columns},
+            'metrics': {
+                col: {
+                    'previous': _float(prev_means.at[team, col]),
+                    'current': _float(curr_means.at[team, col]),
+                    'delta': _float(deltas.at[team, col])
+                }
+                for col in mean_cols
+            }
+        }
+    return result
+
+
+@lru_cache(maxsize=DIFF_CACHE_SIZE)
+def diff_snapshots(base_id, target_id):
+    """
+    Compare two snapshots agent by agent.
+
+    Both sides are aligned on normalized Name in one outer join; every metric
+    delta is a single column subtraction. Agents only in the target are 'new',
+    agents only in the base are 'departed'.
+
+    Returns:
+    dict: {'base', 'target', 'summary', 'agents', 'teams'}
+    """
+    base_entry = find_snapshot(base_id)
+    target_entry = find_snapshot(target_id)
+    if base_entry is None or target_entry is None:
+        raise KeyError(f"Snapshot not found: {base_id if base_entry is None else target_id}")
+
+    merged = _load_side(base_id).merge(
+        _load_side(target_id), on='Name', how='outer', suffixes=('_prev', '_curr'), indicator=True
+    )
+    merged['status'] = merged['_merge'].map({
+        'left_only': 'departed', 'right_only': 'new', 'both': 'continuing'
+    }).astype(str)
+
+    metrics = [col for col in DIFF_METRICS
+               if merged[f'{col}_prev'].notna().any() or merged[f'{col}_curr'].notna().any()]
+    prev_values = merged[[f'{col}_prev' for col in metrics]].to_numpy(dtype=float, na_value=np.nan)
+    curr_values = merged[[f'{col}_curr' for col in metrics]].to_numpy(dtype=float, na_value=np.nan)
+    deltas = curr_values - prev_values
+
+    teams = merged['Team_curr'].fillna(merged['Team_prev']).tolist()
+    names = merged['Name'].tolist()
+    statuses = merged['status'].tolist()
+
+    agents = []
+    for i in range(len(merged)):
+        agents.append({
+            'name': names[i],
+            'team': teams[i],
+            'status': statuses[i],
+            'metrics': {
+                col: {
+                    'previous': _float(prev_values[i, j]),
+                    'current': _float(curr_values[i, j]),
+                    'delta': _float(deltas[i, j])
+                }
+                for j, col in enumerate(metrics)
+            }
+        })
+
+    status_counts = merged['status'].value_counts()
+    return {
+        'base': base_entry,
+        'target': target_entry,
+        'summary': {
+            'continuing': int(status_counts.get('continuing', 0)),
+            'new': int(status_counts.get('new', 0)),
+            'departed': int(status_counts.get('departed', 0)),
+            'metrics': metrics
+        },
+        'agents': agents,
+        'teams': _team_deltas(merged, metrics)
+    }
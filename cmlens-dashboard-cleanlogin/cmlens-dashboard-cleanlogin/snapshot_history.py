@@ -0,0 +1,267 @@
+import os
+import re
+import json
+import fcntl
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from script import normalize_name, coalesce_duplicate_columns
+
+# Weekly history of processed datasets, one immutable Parquet file per snapshot:
+#   HISTORY_FOLDER/week=2025-W38/2025-W38_20250917T122300.parquet
+#   HISTORY_FOLDER/catalog.json
+HISTORY_FOLDER = os.environ.get('CMLENS_HISTORY_DIR', os.path.join(tempfile.gettempdir(), 'history'))
+CATALOG_FILE = os.path.join(HISTORY_FOLDER, 'catalog.json')
+CATALOG_LOCK_FILE = os.path.join(HISTORY_FOLDER, 'catalog.lock')
+
+# Columns stored as nested lists rather than scalars
+LIST_COLUMNS = ['Unrecovered_Students', 'Anomalies']
+
+# Week labels and dates found in report file and directory names
+ISO_WEEK_PATTERN = re.compile(r'(?<!\d)(\d{4})[-_ ]?W(\d{1,2})(?!\d)', re.IGNORECASE)
+DATE_PATTERN = re.compile(r'(?<!\d)(20\d{2})[-_.]?(\d{2})[-_.]?(\d{2})(?!\d)')
+
+_thread_lock = threading.Lock()
+
+
+def iso_week(date=None):
+    """ISO week label used to partition snapshots, e.g. '2025-W38'"""
+    date = date or datetime.now()
+    year, week, _ = date.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def week_start(week):
+    """Monday of an ISO week label such as '2025-W38' (the inverse of iso_week)"""
+    year, number = week.split('-W')
+    return datetime.fromisocalendar(int(year), int(number), 1)
+
+
+def week_end(week):
+    """Moment an ISO week ends (the next Monday, 00:00): the reference date of that week's reports"""
+    return week_start(week) + timedelta(days=7)
+
+
+def name_reference(name):
+    """
+    (ISO week, reference date) a file or directory name refers to, or None.
+    '2025-W38' or '2025_w38' refer to the end of that week; a date such as
+    '20250917' or '2025-09-17' to the end of that day.
+    """
+    match = ISO_WEEK_PATTERN.search(name)
+    if match and 1 <= int(match.group(2)) <= 53:
+        week = f"{match.group(1)}-W{int(match.group(2)):02d}"
+        try:
+            return week, week_end(week)
+        except ValueError:
+            pass
+    for match in DATE_PATTERN.finditer(name):
+        try:
+            day = datetime(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        except ValueError:
+            continue
+        return iso_week(day), day + timedelta(days=1)
+    return None
+
+
+@contextmanager
+def _catalog_lock():
+    """Serialize catalog updates across threads and processes (e.g. backfill workers)"""
+    os.makedirs(HISTORY_FOLDER, exist_ok=True)
+    with _thread_lock:
+        with open(CATALOG_LOCK_FILE, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load_catalog():
+    """Return the snapshot catalog, oldest first"""
+    if not os.path.exists(CATALOG_FILE):
+        return []
+    with open(CATALOG_FILE, 'r') as f:
+        return json.load(f).get('snapshots', [])
+
+
+def _write_catalog(snapshots):
+    tmp_path = f"{CATALOG_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'snapshots': snapshots}, f, indent=2)
+    os.replace(tmp_path, CATALOG_FILE)
+
+
+def prepare_frame(df):
+    """Give every column a single Parquet type (object columns become strings)"""
+    frame = coalesce_duplicate_columns(df).reset_index(drop=True).copy()
+    for col in frame.columns:
+        if col in LIST_COLUMNS:
+            frame[col] = frame[col].map(lambda v: v if isinstance(v, list) else [])
+        elif frame[col].dtype == object:
+            frame[col] = frame[col].astype('string')
+    return frame
+
+
+def restore_frame(table):
+    """Back to pipeline conventions: list columns come out of pyarrow as arrays"""
+    frame = table.to_pandas()
+    for col in LIST_COLUMNS:
+        if col in frame.columns:
+            frame[col] = frame[col].map(lambda v: list(v) if v is not None else [])
+    return frame
+
+
+def write_snapshot(df, week=None, source_files=None, created_at=None):
+    """
+    Persist one processed dataset as an immutable Parquet snapshot and register it
+    in the catalog.
+
+    Parameters:
+    df (pandas.DataFrame): Result of flexible_etl_pipeline
+    week (str, optional): ISO week label; defaults to the week of created_at
+    source_files (list, optional): Source report slots/files that produced the dataset
+    created_at (datetime, optional): Snapshot timestamp; defaults to now
+
+    Returns:
+    dict: Catalog entry of the new snapshot
+    """
+    created_at = created_at or datetime.now()
+    week = week or iso_week(created_at)
+    snapshot_id = f"{week}_{created_at.strftime('%Y%m%dT%H%M%S%f')}"
+    relative_path = os.path.join(f"week={week}", f"{snapshot_id}.parquet")
+    path = os.path.join(HISTORY_FOLDER, relative_path)
+
+    frame = prepare_frame(df)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        raise FileExistsError(f"Snapshot already exists: {path}")
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    frame.to_parquet(tmp_path, engine='pyarrow', index=False)
+    os.replace(tmp_path, path)
+
+    entry = {
+        'snapshot_id': snapshot_id,
+        'week': week,
+        'created_at': created_at.isoformat(),
+        'path': relative_path,
+        'rows': len(frame),
+        'columns': list(frame.columns),
+        'source_files': list(source_files or [])
+    }
+
+    with _catalog_lock():
+        snapshots = load_catalog()
+        snapshots.append(entry)
+        snapshots.sort(key=lambda s: (s['week'], s['created_at']))
+        _write_catalog(snapshots)
+
+    print(f"[HISTORY] Wrote snapshot {snapshot_id} ({len(frame)} agents) to {path}")
+    return entry
+
+
+def rebuild_catalog():
+    """Recreate the catalog by scanning the snapshot files (e.g. after a manual cleanup)"""
+    snapshots = []
+    if os.path.isdir(HISTORY_FOLDER):
+        for partition in sorted(os.listdir(HISTORY_FOLDER)):
+            if not partition.startswith('week='):
+                continue
+            week = partition.split('=', 1)[1]
+            for filename in sorted(os.listdir(os.path.join(HISTORY_FOLDER, partition))):
+                if not filename.endswith('.parquet'):
+                    continue
+                relative_path = os.path.join(partition, filename)
+                metadata = pq.read_metadata(os.path.join(HISTORY_FOLDER, relative_path))
+                stamp = filename[len(week) + 1:-len('.parquet')]
+                snapshots.append({
+                    'snapshot_id': filename[:-len('.parquet')],
+                    'week': week,
+                    'created_at': datetime.strptime(stamp, '%Y%m%dT%H%M%S%f').isoformat(),
+                    'path': relative_path,
+                    'rows': metadata.num_rows,
+                    'columns': metadata.schema.to_arrow_schema().names,
+                    'source_files': []
+                })
+
+    snapshots.sort(key=lambda s: (s['week'], s['created_at']))
+    with _catalog_lock():
+        _write_catalog(snapshots)
+    return snapshots
+
+
+def find_snapshot(snapshot_id=None, week=None):
+    """Catalog entry by id, the latest of a week, or the latest overall"""
+    snapshots = load_catalog()
+    if snapshot_id:
+        return next((s for s in snapshots if s['snapshot_id'] == snapshot_id), None)
+    if week:
+        snapshots = [s for s in snapshots if s['week'] == week]
+    return snapshots[-1] if snapshots else None
+
+
+def latest_per_week(last_n=None):
+    """Latest snapshot of each week, oldest first, optionally only the last N weeks"""
+    by_week = {}
+    for entry in load_catalog():
+        by_week[entry['week']] = entry
+    snapshots = [by_week[week] for week in sorted(by_week)]
+    return snapshots[-last_n:] if last_n else snapshots
+
+
+def load_snapshot(snapshot_id=None, week=None, columns=None):
+    """
+    Load one snapshot, reading only its file and (optionally) only some columns.
+    Returns None when no matching snapshot exists.
+    """
+    entry = find_snapshot(snapshot_id, week)
+    if entry is None:
+        return None
+    path = os.path.join(HISTORY_FOLDER, entry['path'])
+    if columns:
+        columns = [col for col in columns if col in entry['columns']]
+    return restore_frame(pq.read_table(path, columns=columns, memory_map=True))
+
+
+def load_agent_history(agent_id, columns=None, last_n=None, snapshots=None):
+    """
+    Load one agent's rows across the weekly snapshots (or an explicit list of
+    catalog entries).
+
+    Only the snapshot files of the selected weeks are opened, only the requested
+    columns are read, and the Name filter is pushed down to the Parquet reader.
+    """
+    if snapshots is None:
+        snapshots = latest_per_week(last_n)
+    if not snapshots:
+        return pd.DataFrame()
+
+    read_columns = None
+    if columns:
+        read_columns = ['Name'] + [col for col in columns if col != 'Name']
+
+    frames = []
+    for entry in snapshots:
+        path = os.path.join(HISTORY_FOLDER, entry['path'])
+        available = [col for col in read_columns if col in entry['columns']] if read_columns else None
+        table = ds.dataset(path, format='parquet').to_table(
+            columns=available,
+            filter=ds.field('Name') == normalize_name(agent_id)
+        )
+        if table.num_rows == 0:
+            continue
+        frame = restore_frame(table)
+        frame.insert(0, 'week', entry['week'])
+        frame.insert(0, 'snapshot_id', entry['snapshot_id'])
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,163 @@
+import re
+
+import pandas as pd
+
+from report_readers import read_report_rows
+
+# Declarative layout specs for each report export, newest version first.
+#
+# Detection reads only the first rows of a file and picks the first spec whose
+# signature patterns (regexes) all match a header in its
+# header_row; the spec marked 'default' is used when nothing matches.
+#
+# Column references are header labels or positions (ints, resolved when the
+# step runs). Steps are applied by script.apply_layout in this order:
+#   header_row / drop_leading_columns / skip_rows_after_header
+#   rename_positions {pos: name}, drop_columns [regex]
+#   rename_patterns [[regex, name]] (first matching column), ffill [refs]
+#   filters [{'columns': [refs], 'op': ..., 'value': ...}]  (rows failing are removed)
+#   keep [refs], rename {label: name}, numeric [labels]
+#   transform: name of a source-specific step run on the laid-out frame
+SOURCE_LAYOUTS = {
+    'cc': [
+        {
+            'version': 'cc-v1',
+            'default': True,
+            'signature': [r'^Name$', r'^>=12$'],
+            'header_row': 4,
+            'rename_positions': {1: 'Subgroup'},
+            'ffill': [0, 'Subgroup'],
+            'drop_columns': [r'^#$'],
+            'filters': [
+                {'columns': ['Name'], 'op': 'not_contains', 'value': 'total'},
+                {'columns': ['Name'], 'op': 'not_in', 'value': ['Name', 'NAME', 'name', 'Agent Name', 'CM Name', 'Last CM Name']},
+                {'columns': [0, 1, 2], 'op': 'not_contains', 'value': 'total'},
+                {'columns': ['Name'], 'op': 'not_blank'},
+                {'columns': [0], 'op': 'not_matches', 'value': r'^\d+$'},
+                {'columns': [0], 'op': 'not_blank'}
+            ],
+            'keep': [0, 'Subgroup', 'Name', 'M1-M4 Super_class_consumption', '>=12'],
+            'rename': {'M1-M4 Super_class_consumption': 'SC%', '>=12': 'CC%'},
+            'numeric': ['CC%', 'SC%']
+        }
+    ],
+    'up': [
+        {
+            'version': 'up-v1',
+            'default': True,
+            'signature': [r'Last CM Name'],
+            'header_row': 0,
+            'skip_rows_after_header': 2,
+            'drop_columns': [r'workplace'],
+            'rename_patterns': [
+                [r'Last CM Name', 'Name'],
+                [r'Last CM Team', 'Subgroup'],
+                [r'M-2累积升舱率|M-2 Cumulative Upgrade Rate', 'UP%']
+            ],
+            'filters': [
+                {'columns': ['Name'], 'op': 'not_in', 'value': ['Sub Total', '-', 'NAME', 'Name', 'Last CM Name', 'CM Name', 'Agent Name']},
+                {'columns': ['Name'], 'op': 'not_null'},
+                {'columns': ['Name'], 'op': 'not_matches', 'value': r'^(total|sum|average|mean|header|column)'}
+            ],
+            'keep': ['Name', 'Subgroup', 'UP%'],
+            'numeric': ['UP%']
+        }
+    ],
+    're': [
+        {
+            'version': 're-v1',
+            'default': True,
+            'signature': [r'(?i)cm\s*name'],
+            'header_row': 2,
+            'drop_leading_columns': 1,
+            'ffill': [0],
+            'transform': 're_metrics'
+        }
+    ],
+    'fixed': [
+        {
+            'version': 'fixed-lp',
+            'signature': [r'^LP$', r'^Fixed or Not$'],
+            'header_row': 0,
+            'transform': 'fixed_lp'
+        },
+        {
+            'version': 'fixed-legacy',
+            'default': True,
+            'signature': [r'^(Name|Agent)$', r'(?i)fixed|rate'],
+            'header_row': 0,
+            'transform': 'fixed_legacy'
+        }
+    ],
+    'all_leads': [
+        {
+            'version': 'all-leads-v1',
+            'default': True,
+            'signature': [r'(?i)lp.*(employee|assigned)|agent.*name'],
+            'header_row': 0,
+            'transform': 'all_leads'
+        }
+    ]
+}
+
+
+def register_layout(source, spec):
+    """Add a new export version for a source; it is tried before the existing ones"""
+    if 'version' not in spec or 'header_row' not in spec:
+        raise ValueError("Layout spec needs at least 'version' and 'header_row'")
+    layouts = SOURCE_LAYOUTS.setdefault(source, [])
+    layouts[:] = [existing for existing in layouts if existing['version'] != spec['version']]
+    layouts.insert(0, spec)
+    return spec
+
+
+def scan_rows(source):
+    """Number of leading rows detection needs to read for a source"""
+    return max(spec['header_row'] for spec in SOURCE_LAYOUTS[source]) + 1
+
+
+def header_labels(raw, spec):
+    """Header labels of a raw (header=None) frame under a spec"""
+    row = raw.iloc[spec['header_row'], spec.get('drop_leading_columns', 0):]
+    return ['' if pd.isna(label) else str(label) for label in row]
+
+
+def matches_signature(labels, spec):
+    return all(
+        any(re.search(pattern, label) for label in labels)
+        for pattern in spec.get('signature', [])
+    )
+
+
+def detect_layout(source, file_path=None, raw=None):
+    """
+    Pick the layout spec for a report from its first rows.
+
+    Parameters:
+    source (str): cc, up, re, fixed or all_leads
+    file_path (str, optional): Report file; only the first scan_rows(source) rows are read
+    raw (pandas.DataFrame, optional): Already loaded header=None frame to inspect instead
+
+    Returns:
+    dict: The matching spec, or the source's default spec
+    """
+    if source not in SOURCE_LAYOUTS:
+        raise ValueError(f"Unknown report source '{source}'. Expected one of: {sorted(SOURCE_LAYOUTS)}")
+
+    nrows = scan_rows(source)
+    head = raw.head(nrows) if raw is not None else read_report_rows(file_path, nrows=nrows)
+
+    default = None
+    for spec in SOURCE_LAYOUTS[source]:
+        if spec.get('default'):
+            default = spec
+        if len(head) <= spec['header_row']:
+            continue
+        if spec.get('signature') and matches_signature(header_labels(head, spec), spec):
+            print(f"[LAYOUT] {source.upper()} matched layout '{spec['version']}'")
+            return spec
+
+    if default is None:
+        raise ValueError(f"No {source.upper()} layout matches this file")
+    print(f"[LAYOUT] {source.upper()} using default layout '{default['version']}'")
+    return default
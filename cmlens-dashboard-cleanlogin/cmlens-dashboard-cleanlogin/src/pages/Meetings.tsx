@@ -299,21 +299,25 @@ const Meetings: React.FC = () => {
     { value: '4', label: 'Week 4' }
   ];
 
-  // Load meeting notes for specific agent (localStorage based)
-  const loadMeetingNotes = async (agentId: string): Promise<string> => {
-    try {
-      // For now, return empty string - could implement localStorage-based notes storage
-      return localStorage.getItem(`meeting_notes_${agentId}_${selectedWeek}`) || '';
-    } catch (error) {
-      console.error('Error loading meeting notes:', error);
-      return '';
+  // Store meeting notes for one agent and the selected week in the notes API
+  const storeMeetingNotes = async (agentId: string, content: string) => {
+    const response = await fetch(
+      `${API_BASE_URL}/api/meeting-notes/${encodeURIComponent(agentId)}/${selectedWeek}`,
+      {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ content })
+      }
+    );
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}`);
     }
   };
 
-  // Save meeting notes (localStorage based)
+  // Save meeting notes for one agent and week
   const saveMeetingNotes = async (agentId: string, content: string) => {
     try {
-      localStorage.setItem(`meeting_notes_${agentId}_${selectedWeek}`, content);
+      await storeMeetingNotes(agentId, content);
       setMeetingNotes(prev => ({ ...prev, [agentId]: content }));
       toast({
         title: "Success",
@@ -340,6 +344,7 @@ const Meetings: React.FC = () => {
         },
         body: JSON.stringify({
           type: 'meeting',
+          agent_id: agent.id,
           agent_data: agent
         })
       });
@@ -351,15 +356,23 @@ const Meetings: React.FC = () => {
           ...prev,
           [agent.id]: result.analysis
         }));
-        
-        // Also save to localStorage
-        localStorage.setItem(`meeting_notes_${agent.id}_${selectedWeek}`, result.analysis);
-        
-        toast({
-          title: "AI Insights Generated",
-          description: "Meeting preparation notes are ready",
-          variant: "default"
-        });
+
+        // Keep the generated notes for this week, so they are still there after a reload
+        try {
+          await storeMeetingNotes(agent.id, result.analysis);
+          toast({
+            title: "AI Insights Generated",
+            description: "Meeting preparation notes are ready and saved",
+            variant: "default"
+          });
+        } catch (saveError) {
+          console.error('Error saving generated meeting notes:', saveError);
+          toast({
+            title: "AI Insights Generated",
+            description: "Notes are ready but could not be saved",
+            variant: "destructive"
+          });
+        }
       } else {
         toast({
           title: "Error",
@@ -379,22 +392,30 @@ const Meetings: React.FC = () => {
     }
   };
 
-  // Load all meeting notes when agents list or week changes
+  // Load the week's meeting notes for every listed agent in one request
   useEffect(() => {
     const loadNotes = async () => {
-      const agentIds = processedTeamData.agents.map(a => a.id);
-      const notesPromises = agentIds.map(async (id) => {
-        const notes = await loadMeetingNotes(id);
-        return { id, notes };
-      });
-
-      const allNotes = await Promise.all(notesPromises);
-      const notesMap: Record<string, string> = {};
-      allNotes.forEach(({ id, notes }) => {
-        if (notes) notesMap[id] = notes;
-      });
-
-      setMeetingNotes(prev => ({ ...prev, ...notesMap }));
+      try {
+        const agentIds = processedTeamData.agents.map(a => a.id);
+        const params = new URLSearchParams({
+          type: 'meeting',
+          week: selectedWeek,
+          agents: agentIds.join(',')
+        });
+        const response = await fetch(`${API_BASE_URL}/api/notes/bulk?${params}`);
+        const result = await response.json();
+        if (!result.success) {
+          throw new Error(result.error);
+        }
+
+        const notesMap: Record<string, string> = {};
+        Object.entries(result.notes as Record<string, { content: string }>).forEach(([id, note]) => {
+          notesMap[id] = note.content || '';
+        });
+        setMeetingNotes(prev => ({ ...prev, ...notesMap }));
+      } catch (error) {
+        console.error('Error loading meeting notes:', error);
+      }
     };
 
     if (processedTeamData.agents.length > 0) {
@@ -141,6 +141,7 @@ const Targets: React.FC = () => {
         },
         body: JSON.stringify({
           type: 'coaching',
+          agent_id: agentData.id,
           agent_data: agentData
         })
       });
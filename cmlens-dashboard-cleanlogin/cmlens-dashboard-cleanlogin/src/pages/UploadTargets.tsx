@@ -76,10 +76,10 @@ const UploadTargets = () => {
   };
 
   const handleFileUpload = (key: string, file: File) => {
-    if (!file.name.match(/\.(xlsx|xls)$/i)) {
+    if (!file.name.match(/\.(xlsx|xls|csv|parquet)$/i)) {
       toast({
         title: "Invalid file type",
-        description: "Please upload XLSX or XLS files only",
+        description: "Please upload XLSX, XLS, CSV or Parquet files only",
         variant: "destructive",
       });
       return;
@@ -261,7 +261,7 @@ const UploadTargets = () => {
                       onClick={() => {
                         const input = document.createElement('input');
                         input.type = 'file';
-                        input.accept = '.xlsx,.xls';
+                        input.accept = '.xlsx,.xls,.csv,.parquet';
                         input.setAttribute('data-key', key);
                         input.style.display = 'none';
                         document.body.appendChild(input);
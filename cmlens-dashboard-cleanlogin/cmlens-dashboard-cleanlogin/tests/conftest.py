@@ -0,0 +1,161 @@
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# Every on-disk store of the app lives in one throwaway folder, and the AI
+# pre-generation worker stays off; module-level settings read these at import
+STATE_DIR = tempfile.mkdtemp(prefix='cmlens-tests-')
+os.environ['CMLENS_DATASET_DIR'] = os.path.join(STATE_DIR, 'dataset')
+os.environ['CMLENS_HISTORY_DIR'] = os.path.join(STATE_DIR, 'history')
+os.environ['CMLENS_SIDECAR_DIR'] = os.path.join(STATE_DIR, 'sidecars')
+os.environ['CMLENS_NOTES_DB_PATH'] = os.path.join(STATE_DIR, 'notes.sqlite3')
+os.environ['CMLENS_AI_CACHE_PATH'] = os.path.join(STATE_DIR, 'ai_cache.sqlite3')
+os.environ['CMLENS_AI_PREGENERATE'] = '0'
+os.environ.pop('CMLENS_INBOX_DIR', None)
+os.environ.pop('OPENROUTER_API_KEY', None)
+
+TEAMS = ['ME-EG-Team A', 'ME-EG-Team B', 'ME-EG-Team C']
+
+
+def make_reports(folder, agents=12, seed=0):
+    """
+    Write the five report workbooks in their current export layouts and return
+    (paths, expected), expected holding the pipeline's values per agent name.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok=True)
+    names = [f"EGLP-agent{i:03d}" for i in range(agents)]
+    expected = {name.upper(): {'Team': TEAMS[i % 3], 'Group': f"ME-EG-G{i % 6}"} for i, name in enumerate(names)}
+
+    # CC: four banner rows, header on row 4, a Total row at the end
+    rows = [['x'] * 6] * 4 + [['Team', 'Subgroup', '#', 'Name', 'M1-M4 Super_class_consumption', '>=12']]
+    for i, name in enumerate(names):
+        sc, cc = rng.uniform(0.1, 0.6), rng.uniform(0.3, 0.95)
+        rows.append([TEAMS[i % 3], f"ME-EG-G{i % 6}", i, name.lower() if i % 2 else name, sc, cc])
+        expected[name.upper()].update(SC_Pct=sc * 100, CC_Pct=cc * 100)
+    rows.append(['Total', '', '', 'Total', 0.3, 0.5])
+    pd.DataFrame(rows).to_excel(os.path.join(folder, 'cc.xlsx'), index=False, header=False)
+
+    # UP: header, two sub-header rows, a Sub Total row
+    rows = [['Last CM Name', 'Last CM Team', 'CM workplace', 'M-2 Cumulative Upgrade Rate'], ['a'] * 4, ['a'] * 4]
+    for i, name in enumerate(names):
+        up = rng.uniform(0.02, 0.3)
+        rows.append([name, f"ME-EG-G{i % 6}", 'Cairo', up])
+        expected[name.upper()]['UP_Pct'] = up * 100
+    rows.append(['Sub Total', '', '', 0.1])
+    pd.DataFrame(rows).to_excel(os.path.join(folder, 'up.xlsx'), index=False, header=False)
+
+    # RE: two banner rows, an index column before the header
+    rows = [['u'] * 7, ['z'] * 7, ['idx', 'Team', 'CM Name', 'leads', 'Show up', 'Paid', 'Leads Ach%']]
+    for i, name in enumerate(names):
+        leads = int(rng.integers(1, 20))
+        showups = int(rng.integers(0, leads + 1))
+        paid = int(rng.integers(0, showups + 1))
+        ach = rng.uniform(0, 1.5)
+        rows.append([i, f"ME-EG-G{i % 6}", name, leads, showups, paid, ach])
+        expected[name.upper()].update(Referral_Leads=leads, Referral_Showups=showups,
+                                      Referral_Paid=paid, Referral_Ach_Pct=ach * 100)
+    pd.DataFrame(rows).to_excel(os.path.join(folder, 're.xlsx'), index=False, header=False)
+
+    # Fixed: one row per student
+    rows = []
+    for i, name in enumerate(names):
+        flags = (rng.random(int(rng.integers(5, 30))) < 0.7).astype(int)
+        rows.extend([name, int(flag), TEAMS[i % 3]] for flag in flags)
+        expected[name.upper()].update(Students=len(flags), Fixed_Pct=round(flags.sum() / len(flags) * 100, 2))
+    pd.DataFrame(rows, columns=['LP', 'Fixed or Not', 'LP Group']).to_excel(
+        os.path.join(folder, 'fixed.xlsx'), index=False)
+
+    # All Leads: notes either 2 days old (recovered), 30 days old or missing (unrecovered)
+    rows = []
+    now = datetime.now()
+    for i, name in enumerate(names):
+        recovered = 0
+        count = int(rng.integers(1, 15))
+        for k in range(count):
+            age = rng.choice([2, 30, -1])
+            note = None if age < 0 else (now - timedelta(days=int(age))).strftime('%Y-%m-%d %H:%M:%S')
+            recovered += age == 2
+            rows.append([f"S{i}-{k}", name, note])
+        expected[name.upper()].update(Total_Leads=count, Recovered_Leads=recovered,
+                                      Unrecovered_Leads=count - recovered)
+    pd.DataFrame(rows, columns=['Student ID', 'The last (current) name of the LP employee assigned',
+                                'LP last note time']).to_excel(os.path.join(folder, 'all_leads.xlsx'), index=False)
+
+    paths = {f"{source}_file": os.path.join(folder, f"{source}.xlsx")
+             for source in ['cc', 'up', 're', 'fixed', 'all_leads']}
+    return paths, expected
+
+
+@pytest.fixture(scope='session')
+def reports(tmp_path_factory):
+    return make_reports(str(tmp_path_factory.mktemp('reports')))
+
+
+@pytest.fixture
+def history_dir(tmp_path, monkeypatch):
+    """An empty snapshot history for one test"""
+    import snapshot_history
+    folder = str(tmp_path / 'history')
+    monkeypatch.setattr(snapshot_history, 'HISTORY_FOLDER', folder)
+    monkeypatch.setattr(snapshot_history, 'CATALOG_FILE', os.path.join(folder, 'catalog.json'))
+    monkeypatch.setattr(snapshot_history, 'CATALOG_LOCK_FILE', os.path.join(folder, 'catalog.lock'))
+    return folder
+
+
+def agent_frame():
+    """A small merged ETL result: six agents in two teams, one without Fixed/UP data"""
+    return pd.DataFrame({
+        'Name': ['ALPHA', 'BRAVO', 'CHARLIE', 'DELTA', 'ECHO', 'FOXTROT'],
+        'Team': ['Team A', 'Team A', 'Team A', 'Team B', 'Team B', 'Team B'],
+        'Group': ['G1', 'G1', 'G2', 'G3', 'G3', 'G4'],
+        'Students': [10, 12, 8, 20, 15, 9],
+        'Fixed_Pct': [90.0, 65.0, 40.0, 75.0, np.nan, 55.0],
+        'CC_Pct': [80.0, 55.0, 30.0, 70.0, 62.0, 45.0],
+        'SC_Pct': [50.0, 25.0, 10.0, 35.0, 31.0, 20.0],
+        'UP_Pct': [25.0, 12.0, 5.0, 18.0, np.nan, 10.0]
+    })
+
+
+@pytest.fixture
+def dataset():
+    from dataset_store import publish_dataset
+    return publish_dataset(agent_frame(), persist=False)
+
+
+@pytest.fixture
+def client(dataset):
+    import web_backend
+    return web_backend.app.test_client()
+
+
+@pytest.fixture(params=['flask', 'asgi'])
+def app_client(request, dataset):
+    """Client for the Flask app, and for asgi_app (what uvicorn serves) with its native routes"""
+    if request.param == 'flask':
+        import web_backend
+        return web_backend.app.test_client()
+    import asgi_app
+    from starlette.testclient import TestClient
+    return TestClient(asgi_app.app)
+
+
+@pytest.fixture
+def standin(monkeypatch):
+    """Base URL of a running OpenRouter stand-in whose behaviour a test may change"""
+    from werkzeug.serving import make_server
+    import openrouter_standin
+    monkeypatch.setattr(openrouter_standin, 'behaviour', dict(openrouter_standin.behaviour))
+    server = make_server('127.0.0.1', 0, openrouter_standin.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/api/v1"
+    server.shutdown()
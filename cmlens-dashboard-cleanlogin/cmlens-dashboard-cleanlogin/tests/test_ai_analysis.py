@@ -0,0 +1,131 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+
+import openrouter_client
+import openrouter_standin
+import web_backend
+from ai_cache import get_ai_cache
+from ai_pregeneration import AIPregenerator
+from openrouter_client import OpenRouterClient
+from web_backend import (AI_PROMPT_VERSION, analysis_cache_key, analysis_prompt, batch_agent_payload,
+                         pregenerate_analyses)
+
+
+@pytest.fixture
+def cache():
+    cache = get_ai_cache()
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+def pregenerate(cache, dataset, analysis_type, agent_id):
+    """Cache entry as the batch endpoint or the pre-generation worker writes it"""
+    agent_data = batch_agent_payload(analysis_type, dataset.get_agent(agent_id))
+    key = analysis_cache_key(analysis_type, agent_data, analysis_prompt(analysis_type))
+    cache.put(key, {'analysis': f"pregenerated {analysis_type}"}, analysis_type, AI_PROMPT_VERSION)
+
+
+def response_json(response):
+    """JSON body of a Flask or a Starlette test response"""
+    return response.get_json() if hasattr(response, 'get_json') else response.json()
+
+
+@pytest.mark.parametrize('analysis_type', ['coaching', 'meeting'])
+def test_single_request_reuses_the_pregenerated_analysis(app_client, dataset, cache, analysis_type):
+    pregenerate(cache, dataset, analysis_type, 'CHARLIE')
+
+    # The Meetings page scores agents with its own targets, so its payload differs
+    client_payload = {'id': 'CHARLIE', 'name': 'CHARLIE', 'score': 42.0, 'category': 'Watch', 'weaknesses': []}
+    response = app_client.post('/api/ai-analysis', json={
+        'type': analysis_type, 'agent_id': 'charlie', 'agent_data': client_payload
+    })
+    result = response_json(response)
+    assert result['cached'] is True
+    assert result['analysis'] == f"pregenerated {analysis_type}"
+
+    lines = app_client.post('/api/ai-analysis/batch', json={'type': analysis_type, 'agents': ['CHARLIE']})
+    first = json.loads(lines.text.splitlines()[0])
+    assert first['cached'] is True and first['analysis'] == result['analysis']
+
+
+def test_unknown_agent_uses_the_posted_data(app_client, cache):
+    response = app_client.post('/api/ai-analysis', json={
+        'type': 'meeting', 'agent_id': 'NOBODY',
+        'agent_data': {'name': 'NOBODY', 'score': 20.0, 'category': 'Critical', 'weaknesses': ['Late']}
+    })
+    result = response_json(response)
+    assert result['success'] and result['source'] == 'fallback'
+    assert 'Priority agent' in result['analysis']
+
+
+def test_pages_open_on_the_background_analyses(app_client, dataset, cache, standin, monkeypatch):
+    monkeypatch.setattr(openrouter_client, '_client', OpenRouterClient(api_key='dev', base_url=standin))
+    worker = AIPregenerator(pregenerate_analyses, calls_per_minute=0).start()
+    try:
+        queued = worker.submit(dataset)
+        deadline = time.monotonic() + 10
+        while worker.status()['packs_done'] < worker.status()['queued_packs'] and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        worker.stop(timeout=5)
+    assert queued and worker.status()['errors'] == 0
+
+    model_calls = openrouter_standin.stats['requests']
+    for record in dataset.records():
+        if record['Category'] not in ('Critical', 'Watch'):
+            continue
+        for analysis_type in ('coaching', 'meeting'):
+            response = app_client.post('/api/ai-analysis', json={
+                'type': analysis_type, 'agent_id': record['Name'], 'agent_data': {'name': record['Name']}
+            })
+            result = response_json(response)
+            assert result['cached'] is True
+            assert result['analysis'].startswith('[stand-in]')
+    assert openrouter_standin.stats['requests'] == model_calls
+
+
+@pytest.mark.parametrize('agents', ['CHARLIE', {'CHARLIE': 1}, ['CHARLIE', 7], [{'team': 'Team A'}]],
+                         ids=['string', 'object', 'number', 'object_without_id'])
+def test_batch_rejects_agents_that_are_not_a_list_of_ids(client, dataset, cache, agents):
+    response = client.post('/api/ai-analysis/batch', json={'type': 'coaching', 'agents': agents})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == "agents must be a list of agent ids"
+
+
+def test_batch_accepts_agent_objects(client, dataset, cache):
+    pregenerate(cache, dataset, 'coaching', 'CHARLIE')
+    lines = client.post('/api/ai-analysis/batch', json={'type': 'coaching', 'agents': [{'id': 'CHARLIE'}]})
+    first = json.loads(lines.get_data(as_text=True).splitlines()[0])
+    assert first['agent_id'] == 'CHARLIE' and first['cached'] is True
+
+
+def login_token(secret, **claims):
+    """A login token as the Node server signs it"""
+    def encode(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b'=').decode()
+    signed = f"{encode({'alg': 'HS256', 'typ': 'JWT'})}.{encode(claims)}"
+    signature = hmac.new(secret.encode(), signed.encode(), hashlib.sha256).digest()
+    return f"{signed}.{base64.urlsafe_b64encode(signature).rstrip(b'=').decode()}"
+
+
+@pytest.mark.parametrize('path', ['/api/ai/cache/clear', '/api/column-mappings/invalidate'])
+def test_maintenance_endpoints_need_a_developer_login(client, cache, monkeypatch, path):
+    assert client.post(path).status_code == 403
+
+    monkeypatch.setattr(web_backend, 'JWT_SECRET', 'secret')
+    expired = time.time() - 60
+    responses = {
+        'none': client.post(path),
+        'forged': client.post(path, headers={'Authorization': f"Bearer {login_token('other', role=3)}"}),
+        'expired': client.post(path, headers={'Authorization': f"Bearer {login_token('secret', role=3, exp=expired)}"}),
+        'uploader': client.post(path, headers={'Authorization': f"Bearer {login_token('secret', role=2)}"}),
+        'developer': client.post(path, headers={'Authorization': f"Bearer {login_token('secret', role=3)}"})
+    }
+    assert {name: response.status_code for name, response in responses.items()} == {
+        'none': 401, 'forged': 403, 'expired': 403, 'uploader': 403, 'developer': 200}
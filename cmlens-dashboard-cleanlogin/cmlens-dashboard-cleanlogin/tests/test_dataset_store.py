@@ -0,0 +1,37 @@
+import os
+
+import dataset_store
+from dataset_store import get_dataset, load_dataset_from_disk, publish_dataset
+from conftest import agent_frame
+
+
+def test_persisted_dataset_round_trips(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_store, 'DATASET_FOLDER', str(tmp_path))
+    monkeypatch.setattr(dataset_store, 'DATASET_FILE', str(tmp_path / 'current_dataset.json'))
+
+    published = publish_dataset(agent_frame(), metadata={'processed_files': ['cc']})
+    publish_dataset(agent_frame(), metadata={'processed_files': ['cc', 'up']})
+    files = sorted(os.listdir(tmp_path))
+    assert files[0] == 'current_dataset.json'
+    assert len(files) == 2 and files[1].endswith('.parquet')
+
+    loaded = load_dataset_from_disk()
+    assert loaded is not published
+    assert loaded.records() == published.records()
+    assert loaded.rollups == published.rollups
+    assert loaded.metadata['processed_files'] == ['cc', 'up']
+    assert loaded.team_roster() == published.team_roster()
+
+
+def test_newer_file_is_picked_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_store, 'DATASET_FOLDER', str(tmp_path))
+    monkeypatch.setattr(dataset_store, 'DATASET_FILE', str(tmp_path / 'current_dataset.json'))
+
+    published = publish_dataset(agent_frame())
+    assert get_dataset() is published
+
+    # Another worker process published since: the recorded mtime no longer matches
+    monkeypatch.setattr(dataset_store, '_current_mtime', None)
+    reloaded = get_dataset()
+    assert reloaded is not published
+    assert len(reloaded) == len(published)
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+from dataset_store import publish_dataset
+from insight_rules import weakness_labels
+from scoring import DEFAULT_THRESHOLDS, below_threshold_mask
+from web_backend import (generate_coaching_insights, generate_meeting_insights, get_fallback_analysis,
+                         identify_weaknesses, team_agent_payload)
+
+
+# The per-agent rules insight_rules replaced, as they were in web_backend
+def old_coaching_insights(agent_data):
+    insights = []
+    metrics = agent_data.get('metrics', {})
+    fixed_pct = metrics.get('fixedPct', 0) * 100 if metrics.get('fixedPct') else 0
+    cc_pct = metrics.get('ccPct', 0) * 100 if metrics.get('ccPct') else 0
+    sc_pct = metrics.get('scPct', 0) * 100 if metrics.get('scPct') else 0
+    up_pct = metrics.get('upPct', 0) * 100 if metrics.get('upPct') else 0
+    if fixed_pct < 70:
+        insights.append(f"• Student retention (Fixed%: {fixed_pct:.1f}%) is below target (70%). Focus on improving class engagement and addressing student concerns early.")
+    if cc_pct < 60:
+        insights.append(f"• Class coverage (CC%: {cc_pct:.1f}%) needs improvement. Encourage students to attend at least 12 classes for better outcomes.")
+    if sc_pct < 30:
+        insights.append(f"• Success calls (SC%: {sc_pct:.1f}%) are underperforming. Review call scripts and timing for M1-M4 super class consumption.")
+    if up_pct < 15:
+        insights.append(f"• Upselling (UP%: {up_pct:.1f}%) is below expectations. Focus on identifying upgrade opportunities and improving sales techniques.")
+    if not insights:
+        insights.append("• Performance is meeting targets. Consider advanced coaching for further optimization.")
+    return "\n".join(insights)
+
+
+def old_meeting_insights(agent_data):
+    metrics = agent_data.get('metrics', {})
+    weights = {'fixedPct': 0.3, 'ccPct': 0.25, 'scPct': 0.25, 'upPct': 0.2}
+    score = 0
+    total_weight = 0
+    for metric, weight in weights.items():
+        if metrics.get(metric) is not None:
+            value = metrics[metric] * 100 if metrics[metric] < 1 else metrics[metric]
+            score += value * weight
+            total_weight += weight
+    score = score / total_weight if total_weight > 0 else 0
+    if score < 60:
+        points = ["• Priority agent requiring immediate attention and action plan",
+                  "• Discuss specific challenges and barriers to performance",
+                  "• Set clear improvement targets with timeline"]
+    elif score < 80:
+        points = ["• Agent showing potential but needs focused coaching",
+                  "• Identify 1-2 key areas for improvement"]
+    else:
+        points = ["• Strong performer - discuss growth opportunities",
+                  "• Consider mentoring responsibilities for team"]
+    return "\n".join(points)
+
+
+def old_weaknesses(record):
+    weaknesses = []
+    if record.get('Fixed_Pct') is not None and record['Fixed_Pct'] < 70:
+        weaknesses.append("Student retention below 70%")
+    if record.get('CC_Pct') is not None and record['CC_Pct'] < 60:
+        weaknesses.append("Class coverage needs improvement")
+    if record.get('SC_Pct') is not None and record['SC_Pct'] < 30:
+        weaknesses.append("Success calls below target")
+    if record.get('UP_Pct') is not None and record['UP_Pct'] < 15:
+        weaknesses.append("Upselling rate needs improvement")
+    return weaknesses
+
+
+def random_frame(agents=400, seed=0):
+    """Percentages with two decimals below 100, every metric present"""
+    rng = np.random.default_rng(seed)
+    columns = {column: np.round(rng.uniform(0, 99.99, agents), 2)
+               for column in ('Fixed_Pct', 'CC_Pct', 'SC_Pct', 'UP_Pct')}
+    # Values on the thresholds and the band edges
+    columns['Fixed_Pct'][:3] = [70.0, 69.95, 0.0]
+    columns['CC_Pct'][:3] = [60.0, 59.95, 0.0]
+    return pd.DataFrame({
+        'Name': [f"AGENT{i:03d}" for i in range(agents)],
+        'Team': ['Team A', 'Team B'] * (agents // 2),
+        'Students': 10,
+        **columns
+    })
+
+
+def test_payload_text_matches_the_old_rules():
+    for record in publish_dataset(random_frame(), persist=False).records():
+        payload = team_agent_payload(record)
+        del payload['score']
+        assert generate_coaching_insights(payload) == old_coaching_insights(payload)
+        assert generate_meeting_insights(payload) == old_meeting_insights(payload)
+
+
+def test_precomputed_text_matches_the_old_rules():
+    dataset = publish_dataset(random_frame(seed=1), persist=False)
+    for pos, record in enumerate(dataset.records()):
+        payload = team_agent_payload(record)
+        assert dataset.insights['coaching'][pos] == old_coaching_insights(payload)
+        assert dataset.insights['meeting'][pos] == old_meeting_insights(payload)
+        assert get_fallback_analysis('meeting', payload) == dataset.insights['meeting'][pos]
+
+
+def test_missing_metrics_are_not_flagged():
+    # A missing metric was reported as 0.0% below target
+    payload = {'metrics': {'fixedPct': None, 'ccPct': 0.8, 'scPct': 0.5, 'upPct': 0.2}}
+    assert "Fixed%: 0.0%" in old_coaching_insights(payload)
+    assert generate_coaching_insights(payload).startswith("• Performance is meeting targets")
+
+
+def test_full_marks_are_read_as_100_percent():
+    # calculate_agent_score read a fraction of 1.0 as 1%
+    payload = {'metrics': {'fixedPct': 1.0, 'ccPct': 0.7, 'scPct': 0.7, 'upPct': 0.7}}
+    assert old_meeting_insights(payload).startswith("• Priority agent")
+    assert generate_meeting_insights(payload).startswith("• Agent showing potential")
+
+
+def test_weaknesses_follow_the_thresholds():
+    dataset = publish_dataset(random_frame(seed=2), persist=False)
+    below = below_threshold_mask(dataset.metric_matrix, DEFAULT_THRESHOLDS, dataset.metric_keys)
+    for pos, record in enumerate(dataset.records()):
+        assert identify_weaknesses(record) == old_weaknesses(record)
+        assert len(identify_weaknesses(record)) == int(below[pos].sum())
+
+    thresholds = {**DEFAULT_THRESHOLDS, 'fixedPct': 50}
+    assert weakness_labels([45.0, 80.0, None, 10.0], thresholds) == [
+        "Student retention below 50%", "Upselling rate needs improvement"]
@@ -0,0 +1,29 @@
+import time
+
+import pytest
+
+import openrouter_standin
+from openrouter_client import OpenRouterClient
+
+
+def test_answer_within_the_budget(standin):
+    client = OpenRouterClient(api_key='dev', base_url=standin, budget_seconds=2)
+    result = client.complete('Summarise')
+    assert result['success'] and not result['fallback']
+    assert client.metrics()['counts']['succeeded'] == 1
+
+
+@pytest.mark.parametrize('behaviour', [
+    {'delay': 1.5},
+    # Each read finishes inside the budget, the whole response does not
+    {'delay': 0.35, 'body_delay': 0.35}
+], ids=['slow_headers', 'slow_body'])
+def test_budget_bounds_the_whole_call(standin, behaviour):
+    openrouter_standin.behaviour.update(behaviour)
+    client = OpenRouterClient(api_key='dev', base_url=standin, budget_seconds=0.5)
+
+    started = time.monotonic()
+    result = client.complete('Summarise')
+    assert time.monotonic() - started < 0.65
+    assert result['fallback'] and 'exceeded' in result['error']
+    assert client.metrics()['counts']['timed_out'] == 1
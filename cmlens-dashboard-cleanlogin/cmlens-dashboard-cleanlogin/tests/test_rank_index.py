@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from rank_index import MetricRankIndex, resolve_metric
+
+
+def make_index():
+    return MetricRankIndex({
+        'UP_Pct': np.array([10.0, np.nan, 30.0, 20.0, 30.0]),
+        'Score': np.array([50.0, 60.0, 70.0, 80.0, 90.0])
+    })
+
+
+def test_resolve_metric_accepts_keys_and_columns():
+    assert resolve_metric('upPct') == 'UP_Pct'
+    assert resolve_metric('UP_Pct') == 'UP_Pct'
+    with pytest.raises(ValueError):
+        resolve_metric('bogus')
+
+
+def test_order_skips_missing_values_and_keeps_ties_stable():
+    index = make_index()
+    assert index.top_k('upPct', 10).tolist() == [2, 4, 3, 0]
+    assert index.ranks['UP_Pct'].tolist() == [4, 0, 1, 3, 2]
+    assert index.counts['UP_Pct'] == 4
+    assert index.top_k('upPct', 2, ascending=True).tolist() == [0, 3]
+
+
+def test_percentiles_count_ties_as_half():
+    percentiles = make_index().percentiles['UP_Pct']
+    assert percentiles[0] == pytest.approx(12.5)
+    assert np.isnan(percentiles[1])
+    assert percentiles[2] == percentiles[4] == pytest.approx(75.0)
+
+
+def test_ranks_within_a_filter():
+    index = make_index()
+    mask = np.array([True, True, False, True, False])
+    positions, ranks, total = index.top_k_ranked('score', 2, mask=mask)
+    assert positions.tolist() == [3, 1]
+    assert ranks.tolist() == [1, 2]
+    assert total == 3
+
+    positions, ranks, total = index.top_k_ranked('score', 2, mask=mask, ascending=True)
+    assert positions.tolist() == [0, 1]
+    assert ranks.tolist() == [3, 2]
+
+
+def test_leaderboard_reports_global_and_filter_ranks(client):
+    body = client.get('/api/leaderboard?metric=score&team=Team B&k=2').get_json()
+    assert body['total_in_filter'] == 3
+    assert [agent['filterRank'] for agent in body['agents']] == [1, 2]
+    assert [agent['name'] for agent in body['agents']] == ['DELTA', 'ECHO']
+    assert body['agents'][0]['rank'] == 2
+
+
+@pytest.mark.parametrize('k', ['0', '-1', '-5', 'abc', '1001'])
+def test_leaderboard_rejects_invalid_k(client, k):
+    response = client.get(f'/api/leaderboard?metric=score&k={k}')
+    assert response.status_code == 400
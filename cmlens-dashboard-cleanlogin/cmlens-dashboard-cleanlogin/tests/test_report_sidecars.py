@@ -0,0 +1,120 @@
+import os
+import time
+from datetime import datetime, timedelta, time as clock
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+import report_sidecars
+import script
+from report_sidecars import find_sidecar, prune_sidecars, read_sidecar, wait_for_sidecars, write_sidecar
+from script import flexible_etl_pipeline, use_all_leads_streaming
+
+
+@pytest.fixture
+def sidecar_dir(tmp_path, monkeypatch):
+    folder = tmp_path / 'sidecars'
+    monkeypatch.setattr(report_sidecars, 'SIDECAR_FOLDER', str(folder))
+    return folder
+
+
+def write_workbook(path, rows):
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    workbook.save(path)
+    return str(path)
+
+
+WORKBOOKS = {
+    'header_row': [
+        ['When', 'At', 'Duration', 'Mixed', 'Count', 'Rate', 'Flag', 'Text'],
+        [datetime(2025, 1, 2, 3, 4), clock(9, 30), timedelta(hours=30), clock(8, 0), 1, 1.5, True, 'a'],
+        [datetime(2025, 1, 3), clock(17, 45, 10), timedelta(minutes=5), 'text', 2, 2.0, False, 'N/A'],
+        [datetime(2025, 1, 4), None, None, 3, None, None, None, 'c']
+    ],
+    'single_kinds': [
+        [clock(9, 30), timedelta(hours=1), datetime(2025, 1, 1), 5, 0.5],
+        [clock(10, 0), timedelta(minutes=1), datetime(2025, 1, 2), 6, 1.25]
+    ]
+}
+
+
+@pytest.mark.parametrize('streamed', [False, True], ids=['in_memory', 'streamed'])
+@pytest.mark.parametrize('name', sorted(WORKBOOKS))
+def test_round_trip_matches_read_excel(sidecar_dir, tmp_path, monkeypatch, name, streamed):
+    monkeypatch.setattr(report_sidecars, 'SIDECAR_STREAM_MIN_BYTES', 0 if streamed else 1 << 40)
+    path = write_workbook(tmp_path / f"{name}.xlsx", WORKBOOKS[name])
+
+    decoded = read_sidecar(write_sidecar(path))
+    pd.testing.assert_frame_equal(decoded, pd.read_excel(path, header=None))
+    assert isinstance(decoded.iat[1, 1 if name == 'header_row' else 0], clock)
+
+
+@pytest.mark.parametrize('streamed', [False, True], ids=['in_memory', 'streamed'])
+def test_partial_reads(sidecar_dir, tmp_path, monkeypatch, streamed):
+    monkeypatch.setattr(report_sidecars, 'SIDECAR_STREAM_MIN_BYTES', 0 if streamed else 1 << 40)
+    path = tmp_path / 'book.xlsx'
+    workbook = Workbook()
+    for row in WORKBOOKS['header_row']:
+        workbook.active.append(row)
+    # Formatted but empty cells below the data, as exports often leave behind
+    workbook.active.cell(row=9, column=2).number_format = '0.00'
+    workbook.save(path)
+
+    sidecar = write_sidecar(str(path))
+    expected = pd.read_excel(path, header=None)
+    pd.testing.assert_frame_equal(read_sidecar(sidecar), expected)
+    pd.testing.assert_frame_equal(read_sidecar(sidecar, nrows=2), expected.head(2))
+    pd.testing.assert_frame_equal(read_sidecar(sidecar, columns=[1, 4]),
+                                  pd.read_excel(path, header=None, usecols=[1, 4]))
+
+
+def test_uploads_leave_no_sidecars(sidecar_dir, reports):
+    paths, _ = reports
+    flexible_etl_pipeline(**paths)
+    assert not sidecar_dir.exists() or not os.listdir(sidecar_dir)
+
+
+def test_archived_inputs_get_sidecars_with_the_same_output(sidecar_dir, reports):
+    paths, _ = reports
+    direct = flexible_etl_pipeline(**paths)
+    writing = flexible_etl_pipeline(archived_inputs=True, **paths)
+    assert all(find_sidecar(path) for path in paths.values())
+    reading = flexible_etl_pipeline(**paths)
+
+    for frame in (writing, reading):
+        pd.testing.assert_frame_equal(frame.drop(columns='Unrecovered_Students'),
+                                      direct.drop(columns='Unrecovered_Students'))
+        assert frame['Unrecovered_Students'].tolist() == direct['Unrecovered_Students'].tolist()
+
+
+def test_large_all_leads_streams_until_a_sidecar_exists(sidecar_dir, reports, monkeypatch):
+    paths, _ = reports
+    path = paths['all_leads_file']
+    monkeypatch.setattr(script, 'ALL_LEADS_STREAMING', 'auto')
+    monkeypatch.setattr(script, 'ALL_LEADS_STREAMING_MIN_BYTES', 0)
+    assert use_all_leads_streaming(path)
+
+    # An archived run streams this time and converts the workbook in the background
+    flexible_etl_pipeline(all_leads_file=path, archived_inputs=True)
+    wait_for_sidecars()
+    assert find_sidecar(path) is not None
+    assert not use_all_leads_streaming(path)
+
+
+def test_prune_by_age_then_size(sidecar_dir):
+    sidecar_dir.mkdir()
+    now = time.time()
+    ages = {'old.v2.parquet': 40, 'a.v2.parquet': 3, 'b.v2.parquet': 2, 'c.v2.parquet': 1, 'notes.txt': 100}
+    for name, days in ages.items():
+        path = sidecar_dir / name
+        path.write_bytes(b'x' * 1024 * 1024)
+        os.utime(path, (now - days * 86400, now - days * 86400))
+
+    assert prune_sidecars(max_age_days=30, max_mb=10) == 1
+    assert sorted(os.listdir(sidecar_dir)) == ['a.v2.parquet', 'b.v2.parquet', 'c.v2.parquet', 'notes.txt']
+
+    assert prune_sidecars(max_age_days=30, max_mb=1.5, keep=str(sidecar_dir / 'a.v2.parquet')) == 2
+    assert sorted(os.listdir(sidecar_dir)) == ['a.v2.parquet', 'notes.txt']
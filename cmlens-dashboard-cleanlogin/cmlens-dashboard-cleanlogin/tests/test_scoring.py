@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from scoring import (DEFAULT_WEIGHTS, below_threshold_mask, categorize_scores, metric_matrix,
+                     rank_scores, score_agents, score_matrix)
+from conftest import agent_frame
+from dataset_store import publish_dataset
+
+
+def test_missing_metrics_renormalize_the_weights():
+    matrix = np.array([[80.0, 60.0, 40.0, 20.0],
+                       [np.nan, 60.0, np.nan, 20.0],
+                       [np.nan] * 4])
+    scores = score_matrix(matrix, DEFAULT_WEIGHTS)
+    assert scores[0] == pytest.approx(0.3 * 80 + 0.25 * 60 + 0.25 * 40 + 0.2 * 20)
+    assert scores[1] == pytest.approx((0.25 * 60 + 0.2 * 20) / 0.45)
+    assert scores[2] == 0.0
+
+
+def test_categories_use_lower_bounds():
+    labels = categorize_scores(np.array([0, 49.9, 50, 64.9, 65, 75, 85, 100]))
+    assert labels.tolist() == ['Critical', 'Critical', 'Watch', 'Watch', 'Stable', 'Strong', 'Elite', 'Elite']
+
+
+def test_ranks_count_from_the_top_and_ties_keep_order():
+    assert rank_scores([50, 70, 50, 90]).tolist() == [3, 2, 4, 1]
+
+
+def test_below_threshold_never_flags_missing_values():
+    matrix = metric_matrix(agent_frame())
+    below = below_threshold_mask(matrix, {'fixedPct': 70, 'ccPct': 60, 'scPct': 30, 'upPct': 15})
+    assert below[4].tolist() == [False, False, False, False]
+    assert below[2].tolist() == [True, True, True, True]
+
+
+def test_score_agents_matches_the_matrix_path():
+    frame = agent_frame()
+    scored = score_agents(frame)
+    assert scored['Score'].to_numpy() == pytest.approx(score_matrix(metric_matrix(frame), DEFAULT_WEIGHTS))
+    assert scored['Category'].tolist() == categorize_scores(scored['Score'].to_numpy()).tolist()
+
+
+def test_what_if_rescoring(client):
+    response = client.post('/api/what-if-scoring', json={
+        'weights': {'fixedPct': 0, 'ccPct': 1, 'scPct': 0, 'upPct': 0},
+        'team': 'Team A'
+    })
+    assert response.status_code == 200
+    agents = response.get_json()['data']['agents']
+    assert [agent['name'] for agent in agents] == ['ALPHA', 'BRAVO', 'CHARLIE']
+    assert [agent['score'] for agent in agents] == [80.0, 55.0, 30.0]
+    assert [agent['rank'] for agent in agents] == [1, 2, 3]
+
+
+@pytest.mark.parametrize('body', [
+    {'weights': {'fixedPct': 'nan'}},
+    {'weights': {'fixedPct': 'inf'}},
+    {'weights': {'ccPct': '-inf'}},
+    {'weights': {'upPct': -0.1}},
+    {'weights': {'upPct': True}},
+    {'weights': {'upPct': 'heavy'}},
+    {'weights': {'unknown': 1}},
+    {'weights': {'fixedPct': 0, 'ccPct': 0, 'scPct': 0, 'upPct': 0}},
+    {'thresholds': {'ccPct': 'nan'}},
+    {'categories': {'Watch': 'inf'}},
+    {'categories': {'Watch': 80, 'Stable': 70}},
+    {'categories': {'Strong': 85}},
+    {'score_threshold': 'nan'}
+])
+def test_what_if_rejects_invalid_overrides(client, body):
+    response = client.post('/api/what-if-scoring', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_what_if_without_a_team_column(client):
+    publish_dataset(agent_frame().drop(columns=['Team', 'Group']), persist=False)
+    response = client.post('/api/what-if-scoring', json={'categories': {'Watch': 40}})
+    assert response.status_code == 200
+    agents = response.get_json()['data']['agents']
+    assert len(agents) == 6 and {agent['team'] for agent in agents} == {''}
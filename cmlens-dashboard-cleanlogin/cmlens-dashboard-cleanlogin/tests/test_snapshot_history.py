@@ -0,0 +1,112 @@
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from backfill import process_week
+from conftest import make_reports
+from inbox_watcher import report_reference
+from snapshot_diff import diff_snapshots, previous_snapshot
+from snapshot_history import latest_per_week, load_catalog, week_end, write_snapshot
+
+
+def test_latest_snapshot_per_week(history_dir):
+    first = write_snapshot(pd.DataFrame({'Name': ['A'], 'Score': [50.0]}), week='2025-W30')
+    second = write_snapshot(pd.DataFrame({'Name': ['A'], 'Score': [55.0]}), week='2025-W30')
+    other = write_snapshot(pd.DataFrame({'Name': ['A'], 'Score': [60.0]}), week='2025-W31')
+
+    assert len(load_catalog()) == 3
+    assert [entry['snapshot_id'] for entry in latest_per_week()] == [second['snapshot_id'], other['snapshot_id']]
+    assert previous_snapshot(other)['snapshot_id'] == second['snapshot_id']
+    assert previous_snapshot(first) is None
+
+
+def test_diff_aligns_agents_by_name(history_dir):
+    base = write_snapshot(pd.DataFrame({
+        'Name': ['alpha', 'BRAVO', 'CHARLIE'],
+        'Team': ['Team A', 'Team A', 'Team B'],
+        'CC_Pct': [50.0, 60.0, 70.0],
+        'Students': [10, 20, 30]
+    }), week='2025-W30')
+    target = write_snapshot(pd.DataFrame({
+        'Name': ['ALPHA', 'BRAVO', 'DELTA'],
+        'Team': ['Team A', 'Team A', 'Team B'],
+        'CC_Pct': [55.0, 58.0, 40.0],
+        'Students': [12, 20, 5]
+    }), week='2025-W31')
+
+    diff = diff_snapshots(base['snapshot_id'], target['snapshot_id'])
+    assert diff['summary']['continuing'] == 2
+    assert diff['summary']['new'] == 1
+    assert diff['summary']['departed'] == 1
+
+    agents = {agent['name']: agent for agent in diff['agents']}
+    assert agents['ALPHA']['metrics']['CC_Pct'] == {'previous': 50.0, 'current': 55.0, 'delta': 5.0}
+    assert agents['BRAVO']['metrics']['CC_Pct']['delta'] == -2.0
+    assert agents['CHARLIE']['status'] == 'departed'
+    assert agents['DELTA']['metrics']['CC_Pct']['previous'] is None
+
+    team_a = diff['teams']['Team A']
+    assert team_a['metrics']['CC_Pct'] == {'previous': 55.0, 'current': 56.5, 'delta': 1.5}
+    assert diff['teams']['Team B']['new_agents'] == 1
+    assert diff['teams']['Team B']['departed_agents'] == 1
+
+
+def test_diff_of_unknown_snapshot(history_dir):
+    entry = write_snapshot(pd.DataFrame({'Name': ['A']}), week='2025-W30')
+    with pytest.raises(KeyError):
+        diff_snapshots(entry['snapshot_id'], 'missing')
+
+
+def test_trend_counts_calendar_weeks_across_gaps(history_dir):
+    from agent_trends import agent_trend
+
+    # No snapshots for W32-W34: the score rises one point per calendar week
+    for week, score in [('2025-W30', 50.0), ('2025-W31', 51.0), ('2025-W35', 55.0)]:
+        write_snapshot(pd.DataFrame({'Name': ['ALPHA'], 'Score': [score]}), week=week)
+
+    trend = agent_trend('alpha', window=2)
+    assert trend['weeks'] == ['2025-W30', '2025-W31', '2025-W35']
+    assert trend['metrics']['Score']['slope'] == 1.0
+    # W35's two-week window (W34-W35) holds only its own value
+    assert trend['metrics']['Score']['rolling_mean'] == [50.0, 50.5, 55.0]
+
+
+def test_trend_crosses_the_year_boundary(history_dir):
+    from agent_trends import agent_trend
+
+    for week, score in [('2026-W52', 40.0), ('2026-W53', 42.0), ('2027-W01', 44.0)]:
+        write_snapshot(pd.DataFrame({'Name': ['ALPHA'], 'Score': [score]}), week=week)
+
+    assert agent_trend('ALPHA')['metrics']['Score']['slope'] == 2.0
+
+
+def test_backfill_measures_recovery_at_the_end_of_the_week(tmp_path, history_dir):
+    paths, expected = make_reports(str(tmp_path / '2025-W30'), agents=4)
+    # Notes 3 days before the week closed were recovered then, though long stale today
+    end = week_end('2025-W30')
+    rows = []
+    for i, name in enumerate(sorted(expected)):
+        for k, age in enumerate([3, 3, 20, None][:i + 1]):
+            note = None if age is None else (end - timedelta(days=age)).strftime('%Y-%m-%d %H:%M:%S')
+            rows.append([f"S{i}-{k}", name, note])
+    pd.DataFrame(rows, columns=['Student ID', 'The last (current) name of the LP employee assigned',
+                                'LP last note time']).to_excel(paths['all_leads_file'], index=False)
+
+    result = process_week('2025-W30', {source[:-5]: path for source, path in paths.items()})
+    frame = result['frame'].set_index('Name')
+    assert frame.loc[sorted(expected), 'Recovered_Leads'].tolist() == [1, 2, 2, 2]
+    assert frame.loc[sorted(expected), 'Unrecovered_Leads'].tolist() == [0, 0, 1, 2]
+
+
+def test_inbox_reports_are_dated_by_name_then_export_time(tmp_path):
+    named = tmp_path / 'all_leads_2025-W30.xlsx'
+    plain = tmp_path / 'all_leads.xlsx'
+    for path in (named, plain):
+        path.write_bytes(b'')
+    exported = datetime(2025, 7, 20, 18, 0)
+    os.utime(plain, (exported.timestamp(), exported.timestamp()))
+
+    assert report_reference(str(named)) == ('2025-W30', week_end('2025-W30'))
+    assert report_reference(str(plain)) == (None, exported)
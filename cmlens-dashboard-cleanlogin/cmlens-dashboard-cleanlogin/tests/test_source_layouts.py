@@ -0,0 +1,138 @@
+import os
+
+import pandas as pd
+import pytest
+
+import script
+from script import flexible_etl_pipeline
+from source_layouts import SOURCE_LAYOUTS, detect_layout, register_layout
+
+METRIC_COLUMNS = ['CC_Pct', 'SC_Pct', 'UP_Pct', 'Referral_Leads', 'Referral_Showups', 'Referral_Paid',
+                  'Referral_Ach_Pct', 'Students', 'Fixed_Pct', 'Total_Leads', 'Recovered_Leads', 'Unrecovered_Leads']
+
+
+def run_pipeline(paths):
+    result = flexible_etl_pipeline(**paths)
+    return result.loc[:, ~result.columns.duplicated()].set_index('Name')
+
+
+@pytest.mark.parametrize('source, version', [
+    ('cc', 'cc-v1'), ('up', 'up-v1'), ('re', 're-v1'), ('fixed', 'fixed-lp'), ('all_leads', 'all-leads-v1')
+])
+def test_detects_current_export_layouts(reports, source, version):
+    paths, _ = reports
+    assert detect_layout(source, paths[f"{source}_file"])['version'] == version
+
+
+def test_detects_legacy_fixed_layout(tmp_path):
+    path = tmp_path / 'fixed.xlsx'
+    pd.DataFrame({'Agent': ['eglp-a'], 'Fixed Rate': ['>70'], 'Student Count': [10]}).to_excel(path, index=False)
+    assert detect_layout('fixed', str(path))['version'] == 'fixed-legacy'
+
+
+def test_unmatched_header_falls_back_to_default():
+    raw = pd.DataFrame([['something', 'else']] * 6)
+    assert detect_layout('cc', raw=raw)['version'] == 'cc-v1'
+
+
+def test_unknown_source_is_rejected():
+    with pytest.raises(ValueError):
+        detect_layout('nope', raw=pd.DataFrame())
+
+
+def test_registered_layout_is_tried_first(reports, tmp_path, monkeypatch):
+    monkeypatch.setitem(SOURCE_LAYOUTS, 'cc', list(SOURCE_LAYOUTS['cc']))
+    paths, expected = reports
+
+    # The same CC data with the header moved to row 1 and the metric columns renamed
+    raw = pd.read_excel(paths['cc_file'], header=None).iloc[3:].reset_index(drop=True)
+    raw.iloc[0] = ['Team', 'Subgroup', '#', 'Name', 'Super Class %', 'Attended 12+']
+    raw = pd.concat([pd.DataFrame([['banner'] * 6]), raw], ignore_index=True)
+    new_cc = tmp_path / 'cc_v2.xlsx'
+    raw.to_excel(new_cc, index=False, header=False)
+
+    v1 = SOURCE_LAYOUTS['cc'][0]
+    register_layout('cc', {
+        **v1,
+        'version': 'cc-v2',
+        'default': False,
+        'signature': [r'^Attended 12\+$'],
+        'header_row': 1,
+        'keep': [0, 'Subgroup', 'Name', 'Super Class %', 'Attended 12+'],
+        'rename': {'Super Class %': 'SC%', 'Attended 12+': 'CC%'}
+    })
+    assert detect_layout('cc', str(new_cc))['version'] == 'cc-v2'
+    assert detect_layout('cc', paths['cc_file'])['version'] == 'cc-v1'
+
+    result = run_pipeline({'cc_file': str(new_cc)})
+    for name, values in expected.items():
+        assert result.at[name, 'CC_Pct'] == pytest.approx(values['CC_Pct'])
+        assert result.at[name, 'SC_Pct'] == pytest.approx(values['SC_Pct'])
+
+
+def test_pipeline_extracts_every_report(reports):
+    paths, expected = reports
+    result = run_pipeline(paths)
+
+    assert sorted(result.index) == sorted(expected)
+    for name, values in expected.items():
+        row = result.loc[name]
+        assert row['Team'] == values['Team']
+        for col in METRIC_COLUMNS:
+            assert row[col] == pytest.approx(values[col]), (name, col)
+        assert len(row['Unrecovered_Students']) == values['Unrecovered_Leads']
+
+
+def test_csv_and_parquet_exports_match_excel(reports, tmp_path):
+    paths, _ = reports
+    csv_paths, parquet_paths = {}, {}
+    for key, path in paths.items():
+        stem = os.path.splitext(os.path.basename(path))[0]
+        raw = pd.read_excel(path, header=None)
+        csv_paths[key] = str(tmp_path / f"{stem}.csv")
+        raw.to_csv(csv_paths[key], header=False, index=False)
+        if stem in ('fixed', 'all_leads'):
+            # Single header row exports; Parquet keeps the header as column names
+            parquet_paths[key] = str(tmp_path / f"{stem}.parquet")
+            pd.read_excel(path).to_parquet(parquet_paths[key], index=False)
+        else:
+            parquet_paths[key] = path
+
+    excel = run_pipeline(paths)
+    for other in (run_pipeline(csv_paths), run_pipeline(parquet_paths)):
+        assert sorted(other.index) == sorted(excel.index)
+        pd.testing.assert_frame_equal(other[METRIC_COLUMNS].loc[excel.index], excel[METRIC_COLUMNS],
+                                      check_dtype=False)
+
+
+def test_streaming_all_leads_matches_in_memory(reports, monkeypatch):
+    paths, _ = reports
+    leads_only = {'all_leads_file': paths['all_leads_file']}
+
+    monkeypatch.setattr(script, 'ALL_LEADS_STREAMING', 'never')
+    in_memory = run_pipeline(leads_only)
+    monkeypatch.setattr(script, 'ALL_LEADS_STREAMING', 'always')
+    streamed = run_pipeline(leads_only)
+
+    columns = ['Total_Leads', 'Recovered_Leads', 'Unrecovered_Leads']
+    pd.testing.assert_frame_equal(streamed[columns], in_memory[columns], check_dtype=False)
+    assert streamed['Unrecovered_Students'].tolist() == in_memory['Unrecovered_Students'].tolist()
+
+
+def test_parquet_reads_only_the_requested_columns(tmp_path, monkeypatch):
+    import pyarrow.parquet as pq
+    from report_readers import read_report_rows
+
+    path = str(tmp_path / 'leads.parquet')
+    pd.DataFrame({'a': [1, 2, 3], 'b': ['x', 'y', 'z'], 'c': [1.5, 2.5, 3.5], 'd': [True, False, True]}).to_parquet(path)
+    full = read_report_rows(path)
+
+    read_columns = []
+    original_read = pq.ParquetFile.read
+    monkeypatch.setattr(pq.ParquetFile, 'read', lambda self, columns=None, **kwargs: (
+        read_columns.append(columns), original_read(self, columns=columns, **kwargs))[1])
+
+    projected = read_report_rows(path, columns=[3, 1, 7])
+    assert read_columns == [['b', 'd']]
+    pd.testing.assert_frame_equal(projected, full[[1, 3]])
+    pd.testing.assert_frame_equal(read_report_rows(path, nrows=2, columns=[2]), full[[2]].head(2))
@@ -0,0 +1,144 @@
+import re
+import time
+
+from report_readers import read_report_rows
+from source_layouts import SOURCE_LAYOUTS, header_labels, matches_signature, scan_rows
+
+# Upload form slot -> report source
+SLOT_SOURCES = {
+    'cc_file': 'cc',
+    'up_file': 'up',
+    're_file': 're',
+    'fixed_file': 'fixed',
+    'all_leads_file': 'all_leads'
+}
+
+
+def preview_rows():
+    """Rows read per file: enough to see the header row of every known layout"""
+    return max(scan_rows(source) for source in SOURCE_LAYOUTS)
+
+
+def identify_report(head):
+    """All (source, spec) pairs whose header signature matches the first rows"""
+    matches = []
+    for source, specs in SOURCE_LAYOUTS.items():
+        for spec in specs:
+            if not spec.get('signature') or len(head) <= spec['header_row']:
+                continue
+            if matches_signature(header_labels(head, spec), spec):
+                matches.append((source, spec))
+                break
+    return matches
+
+
+def identify_source(file):
+    """Report source of a file from its header rows, or None if no layout matches"""
+    matches = identify_report(read_report_rows(file, nrows=preview_rows()))
+    if len(matches) > 1:
+        print(f"[VALIDATION] {file} matches several layouts {[source for source, _ in matches]}; using {matches[0][0]}")
+    return matches[0][0] if matches else None
+
+
+def resolve_preview_columns(labels, spec):
+    """
+    Output column -> source header for a layout, using only the header row.
+    Returns (resolved, missing) where missing lists expected output columns not found.
+    """
+    labels = list(labels)
+    resolved = {}
+    for pos, name in spec.get('rename_positions', {}).items():
+        if pos < len(labels):
+            resolved[name] = labels[pos]
+    for pattern, name in spec.get('rename_patterns', []):
+        header = next((label for label in labels if re.search(pattern, label, flags=re.IGNORECASE)), None)
+        if header is not None:
+            resolved[name] = header
+    for col in spec.get('keep', []):
+        if isinstance(col, str) and col not in resolved and col in labels:
+            resolved[spec.get('rename', {}).get(col, col)] = col
+
+    expected = [spec.get('rename', {}).get(col, col) for col in spec.get('keep', []) if isinstance(col, str)]
+    missing = [col for col in expected if col not in resolved]
+    return resolved, missing
+
+
+def preview_report(file, slot=None):
+    """
+    Identify one report from its first rows only.
+
+    Parameters:
+    file (str or file-like): Uploaded report (path or stream; xlsx, xls, csv or parquet)
+    slot (str, optional): Form slot it was uploaded into, e.g. 'cc_file'
+
+    Returns:
+    dict: detected source/version, resolved columns, and whether it fits the slot
+    """
+    started = time.perf_counter()
+    expected = SLOT_SOURCES.get(slot)
+    result = {
+        'slot': slot,
+        'expected_source': expected,
+        'detected_source': None,
+        'layout_version': None,
+        'columns': [],
+        'resolved_columns': {},
+        'missing_columns': [],
+        'valid': True,
+        'error': None,
+        'warnings': []
+    }
+
+    try:
+        head = read_report_rows(file, nrows=preview_rows())
+    except Exception as e:
+        result.update(valid=False, error=f"Could not read file: {e}")
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    matches = identify_report(head)
+    matched_sources = [source for source, _ in matches]
+
+    if expected and expected in matched_sources:
+        source, spec = matches[matched_sources.index(expected)]
+    elif matches:
+        source, spec = matches[0]
+    else:
+        source, spec = None, None
+
+    if spec is not None:
+        labels = header_labels(head, spec)
+        resolved, missing = resolve_preview_columns(labels, spec)
+        result.update(
+            detected_source=source,
+            layout_version=spec['version'],
+            columns=labels,
+            resolved_columns=resolved,
+            missing_columns=missing
+        )
+        if missing:
+            result['warnings'].append(f"Expected columns not found: {missing}")
+
+    if expected and source != expected:
+        if source is not None:
+            result.update(valid=False, error=f"This looks like a {source.upper()} report, not a {expected.upper()} report")
+        else:
+            # Unknown layout: let the ETL's default layout try, but say so
+            result['warnings'].append(f"Header does not match any known {expected.upper()} layout")
+
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def validate_uploads(files):
+    """
+    Preview every uploaded report.
+
+    Parameters:
+    files (dict): slot -> path or file-like object
+
+    Returns:
+    (bool, dict): whether all files fit their slots, and slot -> preview result
+    """
+    results = {slot: preview_report(file, slot) for slot, file in files.items()}
+    return all(result['valid'] for result in results.values()), results
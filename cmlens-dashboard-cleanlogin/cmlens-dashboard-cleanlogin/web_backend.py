@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import Flask, request, jsonify, send_from_directory, send_file, Response, stream_with_context
 from flask_cors import CORS
 import os
 import tempfile
@@ -6,12 +6,37 @@ from werkzeug.utils import secure_filename
 import traceback
 import sys
 import pandas as pd
+import numpy as np
 import json
-import requests
+import math
+import re
+import time
+import base64
+import hashlib
+import hmac
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 
 # Import your ETL pipeline
-from script import flexible_etl_pipeline, dataframe_to_json_by_name
+from script import dataframe_to_json_by_name, invalidate_column_mappings
+from rank_index import resolve_metric
+from dataset_store import publish_dataset, get_dataset, load_dataset_from_disk, to_native
+from snapshot_history import write_snapshot, load_catalog, find_snapshot, load_snapshot
+from snapshot_diff import diff_snapshots, previous_snapshot
+from agent_trends import agent_trend, DEFAULT_TREND_WEEKS, DEFAULT_ROLLING_WINDOW
+from anomaly_detection import attach_anomalies
+from inbox_watcher import start_inbox_watcher
+from etl_pool import run_etl, invalidate_worker_mappings
+from upload_validation import validate_uploads
+from openrouter_client import get_openrouter_client
+from ai_cache import get_ai_cache, cache_key
+from notes_store import get_notes_store
+from ai_pregeneration import start_ai_pregenerator
+from prompt_builder import build_prompt, build_packed_prompt
+from insight_rules import coaching_insights, meeting_insights, payload_metric_row, payload_score, weakness_labels
+from scoring import (DEFAULT_WEIGHTS, DEFAULT_THRESHOLDS, DEFAULT_CATEGORY_CUTS, METRIC_COLUMNS,
+                     score_matrix, categorize_scores, rank_scores, below_threshold_mask)
 
 # Configure Flask to serve static files from dist folder in production
 # Be resilient to different working directories by resolving absolute path
@@ -74,26 +99,105 @@ else:
 
 # Configuration
 UPLOAD_FOLDER = os.path.join(tempfile.gettempdir(), 'uploads')  # Use temp directory
-NOTES_FOLDER = os.path.join(tempfile.gettempdir(), 'notes')  # For storing notes
-ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
+NOTES_FOLDER = os.path.join(tempfile.gettempdir(), 'notes')  # Old JSON notes, imported into the notes store
+ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv', 'parquet'}
+WEEK_PATTERN = re.compile(r'^\d{4}-W\d{2}$')
+# Flag sudden metric drops after each ETL run (set CMLENS_ANOMALY_DETECTION=0 to skip)
+ANOMALY_DETECTION_ENABLED = os.environ.get('CMLENS_ANOMALY_DETECTION', '1') != '0'
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
-# OpenRouter AI configuration
-OPENROUTER_API_KEY = os.environ.get('OPENROUTER_API_KEY')
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
-
-# Create upload and notes directories if they don't exist
+# Create upload directory if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(NOTES_FOLDER, exist_ok=True)
+
+# Restore the last processed dataset so agent/team endpoints work without a re-upload
+try:
+    load_dataset_from_disk()
+except Exception as _e:
+    print(f"[Startup] Could not load persisted dataset: {_e}")
+
+# Login tokens are signed by the Node server (server/routes.ts) with this shared secret
+JWT_SECRET = os.environ.get('JWT_SECRET')
+ADMIN_ROLE = 3  # Developer / Super Admin (RBAC_DOCUMENTATION.md)
+
+def token_claims(token):
+    """Claims of a login token (HS256 JWT) if its signature and expiry check out, else None"""
+    def decode(part):
+        return base64.urlsafe_b64decode(part + '=' * (-len(part) % 4))
+    try:
+        header, payload, signature = token.split('.')
+        if json.loads(decode(header)).get('alg') != 'HS256':
+            return None
+        expected = hmac.new(JWT_SECRET.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, decode(signature)):
+            return None
+        claims = json.loads(decode(payload))
+    except (ValueError, TypeError, AttributeError):
+        return None
+    if not isinstance(claims, dict) or claims.get('exp', float('inf')) < time.time():
+        return None
+    return claims
+
+def require_admin(view):
+    """Restrict a maintenance endpoint to signed-in developers (role 3); off without JWT_SECRET"""
+    @wraps(view)
+    def guarded(*args, **kwargs):
+        if not JWT_SECRET:
+            return jsonify({"success": False, "error": "Admin endpoints are disabled (JWT_SECRET is not set)"}), 403
+        auth_header = request.headers.get('Authorization', '')
+        if not auth_header.startswith('Bearer '):
+            return jsonify({"success": False, "error": "Access token required"}), 401
+        claims = token_claims(auth_header[len('Bearer '):])
+        if claims is None:
+            return jsonify({"success": False, "error": "Invalid or expired token"}), 403
+        if claims.get('role', 0) < ADMIN_ROLE:
+            return jsonify({"success": False, "error": "Developer access required"}), 403
+        return view(*args, **kwargs)
+    return guarded
 
 def allowed_file(filename):
     """Check if file has allowed extension"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def build_agent_payload(record):
+    """Convert one dataset row into the agent object expected by the frontend"""
+    def as_int(value):
+        return int(value) if value is not None else 0
+
+    def as_float(value):
+        return float(value) if value is not None else None
+
+    name_val = record.get('Name')
+    unrecovered_students = record.get('Unrecovered_Students')
+    anomalies = record.get('Anomalies')
+    
+    return {
+        'id': str(name_val) if name_val is not None else '',
+        'name': str(name_val) if name_val is not None else '',
+        'team': str(record.get('Team') or ''),
+        'group': str(record.get('Group') or ''),
+        'students': as_int(record.get('Students')),
+        'fixedPct': as_float(record.get('Fixed_Pct')),
+        'ccPct': as_float(record.get('CC_Pct')),
+        'scPct': as_float(record.get('SC_Pct')),
+        'upPct': as_float(record.get('UP_Pct')),
+        'referralLeads': as_int(record.get('Referral_Leads')),
+        'referralShowups': as_int(record.get('Referral_Showups')),
+        'referralPaid': as_int(record.get('Referral_Paid')),
+        'referralAchPct': as_float(record.get('Referral_Ach_Pct')),
+        'conversionRate': as_float(record.get('Conversion_Rate')),
+        'totalLeads': as_int(record.get('Total_Leads')),
+        'recoveredLeads': as_int(record.get('Recovered_Leads')),
+        'unrecoveredLeads': as_int(record.get('Unrecovered_Leads')),
+        'unrecoveredStudents': unrecovered_students if isinstance(unrecovered_students, list) else [],
+        'score': round(record['Score'], 1) if record.get('Score') is not None else None,
+        'category': record.get('Category'),
+        'anomalies': anomalies if isinstance(anomalies, list) else []
+    }
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -164,7 +268,7 @@ def process_etl():
                 }), 400
         
         # Run ETL pipeline
-        result_df = flexible_etl_pipeline(
+        result_df = run_etl(
             cc_file=cc_file,
             up_file=up_file,
             re_file=re_file
@@ -268,6 +372,14 @@ def process_agent_data():
         print(f"Request files: {list(request.files.keys())}")
         print(f"Request form: {list(request.form.keys())}")
         
+        # Optional ISO week label for the history snapshot, e.g. 2025-W38
+        snapshot_week = request.form.get('week') or None
+        if snapshot_week and not WEEK_PATTERN.match(snapshot_week):
+            return jsonify({
+                'success': False,
+                'error': f"Invalid week '{snapshot_week}'. Expected ISO format like 2025-W38."
+            }), 400
+        
         # Upload and process files
         uploaded_files = {}
         
@@ -301,7 +413,7 @@ def process_agent_data():
                 error_msg = 'All uploaded files are empty'
             else:
                 invalid_files = [f"{k}: {v.filename}" for k, v in request.files.items() if not allowed_file(v.filename)]
-                error_msg = f'No valid Excel files found. Invalid files: {invalid_files}. Only .xlsx and .xls files are allowed.'
+                error_msg = f'No valid Excel files found. Invalid files: {invalid_files}. Only .xlsx, .xls, .csv and .parquet files are allowed.'
             
             print(f"Error: {error_msg}")
             return jsonify({
@@ -313,9 +425,26 @@ def process_agent_data():
                 }
             }), 400
         
+        # Pre-check: reject reports uploaded into the wrong slot before the full ETL run
+        uploads_valid, validation = validate_uploads(uploaded_files)
+        if not uploads_valid:
+            for file_path in uploaded_files.values():
+                try:
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+                except Exception as cleanup_error:
+                    print(f"Warning: Could not cleanup file {file_path}: {cleanup_error}")
+            errors = {slot: result['error'] for slot, result in validation.items() if not result['valid']}
+            print(f"Upload validation failed: {errors}")
+            return jsonify({
+                'success': False,
+                'error': 'Uploaded files do not match their report slots',
+                'validation': validation
+            }), 400
+        
         # Process ETL with uploaded files
         try:
-            result_df = flexible_etl_pipeline(
+            result_df = run_etl(
                 cc_file=uploaded_files.get('cc_file'),
                 up_file=uploaded_files.get('up_file'),
                 re_file=uploaded_files.get('re_file'),
@@ -335,9 +464,6 @@ def process_agent_data():
                 }
             }), 500
         
-        # Convert DataFrame to list of agent objects for frontend
-        agent_list = []
-        
         # Debug: Print available columns
         print(f"Available columns in result DataFrame: {list(result_df.columns)}")
         
@@ -357,106 +483,30 @@ def process_agent_data():
         achievement_cols = [col for col in result_df.columns if 'ach' in col.lower() or 'referral' in col.lower()]
         print(f"Columns containing 'ach' or 'referral': {achievement_cols}")
         
-        for idx, row in result_df.iterrows():
-            # Helper function to safely get scalar value from potentially Series data
-            def safe_get(value):
-                # Handle Series first to avoid boolean evaluation issues
-                if hasattr(value, 'iloc'):  # If it's a Series
-                    if len(value) == 0:
-                        return None
-                    first_val = value.iloc[0]
-                    # For the first value from series, check if it's a list
-                    if isinstance(first_val, (list, tuple)):
-                        return first_val
-                    try:
-                        return None if pd.isna(first_val) else first_val
-                    except (ValueError, TypeError):
-                        return first_val
-                # Handle lists/arrays directly
-                elif isinstance(value, (list, tuple)):
-                    return value  # Return the list as-is
-                else:
-                    # Handle scalar values - check for NaN safely
-                    try:
-                        return None if pd.isna(value) else value
-                    except (ValueError, TypeError):
-                        # If pd.isna fails (e.g., with complex objects), return the value
-                        return value
-            
-            # Helper function to safely get column value with fallback
-            def safe_get_column(row, column_name, default=None):
-                try:
-                    if column_name in row.index:
-                        # Special handling for Unrecovered_Students column
-                        if column_name == 'Unrecovered_Students':
-                            value = row[column_name]
-                            if isinstance(value, (list, tuple)):
-                                return value
-                            elif hasattr(value, 'iloc') and len(value) > 0:
-                                return value.iloc[0] if isinstance(value.iloc[0], (list, tuple)) else default
-                            else:
-                                return default
-                        else:
-                            return safe_get(row[column_name])
-                    else:
-                        return default
-                except (KeyError, IndexError, ValueError, TypeError):
-                    return default
-            
-            # Safe extraction of values
-            name_val = safe_get_column(row, 'Name', '')
-            team_val = safe_get_column(row, 'Team', '')
-            group_val = safe_get_column(row, 'Group', '')
-            students_val = safe_get_column(row, 'Students', 0)
-            fixed_pct_val = safe_get_column(row, 'Fixed_Pct')
-            cc_pct_val = safe_get_column(row, 'CC_Pct')
-            sc_pct_val = safe_get_column(row, 'SC_Pct')
-            up_pct_val = safe_get_column(row, 'UP_Pct')
-            ref_leads_val = safe_get_column(row, 'Referral_Leads', 0)
-            ref_showups_val = safe_get_column(row, 'Referral_Showups', 0)
-            ref_paid_val = safe_get_column(row, 'Referral_Paid', 0)
-            ref_ach_pct_val = safe_get_column(row, 'Referral_Ach_Pct')
-            conversion_rate_val = safe_get_column(row, 'Conversion_Rate')
-            
-            # Debug: Print column availability for first agent only
-            if name_val and len(agent_list) == 0:  # First agent only
-                print(f"🔍 DEBUGGING FIRST AGENT ({name_val}):")
-                print(f"   Available columns: {list(row.index)}")
-                print(f"   Referral_Ach_Pct value: {ref_ach_pct_val}")
-                if 'Referral_Ach_Pct' not in row.index:
-                    print(f"   ❌ Referral_Ach_Pct column MISSING!")
-                    # Look for similar columns
-                    ref_cols = [col for col in row.index if 'ref' in col.lower() or 'ach' in col.lower()]
-                    print(f"   Similar columns: {ref_cols}")
-                else:
-                    print(f"   ✅ Referral_Ach_Pct column found")
-            
-            total_leads_val = safe_get_column(row, 'Total_Leads', 0)
-            recovered_leads_val = safe_get_column(row, 'Recovered_Leads', 0)
-            unrecovered_leads_val = safe_get_column(row, 'Unrecovered_Leads', 0)
-            unrecovered_students_val = safe_get_column(row, 'Unrecovered_Students', [])
-            
-            agent_data = {
-                'id': str(name_val) if name_val is not None else '',
-                'name': str(name_val) if name_val is not None else '',
-                'team': str(team_val) if team_val is not None else '',
-                'group': str(group_val) if group_val is not None else '',
-                'students': int(students_val) if students_val is not None else 0,
-                'fixedPct': float(fixed_pct_val) if fixed_pct_val is not None else None,
-                'ccPct': float(cc_pct_val) if cc_pct_val is not None else None,
-                'scPct': float(sc_pct_val) if sc_pct_val is not None else None,
-                'upPct': float(up_pct_val) if up_pct_val is not None else None,
-                'referralLeads': int(ref_leads_val) if ref_leads_val is not None else 0,
-                'referralShowups': int(ref_showups_val) if ref_showups_val is not None else 0,
-                'referralPaid': int(ref_paid_val) if ref_paid_val is not None else 0,
-                'referralAchPct': float(ref_ach_pct_val) if ref_ach_pct_val is not None else None,
-                'conversionRate': float(conversion_rate_val) if conversion_rate_val is not None else None,
-                'totalLeads': int(total_leads_val) if total_leads_val is not None else 0,
-                'recoveredLeads': int(recovered_leads_val) if recovered_leads_val is not None else 0,
-                'unrecoveredLeads': int(unrecovered_leads_val) if unrecovered_leads_val is not None else 0,
-                'unrecoveredStudents': unrecovered_students_val if unrecovered_students_val is not None else []
-            }
-            agent_list.append(agent_data)
+        # Compare every agent with their subgroup and their own trailing weeks
+        if ANOMALY_DETECTION_ENABLED:
+            try:
+                result_df = attach_anomalies(result_df, current_week=snapshot_week)
+            except Exception as e:
+                print(f"[ANOMALY] Warning: anomaly detection skipped: {e}")
+        
+        # Keep the processed dataset in-process (and on disk) for the agent/team endpoints
+        dataset = publish_dataset(result_df, metadata={
+            'processed_files': list(uploaded_files.keys())
+        })
+        
+        # Append an immutable weekly snapshot to the history store
+        snapshot_entry = None
+        try:
+            snapshot_entry = write_snapshot(result_df, week=snapshot_week, source_files=list(uploaded_files.keys()))
+        except Exception as e:
+            print(f"[HISTORY] Warning: could not write snapshot: {e}")
+        
+        # Fill the AI cache for Critical/Watch agents in the background (needs the snapshot for trends)
+        queue_ai_pregeneration(dataset)
+        
+        # Convert dataset rows to list of agent objects for frontend
+        agent_list = [build_agent_payload(record) for record in dataset.records()]
         
         # Clean up uploaded files after processing
         for file_path in uploaded_files.values():
@@ -470,7 +520,10 @@ def process_agent_data():
             'success': True,
             'agents': agent_list,
             'total_agents': len(agent_list),
-            'processedFiles': list(uploaded_files.keys())
+            'categoryCounts': {k: int(v) for k, v in dataset.frame['Category'].value_counts().items()},
+            'anomalyCount': sum(len(agent['anomalies']) for agent in agent_list),
+            'processedFiles': list(uploaded_files.keys()),
+            'snapshot': snapshot_entry
         }
         
         return jsonify(response)
@@ -493,6 +546,38 @@ def process_agent_data():
             'error': str(e)
         }), 500
 
+@app.route('/api/validate-uploads', methods=['POST'])
+def validate_upload_files():
+    """
+    Identify uploaded reports from their first rows only, without running the ETL.
+    Accepts the same multipart fields as /process-agent-data.
+    """
+    try:
+        files = {}
+        for file_type in ['cc_file', 'up_file', 're_file', 'fixed_file', 'all_leads_file']:
+            file = request.files.get(file_type)
+            if file and file.filename != '':
+                files[file_type] = file.stream
+        
+        if not files:
+            return jsonify({
+                'success': False,
+                'error': 'No files in request. Expected multipart/form-data with file uploads.'
+            }), 400
+        
+        uploads_valid, validation = validate_uploads(files)
+        return jsonify({
+            'success': True,
+            'valid': uploads_valid,
+            'files': validation
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/test-upload', methods=['POST'])
 def test_upload():
     """Test endpoint to debug file upload issues"""
@@ -607,52 +692,25 @@ def serve_static_or_index(path):
 
 # AI Analysis Functions
 def call_openrouter_ai(prompt, agent_data=None):
-    """Call OpenRouter AI for coaching insights"""
-    if not OPENROUTER_API_KEY:
-        return {"error": "OpenRouter API key not configured", "fallback": True}
-    
-    try:
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://your-app.replit.dev",
-            "X-Title": "CMLens Dashboard"
-        }
-        
-        # Format prompt with agent data if provided
-        formatted_prompt = prompt
-        if agent_data:
-            formatted_prompt += f"\n\nAgent Performance Data:\n{json.dumps(agent_data, indent=2)}"
-        
-        data = {
-            "model": "anthropic/claude-3-haiku",
-            "messages": [
-                {"role": "user", "content": formatted_prompt}
-            ],
-            "max_tokens": 500,
-            "temperature": 0.7
-        }
-        
-        response = requests.post(f"{OPENROUTER_BASE_URL}/chat/completions", 
-                               headers=headers, json=data, timeout=30)
-        
-        if response.status_code == 200:
-            result = response.json()
-            return {
-                "success": True,
-                "analysis": result['choices'][0]['message']['content'],
-                "fallback": False
-            }
-        else:
-            print(f"OpenRouter API error: {response.status_code} - {response.text}")
-            return {"error": f"API Error: {response.status_code}", "fallback": True}
-            
-    except Exception as e:
-        print(f"OpenRouter AI error: {str(e)}")
-        return {"error": str(e), "fallback": True}
+    """
+    Call OpenRouter AI for coaching insights (pooled, time-budgeted, behind a circuit breaker).
+    agent_data is sent as a compact summary under the prompt token budget, not verbatim.
+    """
+    return get_openrouter_client().complete(build_prompt(prompt, agent_data))
 
 def get_fallback_analysis(analysis_type, agent_data=None):
-    """Provide rule-based analysis when AI is unavailable"""
+    """
+    Provide rule-based analysis when AI is unavailable: a lookup of the text
+    precomputed for the agent at ingest, computed from the payload when the
+    agent is not in the current dataset or the payload's score differs.
+    """
+    if agent_data and analysis_type in ("coaching", "meeting"):
+        dataset = get_dataset()
+        agent_id = agent_data.get('id') or agent_data.get('name')
+        pos = dataset.position(agent_id) if dataset is not None and agent_id else None
+        if pos is not None and agent_data.get('score') == round(float(dataset.columns['Score'][pos]), 1):
+            return dataset.insights[analysis_type][pos]
+    
     if analysis_type == "coaching":
         return generate_coaching_insights(agent_data)
     elif analysis_type == "meeting":
@@ -660,117 +718,30 @@ def get_fallback_analysis(analysis_type, agent_data=None):
     return "Basic analysis: Review performance metrics and identify areas for improvement."
 
 def generate_coaching_insights(agent_data):
-    """Generate rule-based coaching insights"""
+    """Generate rule-based coaching insights for one payload (metrics as fractions)"""
     if not agent_data:
         return "No agent data available for analysis."
     
-    insights = []
-    metrics = agent_data.get('metrics', {})
-    
-    # Analyze each metric
-    fixed_pct = metrics.get('fixedPct', 0) * 100 if metrics.get('fixedPct') else 0
-    cc_pct = metrics.get('ccPct', 0) * 100 if metrics.get('ccPct') else 0
-    sc_pct = metrics.get('scPct', 0) * 100 if metrics.get('scPct') else 0
-    up_pct = metrics.get('upPct', 0) * 100 if metrics.get('upPct') else 0
-    
-    if fixed_pct < 70:
-        insights.append(f"• Student retention (Fixed%: {fixed_pct:.1f}%) is below target (70%). Focus on improving class engagement and addressing student concerns early.")
-    
-    if cc_pct < 60:
-        insights.append(f"• Class coverage (CC%: {cc_pct:.1f}%) needs improvement. Encourage students to attend at least 12 classes for better outcomes.")
-    
-    if sc_pct < 30:
-        insights.append(f"• Success calls (SC%: {sc_pct:.1f}%) are underperforming. Review call scripts and timing for M1-M4 super class consumption.")
-    
-    if up_pct < 15:
-        insights.append(f"• Upselling (UP%: {up_pct:.1f}%) is below expectations. Focus on identifying upgrade opportunities and improving sales techniques.")
-    
-    if not insights:
-        insights.append("• Performance is meeting targets. Consider advanced coaching for further optimization.")
-    
-    return "\n".join(insights)
+    return coaching_insights(payload_metric_row(agent_data.get('metrics')))[0]
 
 def generate_meeting_insights(agent_data):
-    """Generate rule-based meeting discussion points"""
+    """Generate rule-based meeting discussion points for one payload"""
     if not agent_data:
         return "No agent data available for meeting discussion."
     
-    discussion_points = []
-    metrics = agent_data.get('metrics', {})
-    
-    # Calculate overall score
-    score = calculate_agent_score(metrics)
-    
-    if score < 60:
-        discussion_points.append("• Priority agent requiring immediate attention and action plan")
-        discussion_points.append("• Discuss specific challenges and barriers to performance")
-        discussion_points.append("• Set clear improvement targets with timeline")
-    elif score < 80:
-        discussion_points.append("• Agent showing potential but needs focused coaching")
-        discussion_points.append("• Identify 1-2 key areas for improvement")
-    else:
-        discussion_points.append("• Strong performer - discuss growth opportunities")
-        discussion_points.append("• Consider mentoring responsibilities for team")
-    
-    return "\n".join(discussion_points)
-
-def calculate_agent_score(metrics):
-    """Calculate weighted agent performance score"""
-    # Default weights based on business importance
-    weights = {'fixedPct': 0.3, 'ccPct': 0.25, 'scPct': 0.25, 'upPct': 0.2}
-    
-    score = 0
-    total_weight = 0
-    
-    for metric, weight in weights.items():
-        if metrics.get(metric) is not None:
-            # Convert to percentage and apply weight
-            value = metrics[metric] * 100 if metrics[metric] < 1 else metrics[metric]
-            score += value * weight
-            total_weight += weight
-    
-    return score / total_weight if total_weight > 0 else 0
+    return meeting_insights([payload_score(agent_data)])[0]
 
 def get_agent_category(score):
     """Categorize agent based on performance score"""
-    if score >= 85:
-        return "Elite"
-    elif score >= 75:
-        return "Strong"
-    elif score >= 65:
-        return "Stable"
-    elif score >= 50:
-        return "Watch"
-    else:
-        return "Critical"
+    return str(categorize_scores([score])[0])
+
+# Notes Management Functions (SQLite notes store; NOTES_FOLDER only holds old JSON notes to import)
+NOTES_TYPES = ('coaching', 'meeting')
 
-# Notes Management Functions
 def save_notes(notes_type, agent_id, content, week=None):
     """Save coaching or meeting notes"""
     try:
-        # Sanitize inputs to prevent path traversal
-        safe_notes_type = secure_filename(notes_type)
-        safe_agent_id = secure_filename(agent_id)
-        safe_week = secure_filename(str(week)) if week else None
-        
-        filename = f"{safe_notes_type}_{safe_agent_id}"
-        if safe_week:
-            filename += f"_week_{safe_week}"
-        filename += ".json"
-        
-        filepath = os.path.join(NOTES_FOLDER, filename)
-        
-        notes_data = {
-            "agent_id": agent_id,
-            "type": notes_type,
-            "content": content,
-            "week": week,
-            "updated_at": datetime.now().isoformat()
-        }
-        
-        with open(filepath, 'w') as f:
-            json.dump(notes_data, f, indent=2)
-        
+        get_notes_store(NOTES_FOLDER).save(notes_type, agent_id, content, week)
         return {"success": True, "message": "Notes saved successfully"}
     
     except Exception as e:
@@ -779,23 +750,10 @@ def save_notes(notes_type, agent_id, content, week=None):
 def load_notes(notes_type, agent_id, week=None):
     """Load coaching or meeting notes"""
     try:
-        # Sanitize inputs to prevent path traversal
-        safe_notes_type = secure_filename(notes_type)
-        safe_agent_id = secure_filename(agent_id)
-        safe_week = secure_filename(str(week)) if week else None
-        
-        filename = f"{safe_notes_type}_{safe_agent_id}"
-        if safe_week:
-            filename += f"_week_{safe_week}"
-        filename += ".json"
-        
-        filepath = os.path.join(NOTES_FOLDER, filename)
-        
-        if os.path.exists(filepath):
-            with open(filepath, 'r') as f:
-                return json.load(f)
-        else:
+        note = get_notes_store(NOTES_FOLDER).load(notes_type, agent_id, week)
+        if note is None:
             return {"content": "", "agent_id": agent_id, "type": notes_type, "week": week}
+        return note
     
     except Exception as e:
         return {"error": str(e)}
@@ -828,54 +786,205 @@ def handle_meeting_notes(agent_id, week):
         notes = load_notes('meeting', agent_id, week)
         return jsonify(notes)
 
-@app.route('/api/ai-analysis', methods=['POST'])
-def ai_analysis():
-    """Generate AI-powered analysis for coaching or meetings"""
+@app.route('/api/notes/bulk', methods=['GET'])
+def get_bulk_notes():
+    """
+    Notes of one type for a whole team (or a list of agents) in one query.
+    ?type=meeting&week=38&team=... or &agents=id1,id2; agents without notes get an empty note.
+    """
     try:
-        data = request.get_json()
-        analysis_type = data.get('type', 'coaching')  # 'coaching' or 'meeting'
-        agent_data = data.get('agent_data')
-        custom_prompt = data.get('prompt', '')
+        notes_type = request.args.get('type', 'meeting')
+        week = request.args.get('week') or None
+        team = request.args.get('team')
+        if notes_type not in NOTES_TYPES:
+            return jsonify({
+                "success": False,
+                "error": f"type must be one of: {', '.join(NOTES_TYPES)}"
+            }), 400
         
-        # Prepare prompt based on analysis type
-        if analysis_type == 'coaching':
-            base_prompt = """As an expert performance coach, analyze this agent's performance data and provide specific, actionable coaching recommendations. Focus on:
+        agent_ids = [agent_id for agent_id in request.args.get('agents', '').split(',') if agent_id]
+        if not agent_ids and team:
+            dataset = get_dataset()
+            if dataset is None:
+                return no_dataset_response()
+            agent_ids = [str(name) for name in dataset.columns['Name'][dataset.team_positions(team)]]
+        elif not agent_ids:
+            return jsonify({
+                "success": False,
+                "error": "Provide a team or a list of agents"
+            }), 400
+        
+        stored = get_notes_store(NOTES_FOLDER).load_many(notes_type, agent_ids, week)
+        notes = {
+            agent_id: stored.get(agent_id) or {"content": "", "agent_id": agent_id, "type": notes_type, "week": week}
+            for agent_id in agent_ids
+        }
+        return jsonify({
+            "success": True,
+            "type": notes_type,
+            "week": week,
+            "team": team,
+            "notes": notes
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/notes/bulk', methods=['POST'])
+def save_bulk_notes():
+    """Save many notes in one transaction. Body: {"type": "meeting", "week": "38", "notes": {agent_id: content}}"""
+    try:
+        data = request.get_json() or {}
+        notes_type = data.get('type', 'meeting')
+        notes = data.get('notes')
+        if notes_type not in NOTES_TYPES:
+            return jsonify({
+                "success": False,
+                "error": f"type must be one of: {', '.join(NOTES_TYPES)}"
+            }), 400
+        if not isinstance(notes, dict) or not all(isinstance(content, str) for content in notes.values()):
+            return jsonify({
+                "success": False,
+                "error": "notes must map agent ids to note text"
+            }), 400
+        
+        saved = get_notes_store(NOTES_FOLDER).save_many(notes_type, notes, data.get('week'))
+        return jsonify({
+            "success": True,
+            "saved": saved
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+# Prompts for /api/ai-analysis. Bump AI_PROMPT_VERSION whenever a prompt changes so
+# cached analyses written with the old wording are not served any more.
+AI_PROMPT_VERSION = 'v2'
+AI_PROMPTS = {
+    'coaching': """As an expert performance coach, analyze this agent's performance data and provide specific, actionable coaching recommendations. Focus on:
 1. Strengths to leverage
 2. Areas needing improvement
 3. Specific action steps
 4. Coaching strategy recommendations
 
-Provide practical, implementable advice that a manager can use immediately."""
-        
-        elif analysis_type == 'meeting':
-            base_prompt = """As a team management consultant, analyze this agent's performance and generate specific discussion points for a weekly team meeting. Include:
+Provide practical, implementable advice that a manager can use immediately.""",
+    'meeting': """As a team management consultant, analyze this agent's performance and generate specific discussion points for a weekly team meeting. Include:
 1. Key performance insights
 2. Questions to ask the agent
 3. Action items and next steps
 4. Timeline for improvement
 
 Focus on constructive dialogue and clear accountability measures."""
-        
-        else:
-            base_prompt = custom_prompt or "Analyze this agent's performance data and provide insights."
-        
-        # Try AI analysis first
-        ai_result = call_openrouter_ai(base_prompt, agent_data)
-        
-        if ai_result.get('fallback'):
-            # Use rule-based fallback
-            fallback_analysis = get_fallback_analysis(analysis_type, agent_data)
-            return jsonify({
-                "success": True,
-                "analysis": fallback_analysis,
-                "source": "fallback",
-                "message": "AI unavailable, using rule-based analysis"
-            })
+}
+
+# Batch analysis: agents packed into one model call, concurrent model calls per request,
+# and the time budget of a packed call (it answers for several agents at once)
+AI_BATCH_PACK_SIZE = int(os.environ.get('CMLENS_AI_BATCH_PACK_SIZE', 5))
+AI_BATCH_CONCURRENCY = int(os.environ.get('CMLENS_AI_BATCH_CONCURRENCY', 4))
+AI_BATCH_BUDGET_SECONDS = float(os.environ.get('CMLENS_AI_BATCH_BUDGET_SECONDS', 30))
+AI_BATCH_MAX_AGENTS = 500
+
+def analysis_prompt(analysis_type, custom_prompt=''):
+    """Base prompt for an analysis type ('coaching', 'meeting' or a custom prompt)"""
+    return AI_PROMPTS.get(analysis_type) or custom_prompt or "Analyze this agent's performance data and provide insights."
+
+def analysis_cache_key(analysis_type, agent_data, base_prompt):
+    """AI cache key for one agent's analysis (shared by single and batch requests)"""
+    return cache_key(analysis_type, AI_PROMPT_VERSION, agent_data,
+                     prompt=base_prompt, model=get_openrouter_client().model)
+
+def cached_analysis(analysis_type, agent_data, base_prompt):
+    """
+    Look an analysis up in the AI cache.
+    
+    Returns:
+    tuple: (cache key or None when the cache is off, analyze_agent-style result or None)
+    """
+    cache = get_ai_cache()
+    if cache is None:
+        return None, None
+    key = analysis_cache_key(analysis_type, agent_data, base_prompt)
+    try:
+        cached = cache.get(key)
+    except Exception as e:
+        print(f"[AI] Warning: cache lookup failed: {e}")
+        cached = None
+    if cached is None:
+        return key, None
+    return key, {"analysis": cached['analysis'], "source": "ai", "cached": True}
+
+def store_analysis(key, analysis, analysis_type):
+    """Write a model answer to the AI cache; returns analyze_agent's result for it"""
+    cache = get_ai_cache()
+    if key is not None and cache is not None:
+        try:
+            cache.put(key, {"analysis": analysis}, analysis_type, AI_PROMPT_VERSION)
+        except Exception as e:
+            print(f"[AI] Warning: could not cache analysis: {e}")
+    return {"analysis": analysis, "source": "ai", "cached": False}
+
+def fallback_result(analysis_type, agent_data):
+    """Rule-based result used when the model is unavailable"""
+    return {
+        "analysis": get_fallback_analysis(analysis_type, agent_data),
+        "source": "fallback",
+        "cached": False,
+        "message": "AI unavailable, using rule-based analysis"
+    }
+
+def analyze_agent(analysis_type, agent_data, custom_prompt=''):
+    """
+    Analysis for one agent: the AI response cache, then the model, then the
+    rule-based fallback. Only model answers are cached.
+    
+    Returns:
+    dict: analysis, source ('ai' or 'fallback'), cached, and a message for fallbacks
+    """
+    base_prompt = analysis_prompt(analysis_type, custom_prompt)
+    key, cached = cached_analysis(analysis_type, agent_data, base_prompt)
+    if cached is not None:
+        return cached
+    
+    # Try AI analysis first
+    ai_result = call_openrouter_ai(base_prompt, agent_data)
+    
+    if ai_result.get('fallback'):
+        # Use rule-based fallback
+        return fallback_result(analysis_type, agent_data)
+    
+    return store_analysis(key, ai_result.get('analysis', ''), analysis_type)
+
+def analysis_request(data):
+    """
+    (analysis_type, agent_data, custom_prompt) of an /api/ai-analysis body, shared by
+    the Flask and the ASGI route: a processed agent named by agent_id gets the
+    server-built agent_data, anything else the posted agent_data.
+    """
+    analysis_type = data.get('type', 'coaching')  # 'coaching' or 'meeting'
+    agent_data = dataset_agent_data(analysis_type, data.get('agent_id')) or data.get('agent_data')
+    return analysis_type, agent_data, data.get('prompt', '')
+
+@app.route('/api/ai-analysis', methods=['POST'])
+def ai_analysis():
+    """
+    Generate AI-powered analysis for coaching or meetings (repeated requests are served from the AI cache)
+    
+    Body: {"type", "agent_id", "agent_data", "prompt"}. When agent_id names an agent of the
+    processed dataset the server builds its agent_data, so the cache key is the one the
+    batch endpoint and the pre-generation worker use; agent_data is used otherwise.
+    """
+    try:
+        analysis_type, agent_data, custom_prompt = analysis_request(request.get_json())
         
         return jsonify({
             "success": True,
-            "analysis": ai_result.get('analysis', ''),
-            "source": "ai"
+            **analyze_agent(analysis_type, agent_data, custom_prompt)
         })
     
     except Exception as e:
@@ -885,38 +994,90 @@ Focus on constructive dialogue and clear accountability measures."""
             "error": str(e)
         }), 500
 
+def no_dataset_response():
+    """Standard response when no reports have been processed yet"""
+    return jsonify({
+        "success": False,
+        "error": "No processed agent data available. Upload reports first."
+    }), 404
+
+def record_metrics(record):
+    """Metrics for a dataset row, as fractions (the Targets/Meetings pages multiply by 100)"""
+    def fraction(value):
+        return value / 100 if value is not None else None
+
+    return {
+        "fixedPct": fraction(record.get('Fixed_Pct')),
+        "ccPct": fraction(record.get('CC_Pct')),
+        "scPct": fraction(record.get('SC_Pct')),
+        "upPct": fraction(record.get('UP_Pct')),
+        "students": int(record.get('Students') or 0),
+        "referralLeads": int(record.get('Referral_Leads') or 0),
+        "referralShowups": int(record.get('Referral_Showups') or 0),
+        "referralPaid": int(record.get('Referral_Paid') or 0)
+    }
+
+def identify_weaknesses(record):
+    """List the metrics of a dataset row that are below their DEFAULT_THRESHOLDS target"""
+    row = [np.nan if record.get(column) is None else float(record[column]) for column in METRIC_COLUMNS.values()]
+    return weakness_labels(row)
+
+def agent_detail_payload(record, weeks=DEFAULT_TREND_WEEKS, window=DEFAULT_ROLLING_WINDOW):
+    """Agent entry of /api/agent-performance (what the Targets page sends for coaching analysis)"""
+    return {
+        "id": record['Name'],
+        "name": record['Name'],
+        "team": record.get('Team') or '',
+        "group": record.get('Group') or '',
+        "score": round(record['Score'], 1),
+        "category": record['Category'],
+        "metrics": record_metrics(record),
+        "anomalies": record.get('Anomalies') or [],
+        "trend": agent_trend(record['Name'], weeks, window)
+    }
+
+def team_agent_payload(record):
+    """Agent entry of /api/team-performance (what the Meetings page sends for meeting analysis)"""
+    return {
+        "id": record['Name'],
+        "name": record['Name'],
+        "team": record.get('Team') or '',
+        "score": round(record['Score'], 1),
+        "category": record['Category'],
+        "metrics": record_metrics(record),
+        "weaknesses": identify_weaknesses(record),
+        "anomalies": record.get('Anomalies') or []
+    }
+
 @app.route('/api/agent-performance/<agent_id>', methods=['GET'])
 def get_agent_performance(agent_id):
-    """Get detailed performance analysis for a specific agent"""
+    """
+    Get detailed performance analysis for a specific agent, with each metric's
+    trend over the last ?weeks= weekly snapshots (?window= weeks rolling mean)
+    """
     try:
-        # This would integrate with your existing agent data
-        # For now, return a structured response for the frontend
-        
-        # You would typically fetch this from your existing agent data
-        # For demo, using sample data structure
-        sample_metrics = {
-            "fixedPct": 0.65,
-            "ccPct": 0.72,
-            "scPct": 0.28,
-            "upPct": 0.18,
-            "students": 45,
-            "referralLeads": 12,
-            "referralShowups": 8,
-            "referralPaid": 5
-        }
+        weeks = int(request.args.get('weeks', DEFAULT_TREND_WEEKS))
+        window = int(request.args.get('window', DEFAULT_ROLLING_WINDOW))
+        if weeks < 1 or window < 1:
+            return jsonify({
+                "success": False,
+                "error": "weeks and window must be positive integers"
+            }), 400
         
-        score = calculate_agent_score(sample_metrics)
-        category = get_agent_category(score)
+        dataset = get_dataset()
+        if dataset is None:
+            return no_dataset_response()
+        
+        record = dataset.get_agent(agent_id)
+        if record is None:
+            return jsonify({
+                "success": False,
+                "error": f"Agent not found: {agent_id}"
+            }), 404
         
         return jsonify({
             "success": True,
-            "agent": {
-                "id": agent_id,
-                "name": agent_id,
-                "score": round(score, 1),
-                "category": category,
-                "metrics": sample_metrics
-            }
+            "agent": agent_detail_payload(record, weeks, window)
         })
     
     except Exception as e:
@@ -931,74 +1092,639 @@ def get_team_performance():
     try:
         week = request.args.get('week', '1')
         threshold = float(request.args.get('threshold', 60))
+        team = request.args.get('team')
+        include_agents = request.args.get('include_agents', 'true').lower() != 'false'
         
-        # Enhanced team data with weaknesses analysis
-        agents_data = [
-            {
-                "id": "EGLP-ahmedamrali",
-                "name": "Ahmed Amrali", 
-                "team": "Team Alpha",
-                "score": 45.2,
-                "category": "Critical",
-                "metrics": {"fixedPct": 0.45, "ccPct": 0.38, "scPct": 0.22, "upPct": 0.08},
-                "weaknesses": ["Student retention below 70%", "Class coverage needs improvement", "Upselling opportunities missed"]
-            },
-            {
-                "id": "EGLP-ahmedsalah",
-                "name": "Ahmed Salah",
-                "team": "Team Alpha", 
-                "score": 58.7,
-                "category": "Watch",
-                "metrics": {"fixedPct": 0.62, "ccPct": 0.55, "scPct": 0.31, "upPct": 0.12},
-                "weaknesses": ["Success calls below target", "Upselling rate needs improvement"]
-            },
-            {
-                "id": "EGLP-aliam",
-                "name": "Ali Mohamed",
-                "team": "Team Alpha",
-                "score": 72.3,
-                "category": "Stable", 
-                "metrics": {"fixedPct": 0.68, "ccPct": 0.75, "scPct": 0.35, "upPct": 0.18},
-                "weaknesses": []
-            },
-            {
-                "id": "EGLP-amalYossef",
-                "name": "Amal Yossef",
-                "team": "Team Beta",
-                "score": 38.1,
-                "category": "Critical",
-                "metrics": {"fixedPct": 0.35, "ccPct": 0.42, "scPct": 0.18, "upPct": 0.05},
-                "weaknesses": ["Student retention critically low", "All metrics below target", "Requires immediate intervention"]
-            },
-            {
-                "id": "EGLP-amira",
-                "name": "Amira Hassan",
-                "team": "Team Beta",
-                "score": 81.4,
-                "category": "Strong",
-                "metrics": {"fixedPct": 0.78, "ccPct": 0.82, "scPct": 0.42, "upPct": 0.22},
-                "weaknesses": []
-            }
-        ]
+        dataset = get_dataset()
+        if dataset is None:
+            return no_dataset_response()
         
-        # Calculate team statistics
-        total_agents = len(agents_data)
-        underperforming_agents = [agent for agent in agents_data if agent["score"] < threshold]
-        underperforming_count = len(underperforming_agents)
-        average_score = sum(agent["score"] for agent in agents_data) / total_agents if agents_data else 0
+        # Team statistics come from the rollups materialized at ingest
+        if team:
+            rollup = dataset.rollups.get('Team', {}).get(team, {})
+            total_agents = rollup.get('agents', 0)
+            average_score = rollup.get('Score_mean') or 0
+        else:
+            total_agents = len(dataset)
+            average_score = float(dataset.sorted_scores.mean()) if total_agents else 0
+        underperforming_count = dataset.count_below(threshold, team)
+        
+        agents_data = []
+        if include_agents:
+            records = dataset.team_records(team) if team else dataset.records()
+            for record in records:
+                agents_data.append(team_agent_payload(record))
         
-        sample_team_data = {
+        team_data = {
             "week": week,
             "threshold": threshold,
             "total_agents": total_agents,
             "underperforming_count": underperforming_count,
             "average_score": round(average_score, 1),
+            "rollup": rollup if team else None,
             "agents": agents_data
         }
         
         return jsonify({
             "success": True,
-            "data": sample_team_data
+            "data": team_data
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+def batch_agent_payload(analysis_type, record):
+    """agent_data the Targets (coaching) or Meetings (meeting) page would send for this agent"""
+    if analysis_type == 'coaching':
+        return agent_detail_payload(record)
+    return team_agent_payload(record)
+
+def dataset_agent_data(analysis_type, agent_id):
+    """batch_agent_payload for a processed agent, or None (custom analysis, unknown agent, no dataset)"""
+    if not agent_id or analysis_type not in AI_PROMPTS:
+        return None
+    dataset = get_dataset()
+    record = dataset.get_agent(agent_id) if dataset is not None else None
+    return batch_agent_payload(analysis_type, record) if record is not None else None
+
+def parse_packed_analyses(text):
+    """agent id -> analysis from a packed answer (a JSON object, possibly inside a code fence)"""
+    start, end = text.find('{'), text.rfind('}')
+    if start < 0 or end <= start:
+        return {}
+    try:
+        parsed = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(parsed, dict):
+        return {}
+    return {str(agent_id): analysis.strip() for agent_id, analysis in parsed.items()
+            if isinstance(analysis, str) and analysis.strip()}
+
+def analyze_agent_pack(analysis_type, base_prompt, pack):
+    """
+    Analyses for several agents from one model call.
+    
+    Agents missing from the answer are retried one by one through analyze_agent;
+    when the packed call itself fails every agent gets the rule-based analysis.
+    
+    Parameters:
+    pack (list): (agent_id, agent_data, cache_key) tuples
+    
+    Returns:
+    tuple: (agent_id, result) pairs with results shaped like analyze_agent's,
+           and the number of model calls made
+    """
+    if len(pack) == 1:
+        agent_id, agent_data, _ = pack[0]
+        return [(agent_id, analyze_agent(analysis_type, agent_data))], 1
+    
+    prompt = build_packed_prompt(
+        f"{base_prompt}\n\nThe data below covers {len(pack)} agents, keyed by agent id. "
+        "Answer with a single JSON object that maps every agent id to that agent's analysis "
+        "as one string, and nothing else.",
+        {agent_id: agent_data for agent_id, agent_data, _ in pack}
+    )
+    ai_result = get_openrouter_client().complete(
+        prompt, max_tokens=500 * len(pack), budget_seconds=AI_BATCH_BUDGET_SECONDS
+    )
+    if ai_result.get('fallback'):
+        return [(agent_id, fallback_result(analysis_type, agent_data)) for agent_id, agent_data, _ in pack], 1
+    
+    analyses = parse_packed_analyses(ai_result.get('analysis', ''))
+    results = []
+    model_calls = 1
+    for agent_id, agent_data, key in pack:
+        analysis = analyses.get(agent_id)
+        if analysis is None:
+            results.append((agent_id, analyze_agent(analysis_type, agent_data)))
+            model_calls += 1
+            continue
+        results.append((agent_id, store_analysis(key, analysis, analysis_type)))
+    return results, model_calls
+
+def pregenerate_analyses(analysis_type, records):
+    """
+    Background pre-generation of one pack: analyses not yet in the AI cache are
+    generated with a single packed model call. Returns the number of model calls.
+    """
+    cache = get_ai_cache()
+    base_prompt = analysis_prompt(analysis_type)
+    pending = []
+    for record in records:
+        agent_data = batch_agent_payload(analysis_type, record)
+        key = analysis_cache_key(analysis_type, agent_data, base_prompt)
+        if not cache.contains(key):
+            pending.append((record['Name'], agent_data, key))
+    if not pending:
+        return 0
+    _, model_calls = analyze_agent_pack(analysis_type, base_prompt, pending)
+    return model_calls
+
+def batch_agent_ids(agents):
+    """
+    Agent ids from a batch request's "agents": a list of ids or of agent objects
+    (as the pages hold them). Raises ValueError for anything else.
+    """
+    if agents is None:
+        return []
+    if not isinstance(agents, list):
+        raise ValueError("agents must be a list of agent ids")
+    if len(agents) > AI_BATCH_MAX_AGENTS:
+        raise ValueError(f"At most {AI_BATCH_MAX_AGENTS} agents per batch")
+    agent_ids = []
+    for agent in agents:
+        if isinstance(agent, dict):
+            agent = agent.get('id') or agent.get('name')
+        if not isinstance(agent, str) or not agent.strip():
+            raise ValueError("agents must be a list of agent ids")
+        agent_ids.append(agent)
+    return agent_ids
+
+@app.route('/api/ai-analysis/batch', methods=['POST'])
+def ai_analysis_batch():
+    """
+    Coaching or meeting analysis for a whole team (or a list of agents), streamed
+    as newline-delimited JSON: one line per agent as soon as it is ready, cached
+    analyses first, then a summary line.
+    
+    Body: {"type": "coaching" | "meeting", "team": "...", "agents": [ids],
+           "concurrency": n, "pack_size": n}
+    """
+    try:
+        data = request.get_json() or {}
+        analysis_type = data.get('type', 'coaching')
+        if analysis_type not in AI_PROMPTS:
+            return jsonify({
+                "success": False,
+                "error": f"type must be one of: {', '.join(sorted(AI_PROMPTS))}"
+            }), 400
+        concurrency = max(1, min(int(data.get('concurrency', AI_BATCH_CONCURRENCY)), AI_BATCH_CONCURRENCY))
+        pack_size = max(1, int(data.get('pack_size', AI_BATCH_PACK_SIZE)))
+        
+        dataset = get_dataset()
+        if dataset is None:
+            return no_dataset_response()
+        
+        try:
+            agent_ids = batch_agent_ids(data.get('agents'))
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
+        missing = []
+        if agent_ids:
+            records = []
+            for agent_id in agent_ids:
+                record = dataset.get_agent(agent_id)
+                if record is None:
+                    missing.append(agent_id)
+                else:
+                    records.append(record)
+        elif data.get('team'):
+            records = dataset.team_records(data['team'])
+        else:
+            return jsonify({
+                "success": False,
+                "error": "Provide a team or a list of agents"
+            }), 400
+        if len(records) > AI_BATCH_MAX_AGENTS:
+            return jsonify({
+                "success": False,
+                "error": f"At most {AI_BATCH_MAX_AGENTS} agents per batch"
+            }), 400
+        
+        base_prompt = analysis_prompt(analysis_type)
+        cache = get_ai_cache()
+        agents = []
+        for record in records:
+            agent_data = batch_agent_payload(analysis_type, record)
+            agents.append((record['Name'], agent_data, analysis_cache_key(analysis_type, agent_data, base_prompt)))
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+    
+    def line(payload):
+        return json.dumps(payload, default=str) + "\n"
+    
+    def generate():
+        started = time.perf_counter()
+        counts = {"ai": 0, "cached": 0, "fallback": 0, "model_calls": 0}
+        
+        for agent_id in missing:
+            yield line({"agent_id": agent_id, "success": False, "error": f"Agent not found: {agent_id}"})
+        
+        pending = []
+        for agent_id, agent_data, key in agents:
+            cached = None
+            if cache is not None:
+                try:
+                    cached = cache.get(key)
+                except Exception as e:
+                    print(f"[AI] Warning: cache lookup failed: {e}")
+            if cached is not None:
+                counts["cached"] += 1
+                yield line({"agent_id": agent_id, "success": True, "analysis": cached['analysis'],
+                            "source": "ai", "cached": True})
+            else:
+                pending.append((agent_id, agent_data, key))
+        
+        packs = [pending[i:i + pack_size] for i in range(0, len(pending), pack_size)]
+        if packs:
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(packs))) as pool:
+                futures = [pool.submit(analyze_agent_pack, analysis_type, base_prompt, pack) for pack in packs]
+                for future in as_completed(futures):
+                    results, model_calls = future.result()
+                    counts["model_calls"] += model_calls
+                    for agent_id, result in results:
+                        counts["ai" if result['source'] == 'ai' else "fallback"] += 1
+                        yield line({"agent_id": agent_id, "success": True, **result})
+        
+        elapsed = round(time.perf_counter() - started, 2)
+        print(f"[AI] Batch {analysis_type} analysis for {len(agents)} agents in {elapsed}s "
+              f"({counts['cached']} cached, {counts['model_calls']} model calls, {counts['fallback']} fallbacks)")
+        yield line({"done": True, "agents": len(agents), "not_found": len(missing), **counts, "seconds": elapsed})
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/team-rollups', methods=['GET'])
+def get_team_rollups():
+    """Get precomputed Team or Group (subgroup) KPI rollups from the last ingest"""
+    try:
+        level = request.args.get('level', 'Team')
+        if level not in ('Team', 'Group'):
+            return jsonify({
+                "success": False,
+                "error": "level must be 'Team' or 'Group'"
+            }), 400
+        
+        dataset = get_dataset()
+        if dataset is None:
+            return no_dataset_response()
+        
+        name = request.args.get('name')
+        rollups = dataset.rollups.get(level, {})
+        if name:
+            if name not in rollups:
+                return jsonify({
+                    "success": False,
+                    "error": f"{level} not found: {name}"
+                }), 404
+            rollups = {name: rollups[name]}
+        
+        return jsonify({
+            "success": True,
+            "level": level,
+            "data": rollups
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+def parse_number(value, label, minimum=None):
+    """A finite float (NaN and infinities are rejected), at least minimum when given"""
+    if isinstance(value, bool):
+        raise ValueError(f"{label} must be a number")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{label} must be a number")
+    if not math.isfinite(number):
+        raise ValueError(f"{label} must be a finite number")
+    if minimum is not None and number < minimum:
+        raise ValueError(f"{label} must be at least {minimum:g}")
+    return number
+
+def parse_numeric_overrides(values, defaults, label, allowed_keys=None, minimum=None):
+    """Merge user-supplied numeric overrides onto defaults, rejecting unknown keys and non-finite numbers"""
+    merged = dict(defaults)
+    if not values:
+        return merged
+    if not isinstance(values, dict):
+        raise ValueError(f"'{label}' must be an object")
+    allowed_keys = allowed_keys or defaults.keys()
+    for key, value in values.items():
+        if key not in allowed_keys:
+            raise ValueError(f"Unknown {label} key '{key}'. Expected one of: {sorted(allowed_keys)}")
+        merged[key] = parse_number(value, f"{label}['{key}']", minimum)
+    return merged
+
+def check_category_cuts(cuts):
+    """Category cut points must rise in category order (Watch < Stable < Strong < Elite)"""
+    labels = list(DEFAULT_CATEGORY_CUTS)
+    for lower, upper in zip(labels, labels[1:]):
+        if cuts[lower] >= cuts[upper]:
+            raise ValueError(f"categories must be ascending: {' < '.join(labels)}")
+
+@app.route('/api/what-if-scoring', methods=['POST'])
+def what_if_scoring():
+    """
+    Re-score and re-rank every agent in the stored dataset under custom weights,
+    metric thresholds and category cut points, in one vectorized pass.
+    
+    Expected JSON (all optional):
+    {
+        "weights": {"fixedPct": 0.4, "ccPct": 0.2, "scPct": 0.2, "upPct": 0.2},
+        "thresholds": {"fixedPct": 70, "ccPct": 60, "scPct": 30, "upPct": 15},
+        "categories": {"Watch": 50, "Stable": 65, "Strong": 75, "Elite": 85},
+        "score_threshold": 60,
+        "team": "ME-EG-Team A"
+    }
+    """
+    try:
+        started = time.perf_counter()
+        data = request.get_json(silent=True) or {}
+        
+        try:
+            weights = parse_numeric_overrides(data.get('weights'), DEFAULT_WEIGHTS, 'weights', minimum=0)
+            thresholds = parse_numeric_overrides(data.get('thresholds'), DEFAULT_THRESHOLDS, 'thresholds')
+            cuts = parse_numeric_overrides(data.get('categories'), DEFAULT_CATEGORY_CUTS, 'categories')
+            check_category_cuts(cuts)
+            score_threshold = parse_number(data.get('score_threshold', 60), 'score_threshold')
+        except (TypeError, ValueError) as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        if sum(weights.values()) <= 0:
+            return jsonify({
+                "success": False,
+                "error": "Weights must sum to more than 0"
+            }), 400
+        
+        dataset = get_dataset()
+        if dataset is None:
+            return no_dataset_response()
+        
+        team = data.get('team')
+        if team:
+            positions = np.asarray(dataset.team_positions(team), dtype=int)
+        else:
+            positions = np.arange(len(dataset))
+        
+        # Single vectorized pass over the (agents x metrics) matrix
+        metrics = dataset.metric_keys
+        matrix = dataset.metric_matrix[positions]
+        scores = score_matrix(matrix, weights, metrics)
+        categories = categorize_scores(scores, cuts)
+        ranks = rank_scores(scores)
+        baseline_scores = dataset.columns['Score'][positions]
+        baseline_ranks = rank_scores(baseline_scores)
+        below = below_threshold_mask(matrix, thresholds, metrics)
+        
+        # Convert to Python lists once; per-element numpy indexing dominates otherwise
+        order = np.argsort(ranks, kind='stable').tolist()
+        names = dataset.columns['Name'][positions].tolist()
+        team_column = dataset.columns.get('Team')
+        teams = ([to_native(t) or '' for t in team_column[positions]] if team_column is not None
+                 else [''] * len(positions))
+        score_list = np.round(scores, 1).tolist()
+        baseline_list = np.round(baseline_scores.astype(float), 1).tolist()
+        rank_list = ranks.tolist()
+        baseline_rank_list = baseline_ranks.tolist()
+        category_list = categories.tolist()
+        below_list = [[m for m, flagged in zip(metrics, row) if flagged] for row in below.tolist()]
+        
+        agents = [{
+            "id": str(names[i]),
+            "name": str(names[i]),
+            "team": teams[i],
+            "score": score_list[i],
+            "category": category_list[i],
+            "rank": rank_list[i],
+            "baselineScore": baseline_list[i],
+            "baselineRank": baseline_rank_list[i],
+            "rankChange": baseline_rank_list[i] - rank_list[i],
+            "belowThreshold": below_list[i]
+        } for i in order]
+        
+        category_labels, category_counts = np.unique(categories, return_counts=True)
+        
+        return jsonify({
+            "success": True,
+            "data": {
+                "weights": weights,
+                "thresholds": thresholds,
+                "categories": cuts,
+                "total_agents": len(agents),
+                "average_score": round(float(scores.mean()), 1) if len(scores) else 0,
+                "underperforming_count": int((scores < score_threshold).sum()),
+                "category_counts": {str(k): int(v) for k, v in zip(category_labels, category_counts)},
+                "below_threshold_counts": {m: int(c) for m, c in zip(metrics, below.sum(axis=0))},
+                "agents": agents,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+            }
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+# Largest k a leaderboard request may ask for
+LEADERBOARD_MAX_K = 1000
+
+@app.route('/api/leaderboard', methods=['GET'])
+def get_leaderboard():
+    """
+    Top-k agents for a metric, optionally filtered by team and/or group.
+    rank/total_ranked are over all agents; filterRank/total_in_filter are within the filter.
+    """
+    try:
+        metric = request.args.get('metric', 'upPct')
+        team = request.args.get('team')
+        group = request.args.get('group')
+        ascending = request.args.get('order', 'desc').lower() == 'asc'
+        
+        try:
+            k = int(request.args.get('k', 10))
+        except ValueError:
+            k = 0
+        if not 1 <= k <= LEADERBOARD_MAX_K:
+            return jsonify({
+                "success": False,
+                "error": f"k must be an integer between 1 and {LEADERBOARD_MAX_K}"
+            }), 400
+        
+        try:
+            column = resolve_metric(metric)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        dataset = get_dataset()
+        if dataset is None:
+            return no_dataset_response()
+        
+        index = dataset.rank_index
+        positions, filter_ranks, total_in_filter = index.top_k_ranked(
+            column, k, mask=dataset.row_mask(team, group), ascending=ascending
+        )
+        
+        leaders = []
+        for pos, filter_rank in zip(positions.tolist(), filter_ranks.tolist()):
+            record = dataset.record(pos)
+            leaders.append({
+                "id": record['Name'],
+                "name": record['Name'],
+                "team": record.get('Team') or '',
+                "group": record.get('Group') or '',
+                "value": record.get(column),
+                "rank": int(index.ranks[column][pos]),
+                "filterRank": filter_rank,
+                "percentile": round(float(index.percentiles[column][pos]), 1)
+            })
+        
+        return jsonify({
+            "success": True,
+            "metric": column,
+            "team": team,
+            "group": group,
+            "total_ranked": index.counts.get(column, 0),
+            "total_in_filter": total_in_filter,
+            "agents": leaders
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/agent-percentiles/<agent_id>', methods=['GET'])
+def get_agent_percentiles(agent_id):
+    """Rank and percentile of an agent on every indexed metric"""
+    try:
+        dataset = get_dataset()
+        if dataset is None:
+            return no_dataset_response()
+        
+        pos = dataset.position(agent_id)
+        if pos is None:
+            return jsonify({
+                "success": False,
+                "error": f"Agent not found: {agent_id}"
+            }), 404
+        
+        record = dataset.record(pos)
+        percentiles = dataset.rank_index.agent_percentiles(pos)
+        for column, entry in percentiles.items():
+            entry['value'] = record.get(column)
+        
+        return jsonify({
+            "success": True,
+            "agent_id": record['Name'],
+            "percentiles": percentiles
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/snapshots', methods=['GET'])
+def list_snapshots():
+    """List the weekly snapshot catalog (optionally for one week)"""
+    try:
+        week = request.args.get('week')
+        snapshots = load_catalog()
+        if week:
+            snapshots = [entry for entry in snapshots if entry['week'] == week]
+        return jsonify({
+            "success": True,
+            "snapshots": snapshots
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/snapshots/diff', methods=['GET'])
+def get_snapshot_diff():
+    """
+    Week-over-week deltas between two snapshots.
+    ?target=<id>&base=<id>, or ?week=2025-W38 (compared with the latest earlier week).
+    Defaults to the latest snapshot vs the week before it. Optional ?team= and ?status=new|departed|continuing.
+    """
+    try:
+        week = request.args.get('week')
+        target = find_snapshot(request.args.get('target'), week)
+        if target is None:
+            return jsonify({
+                "success": False,
+                "error": "Target snapshot not found"
+            }), 404
+
+        base_id = request.args.get('base')
+        base = find_snapshot(base_id) if base_id else previous_snapshot(target)
+        if base is None:
+            return jsonify({
+                "success": False,
+                "error": f"No earlier snapshot to compare {target['snapshot_id']} with"
+            }), 404
+
+        diff = diff_snapshots(base['snapshot_id'], target['snapshot_id'])
+
+        team = request.args.get('team')
+        status = request.args.get('status')
+        agents = diff['agents']
+        if team:
+            agents = [agent for agent in agents if agent['team'] == team]
+        if status:
+            agents = [agent for agent in agents if agent['status'] == status]
+
+        return jsonify({
+            "success": True,
+            "base": diff['base'],
+            "target": diff['target'],
+            "summary": diff['summary'],
+            "teams": {team: diff['teams'][team]} if team and team in diff['teams'] else diff['teams'],
+            "agents": agents
+        })
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/snapshots/<snapshot_id>', methods=['GET'])
+def get_snapshot(snapshot_id):
+    """
+    Load one snapshot. Use 'latest' or ?week=2025-W38 to pick by week, and
+    ?columns=Name,CC_Pct,UP_Pct to read only some columns.
+    """
+    try:
+        week = request.args.get('week')
+        columns = [col for col in request.args.get('columns', '').split(',') if col] or None
+        lookup_id = None if snapshot_id == 'latest' else snapshot_id
+        
+        entry = find_snapshot(lookup_id, week)
+        if entry is None:
+            return jsonify({
+                "success": False,
+                "error": f"Snapshot not found: {snapshot_id}"
+            }), 404
+        
+        frame = load_snapshot(entry['snapshot_id'], columns=columns)
+        records = [{col: to_native(val) for col, val in row.items()} for row in frame.to_dict(orient='records')]
+        
+        return jsonify({
+            "success": True,
+            "snapshot": entry,
+            "agents": records
         })
     
     except Exception as e:
@@ -1011,31 +1737,13 @@ def get_team_performance():
 def get_teams_agents():
     """Get available teams and agents for frontend selectors"""
     try:
-        # This should ideally come from your database/ETL data
-        # For now, providing structure that matches the actual agent data
+        dataset = get_dataset()
+        if dataset is None:
+            return no_dataset_response()
+        
         teams_data = {
-            "teams": ["Team Alpha", "Team Beta", "Team Gamma", "Team Delta"],
-            "agents_by_team": {
-                "Team Alpha": [
-                    {"id": "EGLP-ahmedamrali", "name": "Ahmed Amrali"},
-                    {"id": "EGLP-ahmedsalah", "name": "Ahmed Salah"}, 
-                    {"id": "EGLP-aliam", "name": "Ali Mohamed"}
-                ],
-                "Team Beta": [
-                    {"id": "EGLP-amalYossef", "name": "Amal Yossef"},
-                    {"id": "EGLP-amira", "name": "Amira Hassan"}
-                ],
-                "Team Gamma": [
-                    {"id": "EGLP-mohamed", "name": "Mohamed Hassan"},
-                    {"id": "EGLP-hassan", "name": "Hassan Ali"},
-                    {"id": "EGLP-fatma", "name": "Fatma Ahmed"}
-                ],
-                "Team Delta": [
-                    {"id": "EGLP-ahmed", "name": "Ahmed Mahmoud"},
-                    {"id": "EGLP-nour", "name": "Nour Ibrahim"},
-                    {"id": "EGLP-omar", "name": "Omar Khaled"}
-                ]
-            }
+            "teams": dataset.teams(),
+            "agents_by_team": dataset.team_roster()
         }
         
         return jsonify({
@@ -1049,6 +1757,110 @@ def get_teams_agents():
             "error": str(e)
         }), 500
 
+@app.route('/api/ai/metrics', methods=['GET'])
+def get_ai_metrics():
+    """OpenRouter call counts, recent latency percentiles, circuit breaker state and AI cache stats"""
+    try:
+        cache = get_ai_cache()
+        return jsonify({
+            "success": True,
+            "data": {
+                **get_openrouter_client().metrics(),
+                "cache": cache.stats() if cache is not None else {"enabled": False},
+                "pregeneration": ai_pregenerator.status() if ai_pregenerator is not None else {"enabled": False}
+            }
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/ai/cache/clear', methods=['POST'])
+@require_admin
+def clear_ai_cache():
+    """
+    Drop cached AI analyses so the next views call the model again.
+    Optional JSON body: {"type": "coaching"}; default is every analysis type.
+    """
+    try:
+        cache = get_ai_cache()
+        if cache is None:
+            return jsonify({"success": True, "cleared": 0})
+        data = request.get_json(silent=True) or {}
+        return jsonify({
+            "success": True,
+            "cleared": cache.clear(data.get('type'))
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/inbox/status', methods=['GET'])
+def get_inbox_status():
+    """State of the inbox watcher: current files, last run and last error"""
+    try:
+        if inbox_watcher is None:
+            return jsonify({
+                "success": True,
+                "data": {"enabled": False}
+            })
+        return jsonify({
+            "success": True,
+            "data": inbox_watcher.status()
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/column-mappings/invalidate', methods=['POST'])
+@require_admin
+def invalidate_cached_column_mappings():
+    """
+    Drop cached header-layout column mappings so the next upload re-runs column detection.
+    Optional JSON body: {"source": "re"} (up, re or all_leads); default is all sources.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        source = data.get('source')
+        removed = invalidate_column_mappings(source)
+        invalidate_worker_mappings()
+        return jsonify({
+            "success": True,
+            "source": source or 'all',
+            "invalidated": removed
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+def queue_ai_pregeneration(dataset):
+    """Hand a freshly published dataset to the background AI pre-generation worker"""
+    if ai_pregenerator is None or get_ai_cache() is None or not get_openrouter_client().api_key:
+        return
+    try:
+        ai_pregenerator.submit(dataset)
+    except Exception as e:
+        print(f"[AI] Warning: could not queue background analyses: {e}")
+
+# Background services, started once every handler above is defined.
+# Pre-generate AI analyses for Critical/Watch agents after each ingest (CMLENS_AI_PREGENERATE=0 to disable)
+ai_pregenerator = start_ai_pregenerator(pregenerate_analyses)
+
+# Ingest reports dropped into CMLENS_INBOX_DIR without a manual upload
+inbox_watcher = start_inbox_watcher(detect_anomalies=ANOMALY_DETECTION_ENABLED,
+                                    on_ingest=queue_ai_pregeneration)
+
 if __name__ == '__main__':
     print("Starting ETL Web Backend...")
     print("Available endpoints:")